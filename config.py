@@ -11,10 +11,29 @@ QDRANT_URL = "https://a22aee43-5786-400f-9ccf-e29b680714c0.europe-west3-0.gcp.cl
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION_NAME = "ta_hospital"
 VECTOR_SIZE = 1024
+EMBEDDING_PRECISION = "fp32"    # 'fp32' | 'fp16' | 'int8' (ONNX Runtime, CPU) - registry key: name, device, precision
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE") or None    # None/'auto' = tốt nhất có sẵn, 'cuda' | 'mps' | 'cpu'
+
+# VnCoreNLP (word segmentation) - thư mục chứa model, ghi đè bằng biến môi trường
+VNCORENLP_DIR = os.getenv("VNCORENLP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vncorenlp"))
 
 
 # Groq
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 # Debug
-DEBUG_TIMING = True
\ No newline at end of file
+DEBUG_TIMING = True
+
+# Trace sink (ghi kết quả retrieval ở background, JSONL xoay vòng)
+TRACE_ENABLED = False
+TRACE_DIR = "traces"
+TRACE_SAMPLE_RATE = 1.0
+
+# Query embedding cache (dùng chung giữa router và retriever)
+EMBEDDING_CACHE_SIZE = 10000
+EMBEDDING_CACHE_PATH = None     # vd. "data/cache/query_embeddings.npz" để lưu qua các lần chạy
+
+# Micro-batching embedding (gom các encode() đồng thời thành một forward pass)
+EMBEDDING_BATCH_WAIT_MS = 5.0
+EMBEDDING_MAX_BATCH = 32
+EMBEDDING_SERVER = None         # "host:port" của `python -m embedders.batching`, None = in-process
\ No newline at end of file
@@ -25,37 +25,84 @@
 import os
 import json
 import math
+import multiprocessing as mp
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
 from datasets import load_dataset
 from tqdm import tqdm
 import py_vncorenlp
-from data_generator.utils import preprocess_text
+from data_generator.utils import preprocess_text, CSRIndex, SegmentedBM25Index, is_binary_index
 from transformers import AutoTokenizer
+from config import VNCORENLP_DIR
 # =========================
 # INIT VnCoreNLP
 # =========================
-# _ORIGINAL_CWD = os.getcwd()
 
-rdrsegmenter = py_vncorenlp.VnCoreNLP(
-    annotators=["wseg"],
-    save_dir="/Users/nnam/Documents/Workspace/university/seminar/vncorenlp"
-)
+# Khởi tạo lười, mỗi process một instance (JVM) -> mỗi worker có segmenter riêng
+_rdrsegmenter = None
 
 phobert_tokenizer = AutoTokenizer.from_pretrained(
     "vinai/phobert-base"
 )
 
-# os.chdir(_ORIGINAL_CWD)
+
+def get_segmenter(save_dir: str = VNCORENLP_DIR):
+    global _rdrsegmenter
+    if _rdrsegmenter is None:
+        cwd = os.getcwd()
+        _rdrsegmenter = py_vncorenlp.VnCoreNLP(
+            annotators=["wseg"],
+            save_dir=save_dir
+        )
+        os.chdir(cwd)   # VnCoreNLP đổi cwd sang save_dir
+    return _rdrsegmenter
 
 
 def segment_word(text: str)->str:
-    segmented_text = rdrsegmenter.word_segment(text)
+    segmented_text = get_segmenter().word_segment(text)
     return " ".join([t for t in segmented_text]).lower()
 
 def tokenize(text: str)->list:
     tokens = phobert_tokenizer.tokenize(text)
     return tokens
 
+def tokenize_document(raw_text: str)->list:
+    clean_text = preprocess_text(raw_text)
+    segmented_words = segment_word(clean_text)
+    return tokenize(segmented_words)
+
+
+# =========================
+# PARALLEL WORKERS
+# =========================
+def _init_worker(segmenter_path: str):
+    get_segmenter(segmenter_path)
+
+
+def _index_shard(docs, tokenizer=None):
+    """
+    Build a partial index for one shard: [(doc_id, content), ...]
+    -> (doc_len, postings), both in the shard's doc order.
+    """
+    tokenizer = tokenizer or tokenize_document
+    doc_len = {}
+    postings = {}
+
+    for doc_id, raw_text in docs:
+        tokens = tokenizer(raw_text)
+        doc_len[doc_id] = len(tokens)
+
+        tf_counter = defaultdict(int)
+        for t in tokens:
+            tf_counter[t] += 1
+
+        for term, tf in tf_counter.items():
+            if term not in postings:
+                postings[term] = {}
+            postings[term][doc_id] = tf
+
+    return doc_len, postings
+
 # =========================
 # BM25 CLASS
 # =========================
@@ -75,6 +122,10 @@ class BM25Index:
     # LOAD / SAVE
     # =========================
     def load(self, index_path):
+        if is_binary_index(index_path):
+            self._load_binary(index_path)
+            return
+
         with open(index_path, encoding="utf-8") as f:
             index = json.load(f)
 
@@ -92,7 +143,49 @@ class BM25Index:
 
         print(f"📂 Loaded index from {index_path}")
 
-    def save(self, out_path):
+    def _load_binary(self, index_path):
+        csr = CSRIndex.open_binary(index_path, mmap=False)
+
+        self.N = csr.N
+        self.avg_doc_len = csr.avg_doc_len
+        self.k1 = csr.k1
+        self.b = csr.b
+
+        self.doc_len = dict(zip(csr.doc_keys.tolist(), csr.doc_len.tolist()))
+        self.idf = {term: float(csr.idf[t]) for term, t in csr.vocab.items()}
+        self.postings = csr.to_dict()
+
+        print(f"📂 Loaded binary index from {index_path}")
+
+    def to_csr(self):
+        return CSRIndex.from_dict(
+            postings=self.postings,
+            doc_len=self.doc_len,
+            idf=self.idf,
+            N=self.N,
+            avg_doc_len=self.avg_doc_len,
+            k1=self.k1,
+            b=self.b,
+        )
+
+    def save(self, out_path, format="json", impact_bits=None):
+        """
+        format: 'json' (legacy, human readable) | 'binary' (memory-mappable CSR)
+        impact_bits: 8 | 16 -> binary index also stores quantized impact scores
+                     (idf x tf-saturation) so queries only sum impacts.
+        """
+        if format == "binary":
+            csr = self.to_csr()
+            csr.build_bounds()
+            if impact_bits:
+                csr.build_impacts(bits=impact_bits)
+            csr.save_binary(out_path)
+            return
+        if impact_bits:
+            raise ValueError("Impact scores are only stored in the binary format")
+        if format != "json":
+            raise ValueError(f"Unsupported index format: {format}")
+
         index = {
             "meta": {
                 "N": self.N,
@@ -136,10 +229,7 @@ class BM25Index:
             if doc_id in self.doc_len:
                 continue  # skip existing docs
 
-            raw_text = ex["content"]
-            clean_text = preprocess_text(raw_text)
-            segmented_words = segment_word(clean_text)
-            tokens = tokenize(segmented_words)
+            tokens = tokenize_document(ex["content"])
 
             self.doc_len[doc_id] = len(tokens)
 
@@ -160,6 +250,95 @@ class BM25Index:
         if rebuild_idf:
             self._recompute_idf()
 
+    # =========================
+    # PARALLEL BUILD (SHARDED)
+    # =========================
+    def build_parallel(
+        self,
+        json_path,
+        num_workers=None,
+        shard_size=1000,
+        segmenter_path=VNCORENLP_DIR,
+        rebuild_idf=True,
+        tokenizer=None
+    ):
+        """
+        Stream chunks from `json_path`, tokenize shards in a process pool
+        (one VnCoreNLP + tokenizer per worker) and merge the partial indexes
+        in stream order, so the result does not depend on num_workers.
+        Docs already in the index are skipped (incremental, like add_documents).
+
+        tokenizer: picklable callable raw_text -> tokens, replaces
+                   tokenize_document (no VnCoreNLP started in the workers)
+        """
+        num_workers = num_workers or os.cpu_count() or 1
+        max_in_flight = 2 * num_workers
+
+        pending = {}        # future -> shard_id
+        ready = {}          # shard_id -> (doc_len, postings)
+        next_shard = 0
+
+        # JVM không an toàn với fork -> spawn
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=ctx,
+            initializer=_init_worker if tokenizer is None else None,
+            initargs=(segmenter_path,) if tokenizer is None else ()
+        ) as executor, tqdm(desc="Indexing shards", unit="shard") as bar:
+
+            def collect(return_when):
+                nonlocal next_shard
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    ready[pending.pop(future)] = future.result()
+                    bar.update(1)
+                while next_shard in ready:
+                    self._merge_shard(*ready.pop(next_shard))
+                    next_shard += 1
+
+            for shard_id, docs in self._iter_shards(json_path, shard_size):
+                pending[executor.submit(_index_shard, docs, tokenizer)] = shard_id
+                if len(pending) >= max_in_flight:
+                    collect(FIRST_COMPLETED)
+
+            while pending:
+                collect(ALL_COMPLETED)
+
+        if self.N:
+            self.avg_doc_len = sum(self.doc_len.values()) / self.N
+
+        if rebuild_idf:
+            self._recompute_idf()
+
+    def _iter_shards(self, json_path, shard_size):
+        dataset = load_dataset("json", data_files=json_path, split="train", streaming=True)
+
+        seen = set(self.doc_len)
+        shard, shard_id = [], 0
+        for ex in dataset:
+            doc_id = int(ex["id"])
+            if doc_id in seen:
+                continue  # skip existing / duplicated docs
+            seen.add(doc_id)
+
+            shard.append((doc_id, ex["content"]))
+            if len(shard) == shard_size:
+                yield shard_id, shard
+                shard, shard_id = [], shard_id + 1
+
+        if shard:
+            yield shard_id, shard
+
+    def _merge_shard(self, doc_len, postings):
+        self.doc_len.update(doc_len)
+        self.N += len(doc_len)
+
+        for term, docs in postings.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+            self.postings[term].update(docs)
+
     def _recompute_idf(self):
         print("Recomputing IDF...")
         self.idf = {}
@@ -211,6 +390,33 @@ class BM25Index:
         return scores[:top_k]
 
 
+# =========================
+# SEGMENTED INDEX (INCREMENTAL)
+# =========================
+def add_documents_to_segments(index_dir, json_path):
+    """
+    Tokenize `json_path` chunks and append them to a segmented index as one
+    new segment. Existing doc ids are replaced (old version tombstoned).
+    """
+    segments = SegmentedBM25Index(index_dir)
+    dataset = load_dataset("json", data_files=json_path, split="train")
+    docs = [
+        (int(ex["id"]), tokenize_document(ex["content"]))
+        for ex in tqdm(dataset, desc="Tokenizing new docs")
+    ]
+    segments.add_documents(docs)
+    segments.wait_for_merges()
+    return segments
+
+
+def delete_from_segments(index_dir, doc_ids):
+    segments = SegmentedBM25Index(index_dir)
+    deleted = segments.delete(doc_ids)
+    print(f"🗑️ Tombstoned {deleted} docs")
+    segments.wait_for_merges()
+    return segments
+
+
 # =========================
 # USAGE EXAMPLE
 # =========================
@@ -226,9 +432,20 @@ if __name__ == "__main__":
         bm25.build_from_json(
             "/Users/nnam/Documents/Workspace/university/seminar/data/chunks/chunks_with_id.json"
         )
+        # Hoặc build song song theo shard:
+        # bm25.build_parallel(
+        #     "/Users/nnam/Documents/Workspace/university/seminar/data/chunks/chunks_with_id.json",
+        #     num_workers=8
+        # )
 
     # ADD NEW DOCUMENTS LATER
     # bm25.add_documents("new_chunks.json")
+
+    # Hoặc với segmented index (không ghi lại toàn bộ index):
+    # segments = SegmentedBM25Index(SEGMENT_DIR)
+    # segments.add_csr(bm25.to_csr())                      # một lần, từ index hiện tại
+    # add_documents_to_segments(SEGMENT_DIR, "new_chunks.json")
+    # delete_from_segments(SEGMENT_DIR, [12345])
     """
         [
     {
@@ -243,5 +460,6 @@ if __name__ == "__main__":
     """
 
     bm25.save(INDEX_PATH)
+    # bm25.save(INDEX_PATH.replace(".json", ".bin"), format="binary", impact_bits=8)
 
     print(bm25.search("covid 19", top_k=3))
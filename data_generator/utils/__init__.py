@@ -1 +1,4 @@
-from data_generator.utils.bm25_utils import preprocess_text
\ No newline at end of file
+from data_generator.utils.bm25_utils import preprocess_text
+from data_generator.utils.bm25_csr import CSRIndex, convert_json_index, is_binary_index
+from data_generator.utils.bm25_wand import wand_top_k
+from data_generator.utils.bm25_segments import SegmentedBM25Index
\ No newline at end of file
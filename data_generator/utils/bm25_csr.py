@@ -0,0 +1,586 @@
+"""
+CSR (compressed sparse row) layout of the BM25 inverted index.
+
+Thay cho `dict[str, dict[int, int]]`, mỗi term chỉ còn là một lát cắt
+[offsets[t], offsets[t + 1]) trên hai mảng song song:
+
+    doc_ids : chỉ số doc nội bộ (tăng dần trong từng term)
+    tfs     : term frequency tương ứng
+
+Doc id thật (id của chunk trong Qdrant) được giữ trong mảng đã sắp xếp
+`doc_keys`, nên chỉ số nội bộ i <-> doc_keys[i].
+
+Binary format (version 1), mở bằng np.memmap:
+
+    [0:8]    magic  b"BM25CSR\0"
+    [8:12]   format version (uint32, little-endian)
+    [12:16]  header length (uint32)
+    [16:..]  header JSON: meta + {section: {offset, dtype, shape}}
+    ...      các section, mỗi section căn lề 64 byte:
+             doc_keys, doc_len, offsets, doc_ids, tfs, idf,
+             vocab_offsets, vocab_blob (term utf-8 nối liền, theo term_id)
+             + section tùy chọn: term_max, block_offsets, block_max, block_last
+               (upper bound cho WAND / Block-Max WAND), impacts (điểm lượng tử
+               hóa từng posting, scale lưu trong meta "impact_scale")
+"""
+
+from typing import Dict, Iterable, List, Tuple, Any, Optional
+import os
+import json
+import struct
+import numpy as np
+
+
+DOC_ID_DTYPE = np.int32
+TF_DTYPE = np.int32
+OFFSET_DTYPE = np.int64
+
+MAGIC = b"BM25CSR\0"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 64
+_CORE_SECTIONS = (
+    "doc_keys", "doc_len", "offsets", "doc_ids", "tfs", "idf",
+    "vocab_offsets", "vocab_blob",
+)
+_BOUND_SECTIONS = ("term_max", "block_offsets", "block_max", "block_last")
+_IMPACT_SECTIONS = ("impacts",)
+_IMPACT_DTYPES = {8: np.uint8, 16: np.uint16}
+DEFAULT_BLOCK_SIZE = 64
+
+
+def is_binary_index(path: str) -> bool:
+    """True if `path` starts with the binary CSR index magic."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class CSRIndex:
+    """
+    Compact term -> postings structure built on NumPy arrays.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        idf: np.ndarray,
+        doc_keys: np.ndarray,
+        doc_len: np.ndarray,
+        N: int,
+        avg_doc_len: float,
+        k1: float = 1.5,
+        b: float = 0.75,
+        term_max: Optional[np.ndarray] = None,
+        block_offsets: Optional[np.ndarray] = None,
+        block_max: Optional[np.ndarray] = None,
+        block_last: Optional[np.ndarray] = None,
+        impacts: Optional[np.ndarray] = None,
+        impact_scale: Optional[float] = None,
+    ):
+        self.vocab = vocab              # term -> term_id
+        self.offsets = offsets          # (V + 1,)
+        self.doc_ids = doc_ids          # (nnz,) internal doc index
+        self.tfs = tfs                  # (nnz,)
+        self.idf = idf                  # (V,)
+        self.doc_keys = doc_keys        # (n_docs,) external doc id, sorted
+        self.doc_len = doc_len          # (n_docs,)
+
+        self.N = N
+        self.avg_doc_len = avg_doc_len
+        self.k1 = k1
+        self.b = b
+
+        # k1 * (1 - b + b * dl / avgdl), cố định sau khi build -> tính một lần
+        self.norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avg_doc_len)
+
+        # Score upper bounds (WAND / Block-Max WAND), xem build_bounds()
+        self.term_max = term_max            # (V,) max contribution của term
+        self.block_offsets = block_offsets  # (V + 1,) block range của term
+        self.block_max = block_max          # (n_blocks,) max contribution trong block
+        self.block_last = block_last        # (n_blocks,) internal doc id cuối của block
+
+        # Quantized impact = round(idf * tf-saturation / impact_scale), xem build_impacts()
+        self.impacts = impacts              # (nnz,) uint8 | uint16, song song với tfs
+        self.impact_scale = impact_scale
+
+    # ======================================================
+    # BUILD
+    # ======================================================
+    @classmethod
+    def from_dict(
+        cls,
+        postings: Dict[str, Dict[Any, int]],
+        doc_len: Dict[Any, int],
+        idf: Dict[str, float],
+        N: int,
+        avg_doc_len: float,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "CSRIndex":
+        """
+        Build from the dict layout used by BM25Index / the JSON index file.
+        Doc ids may be int or str (JSON keys), they are cast once here.
+        """
+        doc_keys = np.fromiter((int(k) for k in doc_len.keys()), dtype=np.int64, count=len(doc_len))
+        lengths = np.fromiter(doc_len.values(), dtype=np.int32, count=len(doc_len))
+        order = np.argsort(doc_keys, kind="stable")
+        doc_keys = doc_keys[order]
+        lengths = lengths[order]
+
+        terms = sorted(postings.keys())
+        vocab = {term: i for i, term in enumerate(terms)}
+
+        offsets = np.zeros(len(terms) + 1, dtype=OFFSET_DTYPE)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+
+        nnz = int(offsets[-1])
+        doc_ids = np.empty(nnz, dtype=DOC_ID_DTYPE)
+        tfs = np.empty(nnz, dtype=TF_DTYPE)
+        idf_arr = np.zeros(len(terms), dtype=np.float64)
+
+        for i, term in enumerate(terms):
+            docs = postings[term]
+            start, end = offsets[i], offsets[i + 1]
+
+            ext = np.fromiter((int(d) for d in docs.keys()), dtype=np.int64, count=len(docs))
+            tf = np.fromiter(docs.values(), dtype=TF_DTYPE, count=len(docs))
+
+            internal = np.searchsorted(doc_keys, ext)
+            order = np.argsort(internal, kind="stable")
+
+            doc_ids[start:end] = internal[order]
+            tfs[start:end] = tf[order]
+            idf_arr[i] = idf.get(term, 0.0)
+
+        return cls(
+            vocab=vocab,
+            offsets=offsets,
+            doc_ids=doc_ids,
+            tfs=tfs,
+            idf=idf_arr,
+            doc_keys=doc_keys,
+            doc_len=lengths,
+            N=N,
+            avg_doc_len=avg_doc_len,
+            k1=k1,
+            b=b,
+        )
+
+    @classmethod
+    def from_json_data(cls, data: Dict[str, Any]) -> "CSRIndex":
+        """
+        Build from the parsed JSON written by BM25Index.save().
+        """
+        meta = data["meta"]
+        return cls.from_dict(
+            postings=data["postings"],
+            doc_len=data["doc_len"],
+            idf=data["idf"],
+            N=meta["N"],
+            avg_doc_len=meta["avg_doc_len"],
+            k1=meta["k1"],
+            b=meta["b"],
+        )
+
+    def to_dict(self) -> Dict[str, Dict[int, int]]:
+        """
+        Convert back to the legacy `term -> {doc_id: tf}` layout (for comparison).
+        """
+        postings = {}
+        for term, t in self.vocab.items():
+            start, end = self.offsets[t], self.offsets[t + 1]
+            ext = self.doc_keys[self.doc_ids[start:end]].tolist()
+            postings[term] = dict(zip(ext, self.tfs[start:end].tolist()))
+        return postings
+
+    def contributions(self, t: int) -> np.ndarray:
+        """BM25 contribution of term id `t` to every doc in its posting list."""
+        start, end = self.offsets[t], self.offsets[t + 1]
+        docs = self.doc_ids[start:end]
+        tf = self.tfs[start:end].astype(np.float64)
+        return self.idf[t] * (tf * (self.k1 + 1)) / (tf + self.norm[docs])
+
+    @property
+    def has_bounds(self) -> bool:
+        return self.term_max is not None
+
+    def build_bounds(self, block_size: int = DEFAULT_BLOCK_SIZE) -> None:
+        """
+        Precompute per-term and per-block max contribution (WAND upper bounds).
+        Blocks are fixed runs of `block_size` postings inside each term.
+        """
+        V = len(self.vocab)
+        term_max = np.zeros(V, dtype=np.float64)
+        block_offsets = np.zeros(V + 1, dtype=OFFSET_DTYPE)
+
+        lengths = np.diff(self.offsets)
+        np.cumsum(-(-lengths // block_size), out=block_offsets[1:])
+
+        n_blocks = int(block_offsets[-1])
+        block_max = np.zeros(n_blocks, dtype=np.float64)
+        block_last = np.zeros(n_blocks, dtype=DOC_ID_DTYPE)
+
+        for t in range(V):
+            if lengths[t] == 0:
+                continue
+            c = self.contributions(t)
+            starts = np.arange(0, len(c), block_size)
+            ends = np.minimum(starts + block_size, len(c)) - 1
+
+            b0, b1 = block_offsets[t], block_offsets[t + 1]
+            block_max[b0:b1] = np.maximum.reduceat(c, starts)
+            block_last[b0:b1] = self.doc_ids[self.offsets[t] + ends]
+            term_max[t] = block_max[b0:b1].max()
+
+        self.term_max = term_max
+        self.block_offsets = block_offsets
+        self.block_max = block_max
+        self.block_last = block_last
+
+    @property
+    def has_impacts(self) -> bool:
+        return self.impacts is not None
+
+    def build_impacts(self, bits: int = 8) -> None:
+        """
+        Precompute a quantized impact per posting (idf x tf-saturation), so that
+        query-time scoring only sums small integers. Global linear quantization:
+        impact = round(contribution / scale), scale = max contribution / (2^bits - 1).
+        """
+        if bits not in _IMPACT_DTYPES:
+            raise ValueError(f"Impact bits must be one of {sorted(_IMPACT_DTYPES)}, got {bits}")
+        levels = (1 << bits) - 1
+
+        term_of_posting = np.repeat(np.arange(len(self.vocab)), np.diff(self.offsets))
+        tf = self.tfs.astype(np.float64)
+        contrib = self.idf[term_of_posting] * (tf * (self.k1 + 1)) / (tf + self.norm[self.doc_ids])
+
+        max_c = float(contrib.max()) if len(contrib) else 1.0
+        scale = max_c / levels if max_c > 0 else 1.0
+
+        # >= 1 để doc có chứa term vẫn giữ điểm > 0 như khi tính chính xác
+        q = np.clip(np.rint(contrib / scale), 1, levels)
+
+        self.impacts = q.astype(_IMPACT_DTYPES[bits])
+        self.impact_scale = scale
+
+    # ======================================================
+    # BINARY FORMAT
+    # ======================================================
+    def _sections(self) -> Dict[str, np.ndarray]:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        encoded = [t.encode("utf-8") for t in terms]
+        vocab_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=vocab_offsets[1:])
+        vocab_blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        sections = {
+            "doc_keys": self.doc_keys,
+            "doc_len": self.doc_len,
+            "offsets": self.offsets,
+            "doc_ids": self.doc_ids,
+            "tfs": self.tfs,
+            "idf": self.idf,
+            "vocab_offsets": vocab_offsets,
+            "vocab_blob": vocab_blob,
+        }
+        if self.has_bounds:
+            sections.update({name: getattr(self, name) for name in _BOUND_SECTIONS})
+        if self.has_impacts:
+            sections.update({name: getattr(self, name) for name in _IMPACT_SECTIONS})
+        return sections
+
+    def save_binary(self, out_path: str) -> None:
+        """
+        Write the versioned binary layout. Written to a temp file then renamed,
+        so readers never mmap a half-written index.
+        """
+        sections = {name: np.ascontiguousarray(a) for name, a in self._sections().items()}
+        meta = {
+            "N": self.N,
+            "avg_doc_len": self.avg_doc_len,
+            "k1": self.k1,
+            "b": self.b,
+        }
+        if self.has_impacts:
+            meta["impact_scale"] = self.impact_scale
+
+        # Header chứa offset của các section -> cố định độ dài bằng cách
+        # tính layout sau khi biết kích thước header (padding tới _ALIGN).
+        def layout(data_start):
+            table, pos = {}, data_start
+            for name, arr in sections.items():
+                pos = -(-pos // _ALIGN) * _ALIGN
+                table[name] = {"offset": pos, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+                pos += arr.nbytes
+            return table
+
+        data_start = 0
+        while True:
+            header = json.dumps({"meta": meta, "sections": layout(data_start)}).encode("utf-8")
+            needed = -(-(_PREAMBLE.size + len(header)) // _ALIGN) * _ALIGN
+            if needed == data_start:
+                break
+            data_start = needed
+
+        tmp_path = f"{out_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            table = json.loads(header)["sections"]
+            for name, arr in sections.items():
+                f.write(b"\0" * (table[name]["offset"] - f.tell()))
+                f.write(arr.tobytes())
+        os.replace(tmp_path, out_path)
+
+        print(f"✅ Binary index saved to {out_path}")
+
+    @classmethod
+    def open_binary(cls, path: str, mmap: bool = True) -> "CSRIndex":
+        """
+        Open a binary index. With mmap=True the arrays are read-only np.memmap
+        views, so worker processes opening the same file share its pages.
+        """
+        with open(path, "rb") as f:
+            magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"Not a binary BM25 index: {path}")
+            if version != FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported BM25 index version {version} (expected {FORMAT_VERSION})"
+                )
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        arrays = {}
+        for name, sec in header["sections"].items():
+            if name not in _CORE_SECTIONS + _BOUND_SECTIONS + _IMPACT_SECTIONS:
+                continue    # section của phiên bản mới hơn, bỏ qua
+            dtype, shape = np.dtype(sec["dtype"]), tuple(sec["shape"])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=sec["offset"], shape=shape)
+            else:
+                arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                           offset=sec["offset"]).reshape(shape)
+
+        blob = bytes(arrays.pop("vocab_blob"))
+        bounds = arrays.pop("vocab_offsets").tolist()
+        vocab = {
+            blob[bounds[i]:bounds[i + 1]].decode("utf-8"): i
+            for i in range(len(bounds) - 1)
+        }
+
+        meta = header["meta"]
+        return cls(
+            vocab=vocab,
+            N=meta["N"],
+            avg_doc_len=meta["avg_doc_len"],
+            k1=meta["k1"],
+            b=meta["b"],
+            impact_scale=meta.get("impact_scale"),
+            **arrays,
+        )
+
+    # ======================================================
+    # LOOKUP
+    # ======================================================
+    def __contains__(self, term: str) -> bool:
+        return term in self.vocab
+
+    def __len__(self) -> int:
+        return len(self.vocab)
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_keys)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the posting / doc arrays (vocab dict not included)."""
+        return sum(
+            a.nbytes for a in (
+                self.offsets, self.doc_ids, self.tfs,
+                self.idf, self.doc_keys, self.doc_len,
+                self.term_max, self.block_offsets, self.block_max, self.block_last,
+                self.impacts,
+            ) if a is not None
+        )
+
+    def get(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (internal doc ids, tfs) views for a term.
+        Empty arrays if term is not in the vocabulary.
+        """
+        t = self.vocab.get(term)
+        if t is None:
+            return self.doc_ids[:0], self.tfs[:0]
+        start, end = self.offsets[t], self.offsets[t + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def get_idf(self, term: str) -> float:
+        t = self.vocab.get(term)
+        return 0.0 if t is None else float(self.idf[t])
+
+    def to_internal(self, doc_id: int) -> int:
+        """External doc id -> internal index, -1 if unknown."""
+        i = int(np.searchsorted(self.doc_keys, doc_id))
+        if i < len(self.doc_keys) and self.doc_keys[i] == doc_id:
+            return i
+        return -1
+
+    def tf(self, term: str, internal_id: int) -> int:
+        docs, tfs = self.get(term)
+        i = int(np.searchsorted(docs, internal_id))
+        if i < len(docs) and docs[i] == internal_id:
+            return int(tfs[i])
+        return 0
+
+    def candidates(self, terms: Iterable[str]) -> np.ndarray:
+        """
+        Internal ids of every doc containing at least one of `terms` (sorted, unique).
+        """
+        lists = [self.get(term)[0] for term in set(terms) if term in self.vocab]
+        if not lists:
+            return np.empty(0, dtype=DOC_ID_DTYPE)
+        return np.unique(np.concatenate(lists))
+
+    # ======================================================
+    # SCORING (term-at-a-time)
+    # ======================================================
+    def score(self, query_terms: List[str]) -> np.ndarray:
+        """
+        Dense BM25 score accumulator over internal doc ids.
+
+        Each query term (duplicates included, in query order) adds its
+        contribution to the docs in its posting list, so per-doc sums are
+        bit-identical to the legacy per-doc `_compute_score` loop.
+        """
+        acc = np.zeros(self.num_docs, dtype=np.float64)
+
+        for term in query_terms:
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            acc[self.doc_ids[start:end]] += self.contributions(t)
+
+        return acc
+
+    def score_impacts(self, query_terms: List[str]) -> np.ndarray:
+        """
+        Integer accumulator of quantized impacts (multiply by impact_scale for
+        approximate BM25 scores). Requires build_impacts().
+        """
+        if not self.has_impacts:
+            raise RuntimeError("Index has no impact scores, call build_impacts() first")
+
+        acc = np.zeros(self.num_docs, dtype=np.int32)
+        for term in query_terms:
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            acc[self.doc_ids[start:end]] += self.impacts[start:end]
+
+        return acc
+
+    def top_k_impacts(self, query_terms: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as top_k(), ranked on quantized impacts."""
+        ids, q = self.select_top_k(self.score_impacts(query_terms), k)
+        return ids, q * self.impact_scale
+
+    def top_k(self, query_terms: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (internal doc ids, scores) of the k best docs with score > 0,
+        sorted by descending score.
+        """
+        acc = self.score(query_terms)
+        return self.select_top_k(acc, k)
+
+    def score_batch(self, queries: List[List[str]]) -> np.ndarray:
+        """
+        Dense (len(queries), num_docs) score matrix. Contribution arrays are
+        computed once per distinct term and shared by every query of the
+        batch; row i is bit-identical to score(queries[i]).
+        """
+        acc = np.zeros((len(queries), self.num_docs), dtype=np.float64)
+        contribs: Dict[int, np.ndarray] = {}
+
+        for row, query_terms in enumerate(queries):
+            for term in query_terms:
+                t = self.vocab.get(term)
+                if t is None:
+                    continue
+                contrib = contribs.get(t)
+                if contrib is None:
+                    contrib = contribs[t] = self.contributions(t)
+                start, end = self.offsets[t], self.offsets[t + 1]
+                acc[row, self.doc_ids[start:end]] += contrib
+
+        return acc
+
+    def top_k_batch(
+        self,
+        queries: List[List[str]],
+        k: int,
+        block_size: int = 64,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        top_k() for many queries. Queries are scored in blocks of `block_size`
+        rows so the score matrix stays bounded (block_size * num_docs floats).
+        """
+        results = []
+        for i in range(0, len(queries), block_size):
+            acc = self.score_batch(queries[i:i + block_size])
+            results.extend(self.select_top_k(row, k) for row in acc)
+        return results
+
+    @staticmethod
+    def select_top_k(acc: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """argpartition-based top-k over a dense score accumulator."""
+        hits = np.flatnonzero(acc > 0)
+        if k <= 0 or len(hits) == 0:
+            return hits[:0], acc[:0]
+
+        scores = acc[hits]
+        if len(hits) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            hits, scores = hits[part], scores[part]
+
+        order = np.argsort(-scores, kind="stable")
+        return hits[order], scores[order]
+
+
+def convert_json_index(json_path: str, out_path: str, impact_bits: Optional[int] = None) -> CSRIndex:
+    """
+    Convert a JSON index written by BM25Index.save() to the binary format.
+    impact_bits (8 | 16) additionally stores quantized impact scores.
+    """
+    print(f"📂 Loading JSON index from {json_path}...")
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    index = CSRIndex.from_json_data(data)
+    index.build_bounds()
+    if impact_bits:
+        index.build_impacts(bits=impact_bits)
+    index.save_binary(out_path)
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a JSON BM25 index to the binary CSR format")
+    parser.add_argument("json_path")
+    parser.add_argument("out_path")
+    parser.add_argument("--impact-bits", type=int, choices=[8, 16], default=None,
+                        help="Also store quantized impact scores")
+    args = parser.parse_args()
+
+    convert_json_index(args.json_path, args.out_path, impact_bits=args.impact_bits)
@@ -0,0 +1,431 @@
+"""
+LSM-style segmented BM25 index.
+
+Thay vì sửa index dict nguyên khối rồi ghi lại toàn bộ JSON, tài liệu mới
+được ghi thành một segment nhỏ, bất biến (binary CSR, xem bm25_csr.py).
+Xóa / thay thế doc dùng tombstone. Truy vấn chạy qua tất cả segment với
+thống kê toàn cục (N, avg_doc_len, df đã trừ doc bị xóa), nên điểm trùng
+với một index nguyên khối chứa cùng tập doc còn sống.
+
+Layout thư mục:
+
+    <index_dir>/manifest.json     {"version", "k1", "b", "next_gen",
+                                   "segments": [{"name", "deleted": [doc_id]}]}
+    <index_dir>/seg_000001.bin    segment (CSRIndex binary)
+    ...
+
+Merge policy (tiered): các segment được xếp tầng theo số doc còn sống
+(floor log cơ số merge_factor, tính bằng số nguyên); tầng nào có
+>= merge_factor segment thì gộp lại.
+Segment có tỉ lệ doc bị xóa > expunge_ratio được ghi lại để dọn tombstone.
+Merge chạy ở background thread, truy vấn không bị chặn.
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import json
+import math
+import threading
+import numpy as np
+
+from data_generator.utils.bm25_csr import CSRIndex
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class _Segment:
+    """One immutable CSR segment + its tombstone mask (copy-on-write)."""
+
+    def __init__(self, name: str, index: CSRIndex, deleted: Optional[np.ndarray] = None):
+        self.name = name
+        self.index = index
+        self.deleted = deleted if deleted is not None else np.zeros(index.num_docs, dtype=bool)
+
+    @property
+    def live_count(self) -> int:
+        return int(self.index.num_docs - np.count_nonzero(self.deleted))
+
+    @property
+    def live_len(self) -> int:
+        return int(self.index.doc_len[~self.deleted].sum())
+
+    @property
+    def deleted_ratio(self) -> float:
+        return 0.0 if self.index.num_docs == 0 else 1 - self.live_count / self.index.num_docs
+
+    def find(self, doc_id: int) -> int:
+        """Internal id of a live doc, -1 if absent or deleted."""
+        i = self.index.to_internal(doc_id)
+        return i if i >= 0 and not self.deleted[i] else -1
+
+    def deleted_doc_ids(self) -> List[int]:
+        return self.index.doc_keys[self.deleted].tolist()
+
+
+class SegmentedBM25Index:
+    """
+    Immutable BM25 segments with global statistics, tombstones and background merge.
+    """
+
+    def __init__(
+        self,
+        index_dir: str,
+        k1: float = 1.5,
+        b: float = 0.75,
+        merge_factor: int = 4,
+        expunge_ratio: float = 0.3,
+        background_merge: bool = True,
+    ):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.merge_factor = merge_factor
+        self.expunge_ratio = expunge_ratio
+        self.background_merge = background_merge
+
+        self.segments: List[_Segment] = []
+        self.next_gen = 1
+
+        self._lock = threading.RLock()
+        self._merge_thread: Optional[threading.Thread] = None
+
+        os.makedirs(index_dir, exist_ok=True)
+        if os.path.exists(self._manifest_path):
+            self._load_manifest()
+        else:
+            self._write_manifest()
+
+    # ======================================================
+    # MANIFEST
+    # ======================================================
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.index_dir, MANIFEST_NAME)
+
+    @staticmethod
+    def is_segmented_index(path: str) -> bool:
+        return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+    def _load_manifest(self) -> None:
+        with open(self._manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported segment manifest version: {manifest.get('version')}")
+
+        self.k1 = manifest["k1"]
+        self.b = manifest["b"]
+        self.next_gen = manifest["next_gen"]
+
+        self.segments = []
+        for entry in manifest["segments"]:
+            index = CSRIndex.open_binary(os.path.join(self.index_dir, entry["name"]))
+            segment = _Segment(entry["name"], index)
+            if entry["deleted"]:
+                ids = np.searchsorted(index.doc_keys, np.asarray(entry["deleted"], dtype=np.int64))
+                segment.deleted[ids] = True
+            self.segments.append(segment)
+
+        print(f"📂 Loaded {len(self.segments)} BM25 segments from {self.index_dir}")
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "next_gen": self.next_gen,
+            "segments": [
+                {"name": seg.name, "deleted": seg.deleted_doc_ids()}
+                for seg in self.segments
+            ],
+        }
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _new_segment_name(self) -> str:
+        name = f"seg_{self.next_gen:06d}.bin"
+        self.next_gen += 1
+        return name
+
+    # ======================================================
+    # WRITE PATH
+    # ======================================================
+    def _write_segment(self, postings: Dict[str, Dict[int, int]], doc_len: Dict[int, int]) -> _Segment:
+        N = len(doc_len)
+        index = CSRIndex.from_dict(
+            postings=postings,
+            doc_len=doc_len,
+            idf={},                 # idf tính lúc truy vấn từ thống kê toàn cục
+            N=N,
+            avg_doc_len=sum(doc_len.values()) / N,
+            k1=self.k1,
+            b=self.b,
+        )
+        with self._lock:
+            name = self._new_segment_name()
+        path = os.path.join(self.index_dir, name)
+        index.save_binary(path)
+        return _Segment(name, CSRIndex.open_binary(path))
+
+    def add_documents(self, docs: Iterable[Tuple[int, List[str]]]) -> int:
+        """
+        Add tokenized docs [(doc_id, tokens), ...] as one new segment.
+        A doc id that is already live is replaced (old version tombstoned).
+        Returns the number of docs written.
+        """
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        doc_len: Dict[int, int] = {}
+
+        for doc_id, tokens in docs:
+            doc_id = int(doc_id)
+            doc_len[doc_id] = len(tokens)
+            tf_counter = defaultdict(int)
+            for t in tokens:
+                tf_counter[t] += 1
+            for term, tf in tf_counter.items():
+                postings[term][doc_id] = tf
+
+        if not doc_len:
+            return 0
+
+        segment = self._write_segment(dict(postings), doc_len)
+
+        with self._lock:
+            self._delete_locked(doc_len.keys())
+            self.segments.append(segment)
+            self._write_manifest()
+
+        print(f"✅ Added segment {segment.name} ({len(doc_len)} docs)")
+        self.maybe_merge()
+        return len(doc_len)
+
+    def add_csr(self, index: CSRIndex) -> None:
+        """Import an existing monolithic index (e.g. converted JSON) as one segment."""
+        with self._lock:
+            name = self._new_segment_name()
+        path = os.path.join(self.index_dir, name)
+        index.save_binary(path)
+        segment = _Segment(name, CSRIndex.open_binary(path))
+
+        with self._lock:
+            self._delete_locked(index.doc_keys.tolist())
+            self.segments.append(segment)
+            self._write_manifest()
+
+    def delete(self, doc_ids: Iterable[int]) -> int:
+        """
+        Tombstone doc ids. Returns the number of live docs deleted.
+        Fully deleted segments are dropped and heavily deleted ones expunged
+        (maybe_merge), like after add_documents().
+        """
+        with self._lock:
+            deleted = self._delete_locked(doc_ids)
+            if deleted:
+                self._write_manifest()
+        if deleted:
+            self.maybe_merge()
+        return deleted
+
+    def _delete_locked(self, doc_ids: Iterable[int], segments: Optional[List[_Segment]] = None) -> int:
+        doc_ids = [int(d) for d in doc_ids]
+        deleted = 0
+        for seg in (self.segments if segments is None else segments):
+            hits = [i for i in (seg.find(d) for d in doc_ids) if i >= 0]
+            if not hits:
+                continue
+            mask = seg.deleted.copy()       # copy-on-write: truy vấn đang chạy giữ mask cũ
+            mask[hits] = True
+            seg.deleted = mask
+            deleted += len(hits)
+        return deleted
+
+    # ======================================================
+    # MERGE
+    # ======================================================
+    def _tier(self, live_count: int) -> int:
+        """floor(log_merge_factor(live_count)) in integers (math.log(1000, 10) = 2.99...)."""
+        tier = 0
+        while live_count >= self.merge_factor:
+            live_count //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _pick_merge(self) -> List[_Segment]:
+        segments = [s for s in self.segments if s.live_count > 0]
+
+        tiers = defaultdict(list)
+        for seg in segments:
+            tiers[self._tier(seg.live_count)].append(seg)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier][:self.merge_factor]
+
+        for seg in segments:
+            if seg.deleted_ratio > self.expunge_ratio:
+                return [seg]
+        return []
+
+    def _drop_empty_locked(self) -> None:
+        empty = [s for s in self.segments if s.live_count == 0]
+        if empty:
+            self.segments = [s for s in self.segments if s.live_count > 0]
+            self._write_manifest()
+            self._remove_files(empty)
+
+    def maybe_merge(self) -> None:
+        """Drop fully deleted segments and start merging if the policy asks for it."""
+        with self._lock:
+            self._drop_empty_locked()
+
+            if self._merge_thread is not None and self._merge_thread.is_alive():
+                return
+            if not self._pick_merge():
+                return
+
+            if self.background_merge:
+                self._merge_thread = threading.Thread(target=self._merge_pending, daemon=True)
+                self._merge_thread.start()
+                return
+
+        self._merge_pending()
+
+    def _merge_pending(self) -> None:
+        """Keep merging until the policy is satisfied (merges can cascade up tiers)."""
+        while True:
+            with self._lock:
+                self._drop_empty_locked()
+                sources = self._pick_merge()
+            if not sources:
+                return
+            self._merge(sources)
+
+    def _merge(self, sources: List[_Segment]) -> None:
+        with self._lock:
+            snapshot = {id(s): s.deleted for s in sources}
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        doc_len: Dict[int, int] = {}
+        for seg in sources:
+            live = ~snapshot[id(seg)]
+            keys = seg.index.doc_keys
+            doc_len.update(zip(keys[live].tolist(), seg.index.doc_len[live].tolist()))
+            for term in seg.index.vocab:
+                docs, tfs = seg.index.get(term)
+                m = live[docs]
+                if m.any():
+                    postings[term].update(zip(keys[docs[m]].tolist(), tfs[m].tolist()))
+
+        merged = self._write_segment(dict(postings), doc_len) if doc_len else None
+
+        with self._lock:
+            # Tombstone đến trong lúc merge -> áp lại lên segment mới
+            late = []
+            for seg in sources:
+                late.extend(seg.index.doc_keys[seg.deleted & ~snapshot[id(seg)]].tolist())
+
+            source_ids = {id(s) for s in sources}
+            position = min(i for i, s in enumerate(self.segments) if id(s) in source_ids)
+            remaining = [s for s in self.segments if id(s) not in source_ids]
+            if merged is not None:
+                remaining.insert(position, merged)
+            self.segments = remaining
+            if merged is not None and late:
+                self._delete_locked(late, segments=[merged])
+            self._write_manifest()
+
+        self._remove_files(sources)
+        print(f"🔀 Merged {len(sources)} segments -> {merged.name if merged else '(empty)'}")
+
+    def _remove_files(self, segments: List[_Segment]) -> None:
+        for seg in segments:
+            try:
+                os.remove(os.path.join(self.index_dir, seg.name))
+            except OSError as e:
+                print(f"⚠️ Could not remove segment file {seg.name}: {e}")
+
+    def wait_for_merges(self) -> None:
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join()
+
+    # ======================================================
+    # QUERY
+    # ======================================================
+    def __len__(self) -> int:
+        return len(set().union(*(s.index.vocab for s in self.segments))) if self.segments else 0
+
+    def __contains__(self, term: str) -> bool:
+        return any(term in s.index.vocab for s in self.segments)
+
+    @property
+    def N(self) -> int:
+        return sum(s.live_count for s in self.segments)
+
+    def global_stats(
+        self,
+        snapshot: List[Tuple[_Segment, np.ndarray]],
+        query_terms: List[str]
+    ) -> Tuple[int, float, Dict[str, float]]:
+        """
+        (N, avg_doc_len, idf per query term) over the live docs of a
+        [(segment, deleted mask), ...] snapshot. Scoring passes the same
+        masks, so a concurrent delete cannot skew the stats vs the scores.
+        """
+        N = sum(len(deleted) - int(np.count_nonzero(deleted)) for _, deleted in snapshot)
+        total_len = sum(int(seg.index.doc_len[~deleted].sum()) for seg, deleted in snapshot)
+        avg_doc_len = total_len / N if N else 0.0
+
+        idf = {}
+        for term in set(query_terms):
+            df = 0
+            for seg, deleted in snapshot:
+                docs, _ = seg.index.get(term)
+                df += len(docs) - int(np.count_nonzero(deleted[docs]))
+            if df:
+                idf[term] = math.log((N - df + 0.5) / (df + 0.5) + 1)
+        return N, avg_doc_len, idf
+
+    def top_k(self, query_terms: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (external doc ids, scores) of the k best live docs, sorted by
+        descending score. Per-doc scores equal a monolithic index over the same docs.
+        """
+        with self._lock:
+            segments = [(s, s.deleted) for s in self.segments]
+
+        N, avg_doc_len, idf = self.global_stats(segments, query_terms)
+        if not N or not idf:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        k1_plus_1 = self.k1 + 1
+        all_ids, all_scores = [], []
+        for seg, deleted in segments:
+            index = seg.index
+            norm = self.k1 * (1 - self.b + self.b * index.doc_len / avg_doc_len)
+            acc = np.zeros(index.num_docs, dtype=np.float64)
+
+            for term in query_terms:
+                if term not in idf:
+                    continue
+                docs, tfs = index.get(term)
+                if len(docs) == 0:
+                    continue
+                tf = tfs.astype(np.float64)
+                acc[docs] += idf[term] * (tf * k1_plus_1) / (tf + norm[docs])
+
+            acc[deleted] = 0.0
+            ids, scores = CSRIndex.select_top_k(acc, k)
+            all_ids.append(index.doc_keys[ids])
+            all_scores.append(scores)
+
+        ids = np.concatenate(all_ids)
+        scores = np.concatenate(all_scores)
+        if len(scores) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return ids[order], scores[order]
@@ -0,0 +1,183 @@
+"""
+Dynamic-pruning top-k over a CSRIndex, vectorized (Block-Max MaxScore).
+
+Mỗi term có upper bound toàn cục (term_max) và theo block (block_max,
+block_last). Thay vì duyệt từng doc bằng vòng lặp Python (DAAT WAND),
+việc cắt tỉa làm trên mảng NumPy:
+
+    1. Ngưỡng ban đầu: chấm điểm chính xác các doc trong những block có
+       upper bound cao nhất -> điểm thứ k là cận dưới của top-k thật.
+    2. Term "không thiết yếu": nhóm term có tổng upper bound <= ngưỡng
+       (thường là term phổ biến: "tôi", "bị", ...). Doc chỉ chứa các term
+       này không thể vào top-k, nên ứng viên = posting của term thiết yếu.
+    3. Điểm một phần (term thiết yếu, TAAT) + block_max của term không
+       thiết yếu -> upper bound từng ứng viên, loại doc <= ngưỡng.
+    4. Doc còn lại: tra posting của term không thiết yếu bằng searchsorted
+       thay vì duyệt hết posting list.
+
+Điểm được cộng theo đúng thứ tự term trong query nên top-k trùng bit với
+CSRIndex.top_k (tính điểm vét cạn).
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from data_generator.utils.bm25_csr import CSRIndex
+
+# Nới upper bound một chút để sai số làm tròn không loại nhầm doc
+_BOUND_SLACK = 1.0 + 1e-9
+
+
+class _TermBlocks:
+    """Posting slice + block layout of one (unique) query term."""
+
+    __slots__ = ("t", "weight", "docs", "tfs", "ub", "bound", "starts", "ends", "first", "last")
+
+    def __init__(self, index: CSRIndex, t: int, weight: int):
+        start, end = index.offsets[t], index.offsets[t + 1]
+        self.t = t
+        self.weight = weight        # số lần term lặp trong query
+        self.docs = index.doc_ids[start:end]
+        self.tfs = index.tfs[start:end]
+
+        b0, b1 = index.block_offsets[t], index.block_offsets[t + 1]
+        self.ub = weight * float(index.term_max[t]) * _BOUND_SLACK
+        self.bound = weight * index.block_max[b0:b1] * _BOUND_SLACK
+        self.last = index.block_last[b0:b1]
+
+        # Vị trí posting [starts, ends] của từng block (doc id tăng dần, không trùng)
+        self.ends = np.searchsorted(self.docs, self.last)
+        self.starts = np.concatenate(([0], self.ends[:-1] + 1))
+        self.first = self.docs[self.starts]
+
+    def lookup(self, docs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(mask of `docs` present in the posting list, their posting positions)."""
+        pos = np.minimum(np.searchsorted(self.docs, docs), len(self.docs) - 1)
+        found = self.docs[pos] == docs
+        return found, pos[found]
+
+    def block_bounds(self, docs: np.ndarray) -> np.ndarray:
+        """Weighted block max of the block covering each doc (0 outside every block)."""
+        b = np.minimum(np.searchsorted(self.last, docs), len(self.last) - 1)
+        return np.where(self.first[b] <= docs, self.bound[b], 0.0) * (docs <= self.last[-1])
+
+
+def _contributions(index: CSRIndex, t: int, docs: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+    """Same expression as CSRIndex.contributions, on a subset of the postings."""
+    tf = tfs.astype(np.float64)
+    return index.idf[t] * (tf * (index.k1 + 1)) / (tf + index.norm[docs])
+
+
+def _sorted_unique(arrays: List[np.ndarray]) -> np.ndarray:
+    docs = np.sort(np.concatenate(arrays), kind="stable")
+    return docs[np.concatenate(([True], docs[1:] != docs[:-1]))] if len(docs) else docs
+
+
+def _score_docs(index: CSRIndex, terms: List[_TermBlocks], docs: np.ndarray) -> Dict[int, np.ndarray]:
+    """Per-term contribution rows for `docs` (0.0 where the term is absent)."""
+    rows = {}
+    for tb in terms:
+        found, pos = tb.lookup(docs)
+        row = np.zeros(len(docs), dtype=np.float64)
+        row[found] = _contributions(index, tb.t, docs[found], tb.tfs[pos])
+        rows[tb.t] = row
+    return rows
+
+
+def _sum_in_query_order(rows: Dict[int, np.ndarray], term_order: List[int], n: int) -> np.ndarray:
+    # Cộng 0.0 không đổi giá trị -> trùng bit với acc[docs] += contrib của TAAT
+    acc = np.zeros(n, dtype=np.float64)
+    for t in term_order:
+        acc += rows[t]
+    return acc
+
+
+def wand_top_k(
+    index: CSRIndex,
+    query_terms: List[str],
+    k: int,
+    stats: Optional[Dict[str, int]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pruned top-k. Same contract as CSRIndex.top_k: returns (internal doc
+    ids, scores) sorted by descending score, scores > 0. Requires the score
+    upper bounds (CSRIndex.build_bounds; stored in the binary index by
+    BM25Generator / convert_json_index, built by BM25Retriever.load_index).
+
+    stats (optional dict) receives counters: docs_scored, postings_scored,
+    postings_skipped, postings_total.
+    """
+    if not index.has_bounds:
+        raise RuntimeError("Index has no score upper bounds, call build_bounds() first")
+
+    term_order = [index.vocab[t] for t in query_terms if t in index.vocab]
+    terms = [_TermBlocks(index, t, w) for t, w in Counter(term_order).items()]
+    terms = [tb for tb in terms if len(tb.docs)]
+
+    counters = {
+        "docs_scored": 0,
+        "postings_scored": 0,
+        "postings_skipped": 0,
+        "postings_total": sum(len(tb.docs) for tb in terms),
+    }
+    ids, scores = np.empty(0, dtype=index.doc_ids.dtype), np.empty(0, dtype=np.float64)
+    if k <= 0 or not terms:
+        if stats is not None:
+            stats.update(counters)
+        return ids, scores
+    term_order = [t for t in term_order if index.offsets[t + 1] > index.offsets[t]]
+
+    # ---------- 1. Ngưỡng ban đầu từ các block có bound cao nhất ----------
+    owner = np.repeat(np.arange(len(terms)), [len(tb.bound) for tb in terms])
+    local = np.concatenate([np.arange(len(tb.bound)) for tb in terms])
+    order = np.argsort(-np.concatenate([tb.bound for tb in terms]), kind="stable")
+    sizes = np.concatenate([tb.ends - tb.starts + 1 for tb in terms])[order]
+    seed = order[:int(np.searchsorted(np.cumsum(sizes), k)) + 1]
+
+    seed_docs = _sorted_unique([
+        terms[i].docs[terms[i].starts[j]:terms[i].ends[j] + 1]
+        for i, j in zip(owner[seed].tolist(), local[seed].tolist())
+    ])
+    threshold = 0.0
+    if len(seed_docs) >= k:
+        seed_scores = _sum_in_query_order(_score_docs(index, terms, seed_docs), term_order, len(seed_docs))
+        threshold = float(np.partition(seed_scores, len(seed_scores) - k)[len(seed_scores) - k])
+
+    # ---------- 2. Tách term thiết yếu / không thiết yếu (MaxScore) ----------
+    terms.sort(key=lambda tb: tb.ub)
+    cum_ub = np.cumsum([tb.ub for tb in terms])
+    n_lazy = int(np.searchsorted(cum_ub, threshold, side="right"))
+    lazy, essential = terms[:n_lazy], terms[n_lazy:]
+
+    # ---------- 3. Ứng viên + upper bound theo block ----------
+    cand = _sorted_unique([tb.docs for tb in essential])
+    rows = {}
+    partial = np.zeros(len(cand), dtype=np.float64)
+    for tb in essential:
+        row = np.zeros(len(cand), dtype=np.float64)
+        row[np.searchsorted(cand, tb.docs)] = _contributions(index, tb.t, tb.docs, tb.tfs)
+        rows[tb.t] = row
+        partial += tb.weight * row
+        counters["postings_scored"] += len(tb.docs)
+
+    bound = partial * _BOUND_SLACK
+    for tb in lazy:
+        bound += tb.block_bounds(cand)
+    survive = bound > threshold
+    cand = cand[survive]
+    rows = {t: row[survive] for t, row in rows.items()}
+
+    # ---------- 4. Tra posting của term không thiết yếu cho doc còn lại ----------
+    lazy_rows = _score_docs(index, lazy, cand)
+    rows.update(lazy_rows)
+    counters["postings_scored"] += sum(int(np.count_nonzero(row)) for row in lazy_rows.values())
+    counters["postings_skipped"] = counters["postings_total"] - counters["postings_scored"]
+    counters["docs_scored"] = len(cand)
+
+    if stats is not None:
+        stats.update(counters)
+
+    acc = _sum_in_query_order(rows, term_order, len(cand))
+    top, scores = CSRIndex.select_top_k(acc, k)
+    return cand[top].astype(index.doc_ids.dtype), scores
@@ -1 +1,2 @@
-from database.db_qdrant import QDrantDB
\ No newline at end of file
+from database.db_qdrant import QDrantDB
+from database.db_local import LocalVectorDB
\ No newline at end of file
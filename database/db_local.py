@@ -0,0 +1,316 @@
+import os
+import json
+import shutil
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from tqdm import tqdm
+from database.base import BaseVectorDB
+
+try:
+    import faiss
+except ImportError:          # FAISS là tùy chọn, fallback sang NumPy
+    faiss = None
+
+SNAPSHOT_VERSION = 2                # 1 = file dữ liệu nằm ngay trong snapshot_dir (vẫn đọc được)
+MANIFEST_FILE = "manifest.json"
+DATA_PREFIX = "data_"               # thư mục dữ liệu theo thế hệ: data_000001, data_000002, ...
+VECTORS_FILE = "vectors.npy"        # float32 (N, dim), đã chuẩn hóa L2 -> inner product = cosine
+IDS_FILE = "ids.npy"                # int64 (N,)
+PAYLOADS_FILE = "payloads.jsonl"    # một payload JSON mỗi dòng, cùng thứ tự với vectors
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalVectorDB(BaseVectorDB):
+    """
+    In-process cosine vector store loaded from an on-disk snapshot.
+
+    Snapshot layout (one directory):
+        manifest.json       {version, dim, count, distance, data}
+        data_<gen>/         immutable data of one save() generation:
+            vectors.npy     float32 (N, dim), L2-normalized, opened with mmap
+            ids.npy         int64 (N,) point ids
+            payloads.jsonl  one payload per line (category, content, ...)
+
+    save() writes a new data_<gen> directory, then commits it by replacing
+    manifest.json (os.replace, atomic); a crash at any point leaves the
+    previous snapshot readable. Older generations are removed afterwards.
+
+    Search uses a FAISS IndexFlatIP when faiss is installed and
+    use_faiss=True, otherwise a NumPy matmul over the memory-mapped vectors.
+    IndexFlatIP keeps its own in-RAM copy of the vectors, so with mmap=True
+    FAISS is only used while the vectors fit in `faiss_max_bytes`; larger
+    snapshots stay memory-mapped and are searched with NumPy.
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: str,
+        use_faiss: bool = True,
+        mmap: bool = True,
+        faiss_max_bytes: int = 512 * 1024 ** 2,     # mmap=True: ngưỡng copy vector vào FAISS
+    ):
+        super().__init__()
+        self.snapshot_dir = snapshot_dir
+        self.use_faiss = use_faiss and faiss is not None
+        self.mmap = mmap
+        self.faiss_max_bytes = faiss_max_bytes
+
+        self.dim: Optional[int] = None
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.payloads: List[Dict[str, Any]] = []
+        self.id_to_row: Dict[int, int] = {}
+        self.index = None
+
+        if os.path.exists(os.path.join(snapshot_dir, MANIFEST_FILE)):
+            self.load()
+
+    # ======================================================
+    # SNAPSHOT
+    # ======================================================
+    def load(self) -> None:
+        with open(os.path.join(self.snapshot_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") not in (1, SNAPSHOT_VERSION):
+            raise ValueError(f"Unsupported snapshot version: {manifest.get('version')}")
+
+        data_dir = os.path.join(self.snapshot_dir, manifest.get("data", ""))
+        self.dim = manifest["dim"]
+        self.vectors = np.load(os.path.join(data_dir, VECTORS_FILE), mmap_mode="r" if self.mmap else None)
+        self.ids = np.load(os.path.join(data_dir, IDS_FILE))
+        with open(os.path.join(data_dir, PAYLOADS_FILE), "r", encoding="utf-8") as f:
+            self.payloads = [json.loads(line) for line in f]
+
+        if not (len(self.vectors) == len(self.ids) == len(self.payloads) == manifest["count"]):
+            raise ValueError(f"Corrupted snapshot in {self.snapshot_dir}: array lengths differ")
+
+        self._build_lookup()
+        print(f"📂 Local vector snapshot loaded: {len(self.ids)} points, dim={self.dim}"
+              f" ({'faiss' if self.index is not None else 'numpy'})")
+
+    def _generations(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.snapshot_dir)
+            if name.startswith(DATA_PREFIX) and os.path.isdir(os.path.join(self.snapshot_dir, name))
+        )
+
+    def save(self) -> None:
+        """
+        Write a new data generation, then commit it by atomically replacing
+        manifest.json. Readers see either the old or the new snapshot.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        generations = self._generations()
+        # Số thế hệ luôn tăng: không ghi đè thư mục dở dang của một lần save bị ngắt
+        gen = int(generations[-1][len(DATA_PREFIX):]) + 1 if generations else 1
+        data_name = f"{DATA_PREFIX}{gen:06d}"
+        data_dir = os.path.join(self.snapshot_dir, data_name)
+        os.makedirs(data_dir)
+
+        np.save(os.path.join(data_dir, VECTORS_FILE), np.asarray(self.vectors, dtype=np.float32))
+        np.save(os.path.join(data_dir, IDS_FILE), self.ids)
+        with open(os.path.join(data_dir, PAYLOADS_FILE), "w", encoding="utf-8") as f:
+            for payload in self.payloads:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+        manifest_path = os.path.join(self.snapshot_dir, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": SNAPSHOT_VERSION,
+                "dim": self.dim,
+                "count": len(self.ids),
+                "distance": "cosine",
+                "data": data_name,
+            }, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        # Mở lại từ thế hệ mới, rồi mới dọn thế hệ cũ (mmap cũ không còn được dùng)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.index = None
+        self.load()
+        self._remove_stale(keep=data_name)
+
+    def _remove_stale(self, keep: str) -> None:
+        """Drop older generations and the files of a version-1 (flat) snapshot."""
+        for name in self._generations():
+            if name != keep:
+                shutil.rmtree(os.path.join(self.snapshot_dir, name), ignore_errors=True)
+        for name in (VECTORS_FILE, IDS_FILE, PAYLOADS_FILE):
+            path = os.path.join(self.snapshot_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _build_lookup(self) -> None:
+        self.id_to_row = {int(point_id): row for row, point_id in enumerate(self.ids.tolist())}
+        self.index = None
+        if not self.use_faiss or not len(self.ids):
+            return
+        # IndexFlatIP copy toàn bộ vector vào RAM -> snapshot mmap lớn dùng NumPy trên mmap
+        if self.mmap and self.vectors.nbytes > self.faiss_max_bytes:
+            return
+        self.index = faiss.IndexFlatIP(self.dim)
+        self.index.add(np.ascontiguousarray(self.vectors, dtype=np.float32))
+
+    # ======================================================
+    # BaseVectorDB interface
+    # ======================================================
+    def create_collection(self, vector_size: int, **kwargs):
+        if self.dim is not None and self.dim != vector_size:
+            raise ValueError(f"Snapshot dim is {self.dim}, got vector_size={vector_size}")
+        self.dim = vector_size
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def upsert_points(self, points: List[Dict[str, Any]], **kwargs):
+        """Same point format as QDrantDB.upsert_points (id, embedding, payload fields)."""
+        if not points:
+            return
+
+        new_vectors = _normalize(np.array([p["embedding"] for p in points], dtype=np.float32))
+        if self.dim is None:
+            self.dim = new_vectors.shape[1]
+        elif new_vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected dim {self.dim}, got {new_vectors.shape[1]}")
+
+        new_ids = [int(p["id"]) for p in points]
+        new_payloads = [
+            {key: p.get(key) for key in ("source_file", "category", "section", "content")}
+            for p in points
+        ]
+
+        # Point trùng id: bản mới thay bản cũ
+        replaced = set(new_ids)
+        keep = [row for row, point_id in enumerate(self.ids.tolist()) if point_id not in replaced]
+
+        old_vectors = np.asarray(self.vectors[keep], dtype=np.float32).reshape(len(keep), self.dim)
+        self.vectors = np.concatenate([old_vectors, new_vectors])
+        self.ids = np.concatenate([self.ids[keep], np.array(new_ids, dtype=np.int64)])
+        self.payloads = [self.payloads[row] for row in keep] + new_payloads
+
+        self.save()
+        print(f"✅ Đã upsert {len(points)} points vào local snapshot '{self.snapshot_dir}'")
+
+    def search(self, query_vector: List[float], limit: int = 5, **kwargs) -> List[Dict[str, Any]]:
+        rows, scores = self.search_batch(np.asarray([query_vector], dtype=np.float32), limit)
+        return [
+            {"id": int(self.ids[r]), "score": float(s), "payload": self.payloads[r]}
+            for r, s in zip(rows[0], scores[0])
+        ]
+
+    # ======================================================
+    # QUERY
+    # ======================================================
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search_batch(self, query_vectors: np.ndarray, limit: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        Cosine top-`limit` for every query vector.
+
+        Returns:
+            (rows, scores): one array of snapshot rows and one array of
+            scores per query, sorted by descending score
+        """
+        q = _normalize(np.atleast_2d(query_vectors))
+        limit = min(limit, len(self.ids))
+        if limit <= 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return [empty] * len(q), [empty.astype(np.float32)] * len(q)
+
+        if self.index is not None:
+            scores, rows = self.index.search(q, limit)
+            return list(rows), list(scores)
+
+        sims = q @ np.asarray(self.vectors).T                        # (Q, N)
+        part = np.argpartition(-sims, limit - 1, axis=1)[:, :limit]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        rows = np.take_along_axis(part, order, axis=1)
+        return list(rows), list(np.take_along_axis(part_scores, order, axis=1))
+
+    def retrieve(self, ids: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        """(id, payload) for every known id, unknown ids are skipped."""
+        rows = [self.id_to_row.get(int(i)) for i in ids]
+        return [(int(self.ids[r]), self.payloads[r]) for r in rows if r is not None]
+
+    # ======================================================
+    # EXPORT
+    # ======================================================
+    @staticmethod
+    def _collection_dim(client, collection_name: str) -> int:
+        """Vector size from the Qdrant collection config (single unnamed vector)."""
+        vectors = client.get_collection(collection_name=collection_name).config.params.vectors
+        size = getattr(vectors, "size", None)
+        if size is None:
+            raise ValueError(
+                f"Collection '{collection_name}' is empty and has no single vector size "
+                f"(named vectors: {sorted(vectors) if isinstance(vectors, dict) else vectors})"
+            )
+        return int(size)
+
+    @classmethod
+    def from_qdrant(
+        cls,
+        client,
+        collection_name: str,
+        snapshot_dir: str,
+        batch_size: int = 256,
+        **kwargs
+    ) -> "LocalVectorDB":
+        """Scroll a whole Qdrant collection (vectors + payloads) into a local snapshot."""
+        db = cls(snapshot_dir, **kwargs)
+        total = client.count(collection_name=collection_name, exact=True).count
+
+        vectors, ids, payloads = [], [], []
+        offset = None
+        with tqdm(total=total, desc="📥 Exporting from Qdrant") as pbar:
+            while True:
+                points, offset = client.scroll(
+                    collection_name=collection_name,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True,
+                )
+                for p in points:
+                    ids.append(int(p.id))
+                    vectors.append(p.vector)
+                    payloads.append(p.payload or {})
+                pbar.update(len(points))
+                if offset is None:
+                    break
+
+        if vectors:
+            db.vectors = _normalize(np.array(vectors, dtype=np.float32))
+            db.dim = db.vectors.shape[1]
+        else:
+            # Collection rỗng: snapshot rỗng với dim lấy từ cấu hình collection
+            db.dim = cls._collection_dim(client, collection_name)
+            db.vectors = np.zeros((0, db.dim), dtype=np.float32)
+        db.ids = np.array(ids, dtype=np.int64)
+        db.payloads = payloads
+        db.save()
+        print(f"✅ Exported {len(ids)} points from '{collection_name}' to '{snapshot_dir}'")
+        return db
+
+
+if __name__ == '__main__':
+    import argparse
+    from qdrant_client import QdrantClient
+    from config import QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
+
+    parser = argparse.ArgumentParser(description="Export a Qdrant collection into a local vector snapshot")
+    parser.add_argument("snapshot_dir")
+    parser.add_argument("--collection", default=QDRANT_COLLECTION_NAME)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, timeout=600)
+    LocalVectorDB.from_qdrant(client, args.collection, args.snapshot_dir, batch_size=args.batch_size)
@@ -1,4 +1,8 @@
 from embedders.flag_embedding import FlagBaseEmbedding
 from embedders.base import EmbeddingConfig, APIEmbeddingConfig
 from embedders.sentence_transformer import SentenceTransformerEmbedding
-from embedders.gemini import GeminiEmbedding
\ No newline at end of file
+from embedders.gemini import GeminiEmbedding
+from embedders.cached import CachedEmbedding
+from embedders.registry import SharedEncoder, get_encoder, registered_encoders
+from embedders.batching import MicroBatchEncoder, EmbeddingServer, RemoteEmbedding, token_length_fn
+from embedders.onnx_embedding import ONNXEmbedding
\ No newline at end of file
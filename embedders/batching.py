@@ -0,0 +1,300 @@
+"""
+Dynamic micro-batching for embedding models.
+
+MicroBatchEncoder (in-process): mọi encode() đồng thời được gom trong một cửa
+sổ ngắn (mặc định 5 ms hoặc tối đa 32 câu), sắp theo độ dài để giảm padding,
+chạy MỘT forward pass rồi trả kết quả về từng caller qua Future.
+
+EmbeddingServer / RemoteEmbedding (socket): một process giữ model + micro-batcher,
+nhiều app worker (Streamlit, ...) gửi text qua TCP và dùng chung model đó.
+
+Giao thức: mỗi message = 4 byte độ dài (big-endian) + payload.
+    request : JSON {"texts": [...]}
+    response: JSON header {"shape": [n, dim], "error": null}, rồi n*dim float32 (little-endian)
+"""
+
+from embedders.base import BaseEmbedding
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, Union
+import numpy as np
+import socketserver
+import threading
+import socket
+import struct
+import queue
+import json
+import time
+
+_LEN = struct.Struct(">I")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024      # giới hạn request phía server
+
+
+class MicroBatchEncoder(BaseEmbedding):
+    """
+    Coalesce concurrent encode() calls into batched forward passes.
+
+    Args:
+        embedder: Any embedder with encode(List[str]) -> (n, dim)
+        max_wait_ms: How long the first request of a batch waits for company
+        max_batch: Max number of texts per forward pass
+        length_fn: Sort key inside a batch. len() counts characters, only an
+                   approximation of padding; token_length_fn(model) gives
+                   exact token counts
+    """
+
+    def __init__(
+        self,
+        embedder: BaseEmbedding,
+        max_wait_ms: float = 5.0,
+        max_batch: int = 32,
+        length_fn: Callable[[str], int] = len,
+    ):
+        super().__init__(embedder.name)
+        self.embedder = embedder
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.length_fn = length_fn
+
+        self.batches = 0
+        self.texts_encoded = 0
+
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Non-blocking: Future resolving to a float32 array (len(texts), dim)."""
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+        else:
+            self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, text: Union[str, List[str]]) -> np.ndarray:
+        texts = [text] if isinstance(text, str) else list(text)
+        return self.submit(texts).result()
+
+    @property
+    def avg_batch_size(self) -> float:
+        return self.texts_encoded / self.batches if self.batches else 0.0
+
+    # ======================================================
+    # WORKER
+    # ======================================================
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        """Block for one request, then gather more until the window closes or the batch is full."""
+        requests = [self._queue.get()]
+        size = len(requests[0][0])
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                req = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(req)
+            size += len(req[0])
+
+        return requests
+
+    def _encode_sorted(self, texts: List[str]) -> np.ndarray:
+        """Encode in chunks of max_batch, sorted by length; rows come back in input order."""
+        # Sắp theo độ dài -> các câu cùng batch có độ dài gần nhau, ít padding
+        order = sorted(range(len(texts)), key=lambda i: self.length_fn(texts[i]))
+
+        outputs = []
+        for start in range(0, len(order), self.max_batch):
+            chunk = order[start:start + self.max_batch]
+            outputs.append(np.asarray(self.embedder.encode([texts[i] for i in chunk]), dtype=np.float32))
+        sorted_vectors = np.vstack(outputs)
+
+        vectors = np.empty_like(sorted_vectors)
+        vectors[order] = sorted_vectors
+        self.batches += 1
+        self.texts_encoded += len(texts)
+        return vectors
+
+    def _run(self) -> None:
+        while True:
+            requests = self._collect()
+            texts = [t for req_texts, _ in requests for t in req_texts]
+
+            try:
+                vectors = self._encode_sorted(texts)
+            except Exception as e:
+                if len(requests) == 1:
+                    requests[0][1].set_exception(e)
+                    continue
+                # Một request lỗi (text hỏng, OOM, ...) không được kéo theo cả batch:
+                # chạy lại từng request riêng, chỉ request gây lỗi nhận exception
+                for req_texts, future in requests:
+                    try:
+                        future.set_result(self._encode_sorted(req_texts))
+                    except Exception as req_error:
+                        future.set_exception(req_error)
+                continue
+
+            offset = 0
+            for req_texts, future in requests:
+                future.set_result(vectors[offset:offset + len(req_texts)])
+                offset += len(req_texts)
+
+
+def token_length_fn(model_name: str) -> Callable[[str], int]:
+    """
+    Token count of a text under the model's tokenizer, for MicroBatchEncoder's
+    length_fn. Falls back to len() (characters, an approximation) when the
+    tokenizer cannot be loaded.
+    """
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+    except Exception as e:
+        print(f"⚠️ Tokenizer for {model_name} unavailable ({e}), batching by character length")
+        return len
+
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+# ======================================================
+# SOCKET MODE
+# ======================================================
+def _send_msg(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_LEN.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_msg(sock: socket.socket, max_bytes: Optional[int] = None) -> bytes:
+    (length,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    if max_bytes is not None and length > max_bytes:
+        raise ConnectionError(f"Message of {length} bytes exceeds {max_bytes}")
+    return _recv_exact(sock, length)
+
+
+def _parse_request(payload: bytes) -> List[str]:
+    """JSON {"texts": [str, ...]} -> texts; ValueError if malformed."""
+    try:
+        request = json.loads(payload)
+        texts = request["texts"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed request: {e!r}") from None
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        raise ValueError("Malformed request: 'texts' must be a list of strings")
+    return texts
+
+
+class _EmbeddingHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        encoder: MicroBatchEncoder = self.server.encoder
+        while True:
+            # Lỗi framing (mất kết nối, độ dài vượt giới hạn) -> đóng kết nối
+            try:
+                payload = _recv_msg(self.request, max_bytes=MAX_MESSAGE_BYTES)
+            except (ConnectionError, OSError):
+                return
+
+            # Payload hỏng vẫn giữ nguyên framing -> trả lỗi, kết nối dùng tiếp được
+            try:
+                vectors = encoder.encode(_parse_request(payload))
+                header = {"shape": list(vectors.shape), "error": None}
+                body = vectors.astype("<f4").tobytes()
+            except Exception as e:
+                header, body = {"shape": [0, 0], "error": str(e)}, b""
+
+            try:
+                _send_msg(self.request, json.dumps(header).encode("utf-8"))
+                _send_msg(self.request, body)
+            except OSError:
+                return
+
+
+class EmbeddingServer(socketserver.ThreadingTCPServer):
+    """
+    Stand-alone embedding process shared by several app workers.
+    One thread per connection; all connections feed the same MicroBatchEncoder.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, encoder: MicroBatchEncoder, host: str = "127.0.0.1", port: int = 8765):
+        self.encoder = encoder
+        super().__init__((host, port), _EmbeddingHandler)
+
+
+class RemoteEmbedding(BaseEmbedding):
+    """Client of EmbeddingServer, one persistent connection per thread."""
+
+    def __init__(self, name: str, host: str = "127.0.0.1", port: int = 8765, timeout: Optional[float] = 30.0):
+        super().__init__(name)
+        self.address = (host, port)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._local.sock = sock
+        return sock
+
+    def encode(self, text: Union[str, List[str]]) -> np.ndarray:
+        texts = [text] if isinstance(text, str) else list(text)
+        request = json.dumps({"texts": texts}, ensure_ascii=False).encode("utf-8")
+
+        sock = self._socket()
+        try:
+            _send_msg(sock, request)
+            header = json.loads(_recv_msg(sock))
+            body = _recv_msg(sock)
+        except (ConnectionError, OSError):
+            sock.close()
+            self._local.sock = None
+            raise
+
+        if header["error"]:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        return np.frombuffer(body, dtype="<f4").reshape(header["shape"])
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    import argparse
+    from embedders.registry import get_encoder
+    from config import EMBEDDING_MODEL_NAME, EMBEDDING_PRECISION, EMBEDDING_DEVICE
+
+    parser = argparse.ArgumentParser(description="Micro-batching embedding server")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--device", default=EMBEDDING_DEVICE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    encoder = MicroBatchEncoder(
+        get_encoder(args.model, device=args.device, precision=EMBEDDING_PRECISION),
+        max_wait_ms=args.max_wait_ms,
+        max_batch=args.max_batch,
+        length_fn=token_length_fn(args.model)
+    )
+    encoder.encode(["warm up"])
+
+    with EmbeddingServer(encoder, host=args.host, port=args.port) as server:
+        print(f"🟢 Embedding server ({args.model}) listening on {args.host}:{args.port}")
+        server.serve_forever()
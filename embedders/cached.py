@@ -0,0 +1,130 @@
+from embedders.base import BaseEmbedding
+from utils.cache_utils import LRUCache
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+import hashlib
+import atexit
+import os
+
+
+def _variant_of(embedder: BaseEmbedding) -> str:
+    """'device:precision' of the first registry-shared encoder in the wrapper chain."""
+    seen = set()
+    while embedder is not None and id(embedder) not in seen:
+        seen.add(id(embedder))
+        key = getattr(embedder, "key", None)
+        if isinstance(key, tuple) and len(key) == 3:
+            _, device, precision = key
+            return f"{device}:{precision}"
+        embedder = getattr(embedder, "embedder", None)
+    return ""
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Content-hash LRU cache in front of any embedder.
+
+    Share ONE instance between SemanticRouter and the vector retriever so
+    the same query text is encoded by a single forward pass. Keys are
+    blake2b(model name + variant + text); values are float32 vectors. The
+    cache can be persisted to a .npz file and reloaded on restart.
+
+    The variant identifies how the vectors were produced (device + precision):
+    the same model in fp16 / int8 / on another device gives different
+    vectors, so caches of different variants never mix. It is read from the
+    registry key of the wrapped encoder (SharedEncoder, also through
+    MicroBatchEncoder) unless passed explicitly, e.g. for RemoteEmbedding.
+    """
+
+    def __init__(
+        self,
+        embedder: BaseEmbedding,
+        maxsize: int = 10000,
+        persist_path: Optional[str] = None,     # .npz, None = chỉ cache trong RAM
+        variant: Optional[str] = None,          # None = lấy từ registry key (device:precision)
+    ):
+        super().__init__(embedder.name)
+        self.embedder = embedder
+        self.variant = variant if variant is not None else _variant_of(embedder)
+        self.cache = LRUCache(maxsize=maxsize)
+        self.persist_path = persist_path
+
+        if persist_path:
+            if os.path.exists(persist_path):
+                self.load(persist_path)
+            atexit.register(self.save)
+
+    def _key(self, text: str) -> str:
+        return hashlib.blake2b(f"{self.name}\0{self.variant}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def encode(self, text: Union[str, List[str]]) -> np.ndarray:
+        """
+        Encode a single string or list of strings -> float32 array (n, dim).
+        Only cache misses are sent to the wrapped embedder, in one batch.
+        """
+        texts = [text] if isinstance(text, str) else list(text)
+        keys = [self._key(t) for t in texts]
+
+        vectors: List[Optional[np.ndarray]] = [self.cache.get(k) for k in keys]
+        missing = {}        # key -> text (trùng lặp trong batch chỉ encode một lần)
+        for k, t, v in zip(keys, texts, vectors):
+            if v is None:
+                missing.setdefault(k, t)
+
+        if missing:
+            encoded = np.asarray(self.embedder.encode(list(missing.values())), dtype=np.float32)
+            encoded = encoded.reshape(len(missing), -1)
+            fresh = dict(zip(missing.keys(), encoded))
+            for k, v in fresh.items():
+                self.cache.put(k, v)
+            vectors = [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    # ======================================================
+    # STATS / PERSISTENCE
+    # ======================================================
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for _, v in self.cache.items())
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        stats["bytes"] = self.nbytes
+        return stats
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.persist_path
+        if not path:
+            return
+
+        items = self.cache.items()
+        if not items:
+            return
+
+        keys = np.array([k for k, _ in items])
+        vectors = np.vstack([v for _, v in items])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, model=np.array(self.name), variant=np.array(self.variant), keys=keys, vectors=vectors)
+        os.replace(tmp_path, path)
+        print(f"💾 Embedding cache saved: {len(keys)} vectors -> {path}")
+
+    def load(self, path: str) -> None:
+        data = np.load(path)
+        if str(data["model"]) != self.name:
+            print(f"⚠️ Embedding cache {path} belongs to '{data['model']}', skipped")
+            return
+        # Cache cũ (không có variant) hoặc khác device/precision -> bỏ qua
+        variant = str(data["variant"]) if "variant" in data.files else None
+        if variant != self.variant:
+            print(f"⚠️ Embedding cache {path} was built with variant '{variant}', expected '{self.variant}', skipped")
+            return
+
+        # Thứ tự LRU được giữ nguyên (cũ -> mới)
+        for k, v in zip(data["keys"].tolist(), data["vectors"]):
+            self.cache.put(k, v)
+        print(f"📂 Embedding cache loaded: {len(self.cache)} vectors from {path}")
@@ -0,0 +1,148 @@
+from embedders.base import BaseEmbedding, EmbeddingConfig
+from typing import List, Optional, Union
+import numpy as np
+import os
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+
+def export_onnx(model_name: str, out_dir: str, opset: int = 17) -> str:
+    """
+    Export the transformer encoder (last_hidden_state) of `model_name` to ONNX
+    with dynamic batch / sequence axes. Weights > 2 GB (bge-m3) go to external data.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, FP32_FILE)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    dummy = tokenizer(["xin chào"], return_tensors="pt")
+
+    print(f"🔵 Exporting {model_name} to ONNX ({out_path})...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            out_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+    tokenizer.save_pretrained(out_dir)
+    print(f"✅ Exported {out_path}")
+    return out_path
+
+
+def quantize_onnx(fp32_path: str, int8_path: str) -> str:
+    """Dynamic int8 quantization of the MatMul / Gemm weights (activations stay fp32)."""
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("int8 quantization needs the 'onnx' package: pip install onnx") from e
+
+    print(f"🔵 Quantizing {fp32_path} -> {int8_path} (dynamic int8)...")
+    quantize_dynamic(
+        model_input=fp32_path,
+        model_output=int8_path,
+        weight_type=QuantType.QInt8,
+        op_types_to_quantize=["MatMul", "Gemm"],
+        per_channel=True,
+    )
+    print(f"✅ Quantized model saved to {int8_path}")
+    return int8_path
+
+
+class ONNXEmbedding(BaseEmbedding):
+    """
+    CPU embedding with ONNX Runtime (bge-m3 dense vectors by default).
+
+    Output = CLS token, L2-normalized, i.e. the same dense vector as
+    FlagModel / SentenceTransformer bge-m3, so it can query the existing
+    Qdrant collection. The model is exported (and int8-quantized) on first
+    use into `model_dir`.
+    """
+
+    def __init__(
+        self,
+        config: EmbeddingConfig,
+        model_dir: str = "models/onnx/bge-m3",
+        quantize: bool = True,
+        intra_op_threads: Optional[int] = None,    # None = số core vật lý
+        max_length: int = 512,
+        batch_size: int = 32,
+    ):
+        super().__init__(config.name)
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        fp32_path = os.path.join(model_dir, FP32_FILE)
+        model_path = os.path.join(model_dir, INT8_FILE) if quantize else fp32_path
+
+        if not os.path.exists(fp32_path) and not os.path.exists(model_path):
+            export_onnx(config.name, model_dir)
+        if quantize and not os.path.exists(model_path):
+            quantize_onnx(fp32_path, model_path)
+
+        tokenizer_src = model_dir if os.path.exists(os.path.join(model_dir, "tokenizer_config.json")) else config.name
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_src)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        print(f"🟢 ONNX embedding loaded: {model_path} ({'int8' if quantize else 'fp32'})")
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feeds = {name: inputs[name].astype(np.int64) for name in ("input_ids", "attention_mask") if name in self.input_names}
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        cls = hidden[:, 0].astype(np.float32)
+        norms = np.linalg.norm(cls, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return cls / norms
+
+    def encode(self, text: Union[str, List[str]]) -> np.ndarray:
+        """
+        Encode a single string or list of strings -> float32 array (n, dim).
+        Texts are batched by length to limit padding.
+        """
+        texts = [text] if isinstance(text, str) else list(text)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = [
+            self._encode_batch([texts[i] for i in order[start:start + self.batch_size]])
+            for start in range(0, len(order), self.batch_size)
+        ]
+        sorted_vectors = np.vstack(chunks)
+
+        vectors = np.empty_like(sorted_vectors)
+        vectors[order] = sorted_vectors
+        return vectors
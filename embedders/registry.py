@@ -0,0 +1,118 @@
+from embedders.base import BaseEmbedding, EmbeddingConfig
+from typing import Callable, Dict, List, Literal, Optional, Tuple, Union
+import threading
+import os
+
+Precision = Literal["fp32", "fp16", "int8"]       # int8 = ONNX Runtime trên CPU
+ModelKey = Tuple[str, str, str]          # (name, device, precision)
+
+_registry: Dict[ModelKey, "SharedEncoder"] = {}
+_registry_lock = threading.Lock()
+
+
+def _resolve_device(device: Optional[str]) -> str:
+    """
+    Device actually used by the model: None / 'auto' -> best available, and
+    an unavailable 'cuda' / 'mps' -> also the best available one (not a
+    hard 'cpu'), so 'mps' on a CUDA host shares the auto model. Resolving
+    before building the key lets every spelling of the same device share
+    one model.
+    """
+    import torch
+
+    device = (device or "auto").lower()
+    cuda_ok = torch.cuda.is_available()
+    mps_ok = torch.backends.mps.is_available()
+
+    best = "cuda" if cuda_ok else "mps" if mps_ok else "cpu"
+    if device == "auto":
+        return best
+    if (device == "cuda" and not cuda_ok) or (device == "mps" and not mps_ok):
+        print(f"⚠️ Device '{device}' unavailable, using '{best}'")
+        return best
+    return device
+
+
+def _load_sentence_transformer(name: str, device: str, precision: Precision) -> BaseEmbedding:
+    from embedders.sentence_transformer import SentenceTransformerEmbedding
+
+    embedder = SentenceTransformerEmbedding(EmbeddingConfig(name=name, device=device))
+    if precision == "fp16":
+        embedder.embedding_model.half()
+    return embedder
+
+
+def _load_model(name: str, device: str, precision: Precision) -> BaseEmbedding:
+    if precision == "int8":
+        from embedders.onnx_embedding import ONNXEmbedding
+        return ONNXEmbedding(EmbeddingConfig(name=name), model_dir=os.path.join("models", "onnx", name.split("/")[-1]))
+    return _load_sentence_transformer(name, device, precision)
+
+
+class SharedEncoder(BaseEmbedding):
+    """
+    Process-wide handle to one embedding model.
+
+    The model is loaded on the first encode() call (not at construction),
+    and encode() calls are serialized so concurrent sessions can share it.
+    """
+
+    def __init__(self, key: ModelKey, loader: Callable[[str, str, str], BaseEmbedding]):
+        super().__init__(key[0])
+        self.key = key
+        self._loader = loader
+        self._model: Optional[BaseEmbedding] = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> BaseEmbedding:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    name, device, precision = self.key
+                    print(f"🔵 Loading shared encoder {name} ({device}, {precision})...")
+                    self._model = self._loader(name, device, precision)
+        return self._model
+
+    def encode(self, text: Union[str, List[str]]):
+        model = self.model
+        with self._encode_lock:
+            return model.encode(text)
+
+
+def get_encoder(
+    name: str,
+    device: Optional[str] = None,
+    precision: Precision = "fp32",
+    loader: Callable[[str, str, str], BaseEmbedding] = _load_model,
+) -> SharedEncoder:
+    """
+    Return THE shared encoder for (name, device, precision), creating the
+    (still unloaded) handle on first request.
+
+    Args:
+        name: HuggingFace model name, e.g. 'BAAI/bge-m3'
+        device: 'cpu' | 'cuda' | 'mps' | None/'auto' (best available)
+        precision: 'fp32' | 'fp16' | 'int8' (ONNX Runtime, CPU only)
+        loader: Builds the model on first use (only used when the key is new)
+    """
+    device = "cpu" if precision == "int8" else _resolve_device(device)
+    if device == "cpu" and precision == "fp16":
+        precision = "fp32"      # fp16 không được dùng trên CPU -> cùng một model
+    key = (name, device, precision)
+    with _registry_lock:
+        encoder = _registry.get(key)
+        if encoder is None:
+            encoder = _registry[key] = SharedEncoder(key, loader)
+        return encoder
+
+
+def registered_encoders() -> Dict[ModelKey, bool]:
+    """Registry keys -> whether the model weights are loaded."""
+    with _registry_lock:
+        return {key: encoder.loaded for key, encoder in _registry.items()}
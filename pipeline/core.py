@@ -4,8 +4,11 @@ from reranker import Reranker
 from llms import LLMs
 from reflection import Reflection
 from senmatic_router import SemanticRouter
-from embedders import SentenceTransformerEmbedding, EmbeddingConfig
-from config import VECTOR_SIZE, QDRANT_API_KEY, QDRANT_URL, GROQ_API_KEY, EMBEDDING_MODEL_NAME
+from embedders import CachedEmbedding, MicroBatchEncoder, RemoteEmbedding, get_encoder, token_length_fn
+from config import VECTOR_SIZE, QDRANT_API_KEY, QDRANT_URL, GROQ_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_PRECISION, EMBEDDING_DEVICE
+from config import TRACE_ENABLED, TRACE_DIR, TRACE_SAMPLE_RATE, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH
+from config import EMBEDDING_BATCH_WAIT_MS, EMBEDDING_MAX_BATCH, EMBEDDING_SERVER
+from utils.trace_utils import TraceSink
 from prompts import AGENT_PROMPT, ANSWER_WITH_RETRIVAL, ANSWER_WITHOUT_RETRIVAL, ANSWER_WITH_UNSUFFICIENT_RETRIVAL_INFORMATION
 from typing import List, Dict
 
@@ -19,8 +22,32 @@ def init_components():
     )
     reflector = Reflection(llm=reflection_llm)
 
+    # Một bge-m3 (registry, dùng chung cả với agent) + cache cho router và
+    # vector retriever: reflection_text chỉ được encode một lần.
+    # Các session đồng thời được gom batch (in-process hoặc qua embedding server)
+    if EMBEDDING_SERVER:
+        host, port = EMBEDDING_SERVER.rsplit(":", 1)
+        encoder = RemoteEmbedding(EMBEDDING_MODEL_NAME, host=host, port=int(port))
+        # Device do server quyết định; precision theo cùng config
+        cache_variant = f"remote:{EMBEDDING_PRECISION}"
+    else:
+        encoder = MicroBatchEncoder(
+            get_encoder(EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE, precision=EMBEDDING_PRECISION),
+            max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+            max_batch=EMBEDDING_MAX_BATCH,
+            length_fn=token_length_fn(EMBEDDING_MODEL_NAME)
+        )
+        cache_variant = None        # lấy từ registry key: device đã resolve + precision
+
+    query_embedding = CachedEmbedding(
+        encoder,
+        maxsize=EMBEDDING_CACHE_SIZE,
+        persist_path=EMBEDDING_CACHE_PATH,
+        variant=cache_variant
+    )
+
     router = SemanticRouter(
-        embedding=SentenceTransformerEmbedding(config=EmbeddingConfig(name=EMBEDDING_MODEL_NAME, device='mps')),
+        embedding=query_embedding,
         save_path='data/router/routingEmbeddings/bgem3_routing_embedding_2000.json'
     )
 
@@ -29,7 +56,8 @@ def init_components():
         embeddingName="BAAI/bge-m3",
         vector_size=VECTOR_SIZE,
         qdrant_api=QDRANT_API_KEY,
-        qdrant_url=QDRANT_URL
+        qdrant_url=QDRANT_URL,
+        embedding=query_embedding
     )
     
     raw_retriever = BM25Retriever(
@@ -40,7 +68,12 @@ def init_components():
         qdrant_url=QDRANT_URL    
     )
     
-    retriever = HybridRetriever(vector_retriever=vector_retriever, raw_retriever=raw_retriever)
+    trace_sink = TraceSink(path_dir=TRACE_DIR, sample_rate=TRACE_SAMPLE_RATE) if TRACE_ENABLED else None
+    retriever = HybridRetriever(
+        vector_retriever=vector_retriever,
+        raw_retriever=raw_retriever,
+        trace_sink=trace_sink
+    )
 
 
     client = LLMs(
@@ -93,7 +126,8 @@ def pipeline(query:List[Dict], use_reranker=True):
             max_iterations=2
         )
         
-        retriever.save(query=query, path_dir="_loop", candidates=final_candidates)
+        if retriever.trace_sink is not None:
+            retriever.trace_sink.emit("loop", query, final_candidates, is_sufficient=is_sufficient)
         
         print(f"Is sufficient: {is_sufficient}")
         if is_sufficient:
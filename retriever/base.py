@@ -2,19 +2,20 @@ from abc import ABC, abstractmethod
 from typing import Optional, Literal, List, Dict, Any
 import textwrap
 from IPython.display import Markdown
-from embedders import FlagBaseEmbedding, EmbeddingConfig
+from embedders import get_encoder
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import Distance, VectorParams
-from database import QDrantDB
-from config import EMBEDDING_MODEL_NAME, VECTOR_SIZE
+from database import QDrantDB, LocalVectorDB
+from config import EMBEDDING_MODEL_NAME, VECTOR_SIZE, EMBEDDING_PRECISION, EMBEDDING_DEVICE
 from datetime import datetime
 import chromadb
 import pymongo
 import json
 import os
 import csv
+import numpy as np
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional, Any, List
 
 
@@ -23,9 +24,9 @@ class Candidate:
     """Đại diện cho một kết quả truy vấn vector."""
     id: Any
     category: Optional[str]
-    content: str
+    content: Optional[str]      # None = chưa lấy nội dung (two-phase: chỉ id + score)
     score: float
-    embedding: Optional[List[float]] = None
+    embedding: Optional[np.ndarray] = None     # view 1 hàng vào block vector (float32 / int8) của query
 
     def to_dict(self):
         """Chuyển Candidate sang dict (dùng để lưu JSON/CSV)."""
@@ -60,6 +61,18 @@ class BaseRetriever(ABC):
             List of Candidate objects
         """
         pass
+
+    def search_batch(self, queries: List[str], limit: int = 5, **kwargs) -> List[List[Candidate]]:
+        """
+        Search several queries at once.
+        Default: one search() per query (extra kwargs are passed through).
+        Subclasses override this with a native batched implementation
+        (batched encode, batched DB query, ...).
+
+        Returns:
+            One list of Candidate per query, same order as `queries`
+        """
+        return [self.search(query, limit=limit, **kwargs) for query in queries]
     
     @staticmethod
     def pprint(candidates: List[Candidate]) -> None:
@@ -147,15 +160,20 @@ class BaseDBRetriever(ABC):
     Base class handling ALL database logic.
     """
 
+    # Payload fields actually read into a Candidate. Qdrant also stores
+    # source_file / section, which are never transferred.
+    payload_fields: List[str] = ["id", "category", "content"]
+
     def __init__(
         self,
-        type: Literal["chromadb", "mongodb", "qdrant"],
+        type: Literal["chromadb", "mongodb", "qdrant", "local"],
         mongodbUri: Optional[str] = None,
         qdrant_api: Optional[str] = None,
         qdrant_url: Optional[str] = None,
         dbName: Optional[str] = None,
         dbCollection: Optional[str] = None,
         chroma_path: str = "./chroma_db",
+        local_path: str = "./data/local_vectors",     # snapshot của LocalVectorDB
         embedding_name: str = None,
         vector_size: int = None,
     ):
@@ -169,6 +187,8 @@ class BaseDBRetriever(ABC):
             self._init_qdrant(qdrant_api, qdrant_url)
         elif self.type == "chromadb":
             self._init_chromadb(chroma_path)
+        elif self.type == "local":
+            self._init_local(local_path)
         else:
             raise ValueError(f"Unsupported DB type: {self.type}")
 
@@ -189,6 +209,10 @@ class BaseDBRetriever(ABC):
             metadata={"hnsw:space": "cosine"}
         )
 
+    def _init_local(self, path):
+        self.client = LocalVectorDB(path)
+        self.collection_name = "ta_hospital"
+
     # # ---------- CONTENT ----------
     # def search_by_id(self, doc_id: int) -> Optional[Candidate]:
     #     """
@@ -245,29 +269,38 @@ class BaseDBRetriever(ABC):
     #         )
 
     #     return None
-    def search_by_ids(self, doc_ids: List[int]) -> List[Candidate]:
+    def search_by_ids(self, doc_ids: List[int], fields: Optional[List[str]] = None) -> List[Candidate]:
         """
         Batch retrieve documents by IDs.
         Order is NOT preserved.
+
+        Args:
+            doc_ids: Document ids
+            fields: Payload fields to fetch (default: self.payload_fields).
+                    Content not requested comes back as None.
         """
 
         if not doc_ids:
             return []
 
+        fields = list(fields) if fields is not None else self.payload_fields
+
         # ======================
         # MongoDB
         # ======================
         if self.type == "mongodb":
+            projection = {"_id": 0, "id": 1}
+            projection.update({field: 1 for field in fields})
             cursor = self.collection.find(
                 {"id": {"$in": doc_ids}},
-                {"_id": 0, "id": 1, "category": 1, "content": 1}
+                projection
             )
 
             return [
                 Candidate(
                     id=doc["id"],
                     category=doc.get("category"),
-                    content=doc.get("content", ""),
+                    content=doc.get("content", "") if "content" in fields else None,
                     score=1.0
                 )
                 for doc in cursor
@@ -277,24 +310,31 @@ class BaseDBRetriever(ABC):
         # ChromaDB
         # ======================
         elif self.type == "chromadb":
+            include = []
+            if "content" in fields:
+                include.append("documents")
+            if "category" in fields:
+                include.append("metadatas")
+
             res = self.collection.get(
                 ids=[str(i) for i in doc_ids],
-                include=["documents", "metadatas"]
+                include=include
             )
 
-            if not res or not res.get("documents"):
+            if not res or not res.get("ids"):
                 return []
 
-            metadatas = res.get("metadatas") or [{}] * len(res["documents"])
+            documents = res.get("documents") or [None] * len(res["ids"])
+            metadatas = res.get("metadatas") or [{}] * len(res["ids"])
 
             return [
                 Candidate(
-                    id=int(doc_ids[i]) if i < len(doc_ids) else i,
-                    category=metadatas[i].get("category"),
-                    content=res["documents"][i],
+                    id=int(res["ids"][i]),
+                    category=(metadatas[i] or {}).get("category"),
+                    content=documents[i],
                     score=1.0
                 )
-                for i in range(len(res["documents"]))
+                for i in range(len(res["ids"]))
             ]
 
         # ======================
@@ -303,21 +343,61 @@ class BaseDBRetriever(ABC):
         elif self.type == "qdrant":
             res = self.client.retrieve(
                 collection_name=self.collection_name,
-                ids=doc_ids
+                ids=doc_ids,
+                with_payload=fields,
+                with_vectors=False
             )
 
             return [
                 Candidate(
-                    id=point.payload.get("id", point.id),
-                    category=point.payload.get("category"),
-                    content=point.payload.get("content", ""),
+                    id=(point.payload or {}).get("id", point.id),
+                    category=(point.payload or {}).get("category"),
+                    content=(point.payload or {}).get("content", "") if "content" in fields else None,
                     score=1.0
                 )
                 for point in res
             ]
 
+        # ======================
+        # Local snapshot
+        # ======================
+        elif self.type == "local":
+            return [
+                Candidate(
+                    id=payload.get("id", point_id),
+                    category=payload.get("category") if "category" in fields else None,
+                    content=payload.get("content", "") if "content" in fields else None,
+                    score=1.0
+                )
+                for point_id, payload in self.client.retrieve(doc_ids)
+            ]
+
         return []
 
+    def hydrate_batch(self, batch: List[List[Candidate]]) -> List[List[Candidate]]:
+        """
+        Second phase of a two-phase search: fetch content for the
+        candidates that only carry id + score (content=None), in ONE
+        search_by_ids() call for the whole batch. Scores and order are
+        kept; ids missing from the DB are dropped.
+        """
+        missing = list(dict.fromkeys(c.id for candidates in batch for c in candidates if c.content is None))
+        if not missing:
+            return batch
+
+        docs = {c.id: c for c in self.search_by_ids(missing)}
+        return [
+            [
+                c if c.content is not None else replace(docs[c.id], score=c.score, embedding=c.embedding)
+                for c in candidates
+                if c.content is not None or c.id in docs
+            ]
+            for candidates in batch
+        ]
+
+    def hydrate(self, candidates: List[Candidate]) -> List[Candidate]:
+        return self.hydrate_batch([candidates])[0]
+
 class BaseRawRetriever(BaseDBRetriever, BaseRetriever):
     """
     Base class for raw text retrieval algorithms (BM25, TF-IDF, etc.).
@@ -357,10 +437,11 @@ class BaseVectorRetriever(BaseDBRetriever, BaseRetriever):
 
     def __init__(
         self,
-        type: Literal["chromadb", "mongodb", "qdrant"],
+        type: Literal["chromadb", "mongodb", "qdrant", "local"],
         embeddingName: str,
         vector_size: int,
         llm=None,
+        embedding=None,          # embedder dùng chung (vd. CachedEmbedding của router)
         **db_kwargs
     ):
         BaseDBRetriever.__init__(
@@ -372,70 +453,196 @@ class BaseVectorRetriever(BaseDBRetriever, BaseRetriever):
         )
 
         self.embedding_name = embeddingName
-        self.embedding_model = FlagBaseEmbedding(
-            EmbeddingConfig(name=embeddingName)
-        )
+        # Mặc định dùng encoder chung của process (load lazy ở lần encode đầu)
+        self.embedding_model = embedding or get_encoder(embeddingName, device=EMBEDDING_DEVICE, precision=EMBEDDING_PRECISION)
         self.llm = llm
 
     def get_embedding(self, text: str):
-        return self.embedding_model.encode(text).tolist()
+        return np.asarray(self.embedding_model.encode(text)).tolist()
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Encode many texts in one forward pass."""
+        return np.asarray(self.embedding_model.encode(texts)).tolist()
+
+    @staticmethod
+    def _quantize_int8(block: np.ndarray) -> np.ndarray:
+        """
+        Symmetric per-row int8 quantization (scale = max|x| / 127).
+        The per-row scale is dropped: cosine / angle based stages (MMR,
+        clustering) are invariant to it.
+        """
+        scale = np.abs(block).max(axis=1, keepdims=True) / 127.0
+        scale[scale == 0] = 1.0
+        return np.round(block / scale).astype(np.int8)
+
+    def _attach_embeddings(
+        self,
+        candidates: List[Candidate],
+        vectors,
+        embedding_dtype: Literal["float32", "int8"] = "float32",
+    ) -> None:
+        """
+        Pack the stored vectors of one query's hits into ONE contiguous
+        (n, dim) block and give each Candidate a row view into it.
+        """
+        if not candidates:
+            return
 
-    def _raw_vector_search(self, query: str, limit: int = 10) -> List[Candidate]:
-        emb = self.get_embedding(query)[0]
+        block = np.asarray(vectors, dtype=np.float32).reshape(len(candidates), -1)
+        if embedding_dtype == "int8":
+            block = self._quantize_int8(block)
 
-        results = []
+        for candidate, row in zip(candidates, block):
+            candidate.embedding = row
+
+    def _raw_vector_search(
+        self,
+        query: str,
+        limit: int = 10,
+        return_embedding: bool = False,
+        embedding_dtype: Literal["float32", "int8"] = "float32",
+        with_content: bool = True,
+    ) -> List[Candidate]:
+        return self._raw_vector_search_batch(
+            [query], limit=limit, return_embedding=return_embedding,
+            embedding_dtype=embedding_dtype, with_content=with_content
+        )[0]
+
+    def _raw_vector_search_batch(
+        self,
+        queries: List[str],
+        limit: int = 10,
+        return_embedding: bool = False,
+        embedding_dtype: Literal["float32", "int8"] = "float32",
+        with_content: bool = True,
+    ) -> List[List[Candidate]]:
+        """
+        Top-`limit` vector search for every query:
+        one batched encode + one batched DB query (Qdrant / ChromaDB / local).
+
+        Args:
+            return_embedding: Also return the stored document vectors (same DB
+                call), attached to each Candidate as a row view of a per-query block
+            embedding_dtype: 'float32' or 'int8' (per-row scaled, 4x smaller)
+            with_content: False = ids + scores only (content=None), hydrate
+                the final top-k later with search_by_ids()
+        """
+        if not queries:
+            return []
+
+        if embedding_dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported embedding_dtype: {embedding_dtype}")
+
+        embs = self.get_embeddings(queries)
+
+        batch_results = []
+        batch_vectors = []      # vector gốc của từng query (khi return_embedding)
 
         if self.type == "qdrant":
-            hits = self.client.query_points(
+            # Chỉ lấy các field cần dùng (không lấy source_file / section)
+            with_payload = self.payload_fields if with_content else False
+            responses = self.client.query_batch_points(
                 collection_name=self.collection_name,
-                query=emb,
-                limit=limit,
+                requests=[
+                    models.QueryRequest(query=emb, limit=limit, with_payload=with_payload, with_vector=return_embedding)
+                    for emb in embs
+                ],
             )
-            for h in hits.points:
-                results.append(
+            for hits in responses:
+                if return_embedding:
+                    batch_vectors.append([h.vector for h in hits.points])
+                batch_results.append([
                     Candidate(
                         id=h.id,
-                        category=h.payload.get("category"),
-                        content=h.payload.get("content", ""),
+                        category=(h.payload or {}).get("category"),
+                        content=(h.payload or {}).get("content", "") if with_content else None,
                         score=h.score
                     )
-                )
+                    for h in hits.points
+                ])
 
         elif self.type == "chromadb":
+            include = ["distances"]
+            if with_content:
+                include += ["documents", "metadatas"]
+            if return_embedding:
+                include.append("embeddings")
             hits = self.collection.query(
-                query_embeddings=[emb],
-                n_results=limit
+                query_embeddings=embs,
+                n_results=limit,
+                include=include
             )
-            for i in range(len(hits["ids"][0])):
-                results.append(
+            for q in range(len(embs)):
+                if return_embedding:
+                    batch_vectors.append(hits["embeddings"][q])
+                batch_results.append([
                     Candidate(
-                        id=hits["ids"][0][i],
+                        id=int(hits["ids"][q][i]),     # Chroma lưu id dạng str, search_by_ids trả int
                         category=None,
-                        content=hits["documents"][0][i],
-                        score=1 - hits["distances"][0][i]
+                        content=hits["documents"][q][i] if with_content else None,
+                        score=1 - hits["distances"][q][i]
                     )
-                )
+                    for i in range(len(hits["ids"][q]))
+                ])
+
+        elif self.type == "local":
+            rows_batch, scores_batch = self.client.search_batch(np.asarray(embs, dtype=np.float32), limit)
+            for rows, scores in zip(rows_batch, scores_batch):
+                if return_embedding:
+                    batch_vectors.append(self.client.vectors[rows])     # gather từ snapshot (mmap)
+                batch_results.append([
+                    Candidate(
+                        id=int(self.client.ids[r]),
+                        category=self.client.payloads[r].get("category") if with_content else None,
+                        content=self.client.payloads[r].get("content", "") if with_content else None,
+                        score=float(score)
+                    )
+                    for r, score in zip(rows.tolist(), scores.tolist())
+                ])
 
         elif self.type == "mongodb":
-            pipeline = [{
-                "$vectorSearch": {
-                    "index": "vector_index",
-                    "queryVector": emb,
-                    "path": "embedding",
-                    "limit": limit
-                }
-            }]
-            for doc in self.collection.aggregate(pipeline):
-                results.append(
+            # $vectorSearch không hỗ trợ nhiều query vector trong một pipeline
+            for emb in embs:
+                pipeline = [{
+                    "$vectorSearch": {
+                        "index": "vector_index",
+                        "queryVector": emb,
+                        "path": "embedding",
+                        "limit": limit
+                    }
+                }]
+                excluded = {}
+                if not return_embedding:
+                    excluded["embedding"] = 0
+                if not with_content:
+                    excluded["content"] = 0
+                if excluded:
+                    pipeline.append({"$project": excluded})
+                docs = list(self.collection.aggregate(pipeline))
+                if return_embedding:
+                    batch_vectors.append([doc.get("embedding") for doc in docs])
+                batch_results.append([
                     Candidate(
-                        id=doc["_id"],
+                        id=doc.get("id", doc["_id"]),  # cùng khóa với search_by_ids ({"id": {"$in": ...}})
                         category=None,
-                        content=doc.get("content", ""),
+                        content=doc.get("content", "") if with_content else None,
                         score=doc["score"]
                     )
-                )
+                    for doc in docs
+                ])
+
+        if return_embedding:
+            for candidates, vectors in zip(batch_results, batch_vectors):
+                self._attach_embeddings(candidates, vectors, embedding_dtype)
 
-        return results
+        return batch_results
+
+    def search_batch(self, queries: List[str], limit: int = 5, with_content: bool = True) -> List[List[Candidate]]:
+        """
+        Native batched top-k vector search. Retrievers that post-process
+        the raw hits (Kneedle cut-off, MMR) keep the per-query search().
+        """
+        return self._raw_vector_search_batch(queries, limit=limit, with_content=with_content)
 
     def enhance_prompt(self, query):
         """Enhance prompt for better retrieval"""
@@ -1,7 +1,7 @@
 import os
 from retriever.base import BaseRawRetriever, Candidate
 from typing import Optional, List, Dict, Any, Literal
-from data_generator.utils import preprocess_text
+from data_generator.utils import preprocess_text, CSRIndex, SegmentedBM25Index, is_binary_index, wand_top_k
 from collections import defaultdict
 import math
 import json
@@ -9,7 +9,7 @@ import py_vncorenlp
 from vn_preprocess import VnTextProcessor
 from transformers import AutoTokenizer
 from utils.timing_utils import timeit
-from time import time
+from utils.cache_utils import LRUCache
 
 phobert_tokenizer = AutoTokenizer.from_pretrained(
     "vinai/phobert-base"
@@ -30,6 +30,11 @@ class BM25Retriever(BaseRawRetriever):
         b: float = 0.75,
         use_segmentation: bool = True,
         segmenter_path: str = "../vncorenlp",
+        index_backend: Literal["csr", "dict"] = "csr",     # 'dict' giữ layout cũ để so sánh
+        index_format: Literal["auto", "json", "binary", "segments"] = "auto",
+        use_mmap: bool = True,                             # binary index: np.memmap thay vì đọc vào RAM
+        token_cache_size: int = 4096,                      # 0 = tắt cache tokenize query
+        token_cache_ttl: Optional[float] = 3600,
         **kwargs
     ):
         super().__init__(type=type, index_path=index_path, **kwargs)
@@ -37,13 +42,21 @@ class BM25Retriever(BaseRawRetriever):
         self.k1 = k1
         self.b = b
         self.use_segmentation = use_segmentation
+        self.index_backend = index_backend
+        self.index_format = index_format
+        self.use_mmap = use_mmap
 
         # BM25 index components
         self.N = 0
         self.avg_doc_len = 0.0
-        self.doc_len = {}        # doc_id -> length
-        self.postings = {}       # term -> {doc_id: tf}
-        self.idf = {}            # term -> idf
+        self.doc_len = {}        # doc_id -> length          (dict backend)
+        self.postings = {}       # term -> {doc_id: tf}      (dict backend) | CSRIndex
+        self.idf = {}            # term -> idf               (dict backend)
+        self.index: Optional[CSRIndex] = None
+        self.segments: Optional[SegmentedBM25Index] = None     # index_format='segments'
+
+        # normalized query -> tuple of tokens
+        self.token_cache = LRUCache(maxsize=token_cache_size, ttl=token_cache_ttl)
 
         # Initialize segmenter safely
         self.segmenter = None
@@ -59,57 +72,172 @@ class BM25Retriever(BaseRawRetriever):
     # ======================================================
     # INDEX
     # ======================================================
-    def load_index(self, index_path: str) -> None:
+    def load_index(
+        self,
+        index_path: str,
+        backend: Optional[Literal["csr", "dict"]] = None,
+        index_format: Optional[Literal["auto", "json", "binary", "segments"]] = None,
+    ) -> None:
         """
-        Load BM25 inverted index from JSON file.
+        Load BM25 inverted index from a JSON or binary (memory-mapped) file,
+        or a segmented index directory (see SegmentedBM25Index).
+
+        Args:
+            index_path: Path to index file
+            backend: 'csr' (NumPy posting arrays) | 'dict' (legacy nested dict).
+                     Defaults to self.index_backend.
+            index_format: 'json' | 'binary' | 'segments' | 'auto' (detect from
+                          file magic / manifest). Defaults to self.index_format.
         """
         if not os.path.exists(index_path):
             raise FileNotFoundError(f"Index file not found: {index_path}")
 
-        print(f"📂 Loading BM25 index from {index_path}...")
-
-        with open(index_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        self.N = data["meta"]["N"]
-        self.avg_doc_len = data["meta"]["avg_doc_len"]
-        self.k1 = data["meta"]["k1"]
-        self.b = data["meta"]["b"]
-
-        self.doc_len = {int(k): v for k, v in data["doc_len"].items()}
-        self.idf = data["idf"]
-        self.postings = {
-            term: {int(doc_id): tf for doc_id, tf in docs.items()}
-            for term, docs in data["postings"].items()
-        }
-
+        backend = backend or self.index_backend
+        if backend not in ("csr", "dict"):
+            raise ValueError(f"Unsupported index backend: {backend}")
+
+        index_format = index_format or self.index_format
+        if index_format == "auto":
+            if SegmentedBM25Index.is_segmented_index(index_path):
+                index_format = "segments"
+            else:
+                index_format = "binary" if is_binary_index(index_path) else "json"
+        if index_format not in ("json", "binary", "segments"):
+            raise ValueError(f"Unsupported index format: {index_format}")
+
+        print(f"📂 Loading BM25 index from {index_path} ({index_format})...")
+
+        if index_format == "segments":
+            self.segments = SegmentedBM25Index(index_path)
+            self.index = None
+            self.postings = self.segments
+            self.N = self.segments.N
+            self.k1 = self.segments.k1
+            self.b = self.segments.b
+            self.index_loaded = True
+
+            print(f"✅ Index loaded ({len(self.segments.segments)} segments)")
+            print(f"   Documents: {self.N}")
+            return
+
+        self.segments = None
+
+        if index_format == "binary":
+            index = CSRIndex.open_binary(index_path, mmap=self.use_mmap)
+        else:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index = CSRIndex.from_json_data(data) if backend == "csr" else None
+
+        if index is not None:
+            self.N = index.N
+            self.avg_doc_len = index.avg_doc_len
+            self.k1 = index.k1
+            self.b = index.b
+        else:
+            self.N = data["meta"]["N"]
+            self.avg_doc_len = data["meta"]["avg_doc_len"]
+            self.k1 = data["meta"]["k1"]
+            self.b = data["meta"]["b"]
+
+        if backend == "csr":
+            # Upper bound cho algorithm='wand' (index JSON / binary cũ chưa có)
+            if not index.has_bounds:
+                index.build_bounds()
+            self.index = index
+            self.postings = self.index
+            self.doc_len = {}
+            self.idf = {}
+        elif index is not None:
+            self.index = None
+            self.doc_len = dict(zip(index.doc_keys.tolist(), index.doc_len.tolist()))
+            self.idf = {term: float(index.idf[t]) for term, t in index.vocab.items()}
+            self.postings = index.to_dict()
+        else:
+            self.index = None
+            self.doc_len = {int(k): v for k, v in data["doc_len"].items()}
+            self.idf = data["idf"]
+            self.postings = {
+                term: {int(doc_id): tf for doc_id, tf in docs.items()}
+                for term, docs in data["postings"].items()
+            }
+
+        self.index_backend = backend
         self.index_loaded = True
 
-        print(f"✅ Index loaded")
+        print(f"✅ Index loaded ({backend})")
         print(f"   Documents: {self.N}")
         print(f"   Vocabulary size: {len(self.postings)}")
-        
+        if self.index is not None:
+            print(f"   Posting arrays: {self.index.nbytes / 1024 ** 2:.1f} MB")
 
     # ======================================================
     # TOKENIZATION
     # ======================================================
+    @staticmethod
+    def _normalize_query(text: str) -> str:
+        return preprocess_text(text).lower()
+
     @timeit("BM25::_tokenize")
     def _tokenize(self, text: str) -> List[str]:
-        clean_text = preprocess_text(text).lower()
+        clean_text = self._normalize_query(text)
+
+        cached = self.token_cache.get(clean_text)
+        if cached is not None:
+            return list(cached)
 
         if self.use_segmentation and self.segmenter:
             segmented = self.segmenter.preprocess(clean_text)
             tokenized = phobert_tokenizer.tokenize(segmented)
-            print(tokenized)
-            return tokenized
-        
-        tokenized = phobert_tokenizer.tokenize(clean_text)
+        else:
+            tokenized = phobert_tokenizer.tokenize(clean_text)
+
+        self.token_cache.put(clean_text, tuple(tokenized))
         return tokenized
 
+    @timeit("BM25::_tokenize_many")
+    def _tokenize_many(self, texts: List[str]) -> List[List[str]]:
+        """
+        Tokenize several queries: cache hits are served directly, all misses
+        are segmented together in one VnCoreNLP call.
+        """
+        clean_texts = [self._normalize_query(t) for t in texts]
+        results: List[Optional[List[str]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}      # clean text -> positions
+
+        for i, clean_text in enumerate(clean_texts):
+            cached = self.token_cache.get(clean_text)
+            if cached is not None:
+                results[i] = list(cached)
+            else:
+                missing.setdefault(clean_text, []).append(i)
+
+        if missing:
+            keys = list(missing)
+            if self.use_segmentation and self.segmenter:
+                segmented = self.segmenter.preprocess_batch(keys)
+            else:
+                segmented = keys
+
+            for key, seg in zip(keys, segmented):
+                tokenized = phobert_tokenizer.tokenize(seg)
+                self.token_cache.put(key, tuple(tokenized))
+                for i in missing[key]:
+                    results[i] = list(tokenized)
+
+        return results
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit / miss counters of the query tokenization cache."""
+        return self.token_cache.stats()
+
     # ======================================================
     # BM25 SCORING
     # ======================================================
     def _compute_score(self, query_terms: List[str], doc_id: int) -> float:
+        if self.index is not None:
+            return self._compute_score_csr(query_terms, doc_id)
+
         score = 0.0
         dl = self.doc_len.get(doc_id, 0)
 
@@ -130,60 +258,191 @@ class BM25Retriever(BaseRawRetriever):
 
         return score
 
+    def _compute_score_csr(self, query_terms: List[str], doc_id: int) -> float:
+        score = 0.0
+        internal_id = self.index.to_internal(doc_id)
+        if internal_id < 0:
+            return score
+
+        dl = int(self.index.doc_len[internal_id])
+
+        for term in query_terms:
+            tf = self.index.tf(term, internal_id)
+            if tf == 0:
+                continue
+
+            idf = self.index.get_idf(term)
+
+            denom = tf + self.k1 * (
+                1 - self.b + self.b * dl / self.avg_doc_len
+            )
+
+            score += idf * (tf * (self.k1 + 1)) / denom
+
+        return score
+
+    def _collect_candidates(self, query_terms: List[str]) -> List[int]:
+        """Doc ids containing at least one query term."""
+        if self.index is not None:
+            internal = self.index.candidates(query_terms)
+            return self.index.doc_keys[internal].tolist()
+
+        candidate_docs = set()
+        for term in query_terms:
+            if term in self.postings:
+                candidate_docs.update(self.postings[term].keys())
+        return list(candidate_docs)
+
+    @timeit("BM25::score_csr")
+    def _score_csr(
+        self,
+        query_terms: List[str],
+        limit: int,
+        algorithm: Literal["taat", "wand", "impact"] = "taat"
+    ) -> List[tuple]:
+        """
+        taat: term-at-a-time scoring into a dense accumulator + argpartition top-k.
+        wand: Block-Max WAND, skips docs whose score upper bound cannot enter the top-k.
+        impact: sum of precomputed quantized impacts (index built with impact_bits).
+        """
+        if algorithm == "wand":
+            top_ids, top_scores = wand_top_k(self.index, query_terms, limit)
+        elif algorithm == "impact":
+            top_ids, top_scores = self.index.top_k_impacts(query_terms, limit)
+        elif algorithm == "taat":
+            top_ids, top_scores = self.index.top_k(query_terms, limit)
+        else:
+            raise ValueError(f"Unsupported BM25 algorithm: {algorithm}")
+
+        return list(zip(
+            self.index.doc_keys[top_ids].tolist(),
+            top_scores.tolist()
+        ))
+
+    @timeit("BM25::score_segments")
+    def _score_segments(self, query_terms: List[str], limit: int) -> List[tuple]:
+        """Fan out over all segments using global N / avg_doc_len / df."""
+        top_ids, top_scores = self.segments.top_k(query_terms, limit)
+        return list(zip(top_ids.tolist(), top_scores.tolist()))
+
+    @timeit("BM25::score_dict")
+    def _score_dict(self, query_terms: List[str]) -> List[tuple]:
+        """Legacy per-doc scoring over the nested dict index."""
+        scored_docs = []
+        for doc_id in self._collect_candidates(query_terms):
+            score = self._compute_score(query_terms, doc_id)
+            if score > 0:
+                scored_docs.append((doc_id, score))
+
+        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        return scored_docs
+
+    @timeit("BM25::score_csr_batch")
+    def _score_csr_batch(self, batch_terms: List[List[str]], limit: int) -> List[List[tuple]]:
+        """TAAT over a (queries x docs) score matrix, term contributions shared."""
+        return [
+            list(zip(self.index.doc_keys[top_ids].tolist(), top_scores.tolist()))
+            for top_ids, top_scores in self.index.top_k_batch(batch_terms, limit)
+        ]
+
+    def _score_query(
+        self,
+        query_terms: List[str],
+        limit: int,
+        algorithm: Literal["taat", "wand", "impact"] = "taat"
+    ) -> List[tuple]:
+        if self.index is not None:
+            return self._score_csr(query_terms, limit, algorithm=algorithm)
+
+        # Segments / dict backend chỉ tính điểm vét cạn
+        if algorithm != "taat":
+            backend = "segments" if self.segments is not None else "dict"
+            raise ValueError(f"BM25 algorithm '{algorithm}' is not supported by the {backend} backend (only 'taat')")
+        if self.segments is not None:
+            return self._score_segments(query_terms, limit)
+        return self._score_dict(query_terms)
+
+    @timeit("BM25::fetch")
+    def _fetch_candidates(
+        self,
+        batch_scored: List[List[tuple]],
+        limit: int,
+        with_content: bool = True
+    ) -> List[List[Candidate]]:
+        """
+        Turn the top docs of every query into Candidates in score order.
+        Content for all queries is fetched in ONE DB round trip
+        (BaseDBRetriever.hydrate_batch); with_content=False skips it and
+        returns ids + scores only (two-phase search).
+        """
+        batch = [
+            [Candidate(id=doc_id, category=None, content=None, score=score) for doc_id, score in scored_docs[:limit]]
+            for scored_docs in batch_scored
+        ]
+        return self.hydrate_batch(batch) if with_content else batch
+
     # ======================================================
     # SEARCH
     # ======================================================
     @timeit("BM25::search")
-    def search(self, user_query: str, limit: int = 5) -> List[Candidate]:
+    def search(
+        self,
+        user_query: str,
+        limit: int = 5,
+        algorithm: Literal["taat", "wand", "impact"] = "taat",
+        with_content: bool = True
+    ) -> List[Candidate]:
         """
         Perform BM25 search.
         Content is retrieved via BaseDBRetriever.search_by_id().
+
+        Args:
+            user_query: Search query string
+            limit: Number of top results to return
+            algorithm: 'taat' (exhaustive, vectorized) | 'wand' (Block-Max WAND
+                       dynamic pruning, same top-k) | 'impact' (quantized
+                       precomputed impacts, approximate). CSR backend only.
+            with_content: False = ids + scores only, no DB call (two-phase search)
         """
         if not self.index_loaded:
             raise RuntimeError("BM25 index not loaded")
 
         query_terms = self._tokenize(user_query)
+        scored_docs = self._score_query(query_terms, limit, algorithm=algorithm)
+        return self._fetch_candidates([scored_docs], limit, with_content)[0]
 
-        # Candidate documents from inverted index
-        candidate_docs = set()
-        for term in query_terms:
-            if term in self.postings:
-                candidate_docs.update(self.postings[term].keys())
+    @timeit("BM25::search_batch")
+    def search_batch(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        algorithm: Literal["taat", "wand", "impact"] = "taat",
+        with_content: bool = True
+    ) -> List[List[Candidate]]:
+        """
+        Search several queries at once:
+          - tokenization: cache misses are word-segmented in a single VnCoreNLP call
+          - scoring: 'taat' on the CSR backend uses one score matrix per block of
+            queries (term contributions computed once, shared)
+          - content: one DB round trip for the union of all top docs
+            (skipped with with_content=False)
+
+        Returns:
+            One candidate list per query, same order as `queries`
+        """
+        if not self.index_loaded:
+            raise RuntimeError("BM25 index not loaded")
 
-        if not candidate_docs:
-            return []
+        batch_terms = self._tokenize_many(queries)
 
-        scored_docs = []
-        
-        start = time()
-        for doc_id in candidate_docs:
-            score = self._compute_score(query_terms, doc_id)
-            if score > 0:
-                scored_docs.append((doc_id, score))
-        print(f"Score computing time: {time() - start}")
+        if self.segments is None and self.index is not None and algorithm == "taat":
+            batch_scored = self._score_csr_batch(batch_terms, limit)
+        else:
+            batch_scored = [
+                self._score_query(query_terms, limit, algorithm=algorithm)
+                for query_terms in batch_terms
+            ]
 
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        return self._fetch_candidates(batch_scored, limit, with_content)
 
-        # Fetch content from DB via BaseDBRetriever
-        candidates: List[Candidate] = []
-        
-        start = time()
-        # for doc_id, score in scored_docs[:limit]:
-        #     candidate = self.search_by_id(doc_id)   # từ BaseDBRetriever
-        #     if candidate is None:
-        #         continue
-
-        #     candidate.score = score
-        #     candidates.append(candidate)
-        
-        top = scored_docs[:limit]
-        top_ids = [doc_id for doc_id, _ in top]
-
-        candidates = self.search_by_ids(top_ids)
-
-        score_map = dict(top)
-        for c in candidates:
-            c.score = score_map.get(c.id, c.score)
-
-        print(f"Searching by id time: {time() - start}")
-        return candidates
+    search_many = search_batch
@@ -0,0 +1,155 @@
+"""
+Score fusion for hybrid retrieval.
+
+Mỗi leg trả về một list Candidate đã sắp xếp giảm dần theo score. Các list
+được gộp thành ma trận (num_legs x num_docs) gồm rank và score thô, rồi
+fuse bằng NumPy:
+
+    rrf           sum 1 / (k + rank)
+    weighted_rrf  sum w_l / (k + rank)
+    minmax        sum w_l * (s - min) / (max - min)                (convex)
+    zscore        sum w_l * (s - mean) / std                       (convex)
+    dbsf          sum w_l * clip((s - (mean - 3std)) / 6std, 0, 1)  (distribution-based)
+
+Doc không có trong một leg: rrf/minmax/dbsf đóng góp 0, zscore nhận z nhỏ
+nhất của leg đó. Candidate gốc được giữ nguyên (kể cả embedding), chỉ thay score.
+"""
+
+from dataclasses import replace
+from typing import Dict, List, Literal, Optional, Sequence, Tuple
+import numpy as np
+
+from retriever.base import Candidate
+
+FusionMethod = Literal["rrf", "weighted_rrf", "minmax", "zscore", "dbsf"]
+FUSION_METHODS = ("rrf", "weighted_rrf", "minmax", "zscore", "dbsf")
+
+
+def _to_matrices(multi_ranks: List[List[Candidate]]) -> Tuple[List[Candidate], np.ndarray, np.ndarray]:
+    """
+    Union of docs (first occurrence kept) plus (legs x docs) rank and score
+    matrices; missing entries are inf (rank) / nan (score).
+    """
+    position: Dict = {}
+    docs: List[Candidate] = []
+    for ranked_list in multi_ranks:
+        for c in ranked_list:
+            if c.id not in position:
+                position[c.id] = len(docs)
+                docs.append(c)
+
+    ranks = np.full((len(multi_ranks), len(docs)), np.inf)
+    scores = np.full((len(multi_ranks), len(docs)), np.nan)
+    for leg, ranked_list in enumerate(multi_ranks):
+        if not ranked_list:
+            continue
+        cols = np.fromiter((position[c.id] for c in ranked_list), dtype=np.int64, count=len(ranked_list))
+        leg_scores = np.fromiter((c.score for c in ranked_list), dtype=np.float64, count=len(ranked_list))
+        # doc lặp trong cùng một leg: giữ lần xuất hiện đầu (rank tốt nhất)
+        cols, first = np.unique(cols, return_index=True)
+        ranks[leg, cols] = first + 1
+        scores[leg, cols] = leg_scores[first]
+
+    return docs, ranks, scores
+
+
+def _leg_weights(weights: Optional[Sequence[float]], num_legs: int, convex: bool) -> np.ndarray:
+    if weights is None:
+        w = np.ones(num_legs)
+    else:
+        w = np.asarray(weights, dtype=np.float64)
+        if w.shape != (num_legs,):
+            raise ValueError(f"Expected {num_legs} weights, got {len(w)}")
+        if (w < 0).any():
+            raise ValueError("Fusion weights must be non-negative")
+
+    if convex:
+        total = w.sum()
+        w = w / total if total > 0 else np.full(num_legs, 1.0 / num_legs)
+    return w[:, None]
+
+
+def _normalize(scores: np.ndarray, method: str) -> np.ndarray:
+    """Per-leg (row-wise) normalization, nan for missing docs."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if method == "minmax":
+            lo = np.nanmin(scores, axis=1, keepdims=True)
+            span = np.nanmax(scores, axis=1, keepdims=True) - lo
+            return np.where(span > 0, (scores - lo) / span, 1.0)
+
+        mean = np.nanmean(scores, axis=1, keepdims=True)
+        std = np.nanstd(scores, axis=1, keepdims=True)
+
+        if method == "zscore":
+            return np.where(std > 0, (scores - mean) / std, 0.0)
+
+        if method == "dbsf":
+            lo = mean - 3 * std
+            return np.where(std > 0, np.clip((scores - lo) / (6 * std), 0.0, 1.0), 1.0)
+
+    raise ValueError(f"Unsupported normalization: {method}")
+
+
+def fuse_scores(
+    ranks: np.ndarray,
+    scores: np.ndarray,
+    method: FusionMethod = "rrf",
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+) -> np.ndarray:
+    """Fused score per doc from (legs x docs) rank / score matrices."""
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unsupported fusion method: {method}. Supported: {', '.join(FUSION_METHODS)}")
+
+    num_legs = ranks.shape[0]
+
+    if method in ("rrf", "weighted_rrf"):
+        w = _leg_weights(weights if method == "weighted_rrf" else None, num_legs, convex=False)
+        return (w / (k + ranks)).sum(axis=0)        # rank = inf -> 0
+
+    present = ~np.isnan(scores)
+    norm = np.zeros_like(scores)
+    legs = present.any(axis=1)
+    if legs.any():
+        norm[legs] = _normalize(scores[legs], method)
+
+    if method == "zscore":
+        # Doc thiếu trong leg = z thấp nhất của leg đó
+        floor = np.where(present, norm, np.inf).min(axis=1, keepdims=True)
+        floor[~np.isfinite(floor)] = 0.0
+        norm = np.where(present, norm, floor)
+    else:
+        norm = np.where(present, norm, 0.0)
+
+    w = _leg_weights(weights, num_legs, convex=True)
+    return (w * norm).sum(axis=0)
+
+
+def fuse(
+    multi_ranks: List[List[Candidate]],
+    method: FusionMethod = "rrf",
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+    limit: int = 5,
+) -> List[Candidate]:
+    """
+    Fuse several ranked candidate lists into one.
+
+    Args:
+        multi_ranks: One list per leg, each sorted by descending score
+        method: 'rrf' | 'weighted_rrf' | 'minmax' | 'zscore' | 'dbsf'
+        weights: One non-negative weight per leg (ignored by plain 'rrf')
+        k: RRF constant
+        limit: Number of fused results to return
+
+    Returns:
+        Top `limit` original Candidate objects (embedding kept) with the fused score
+    """
+    docs, ranks, scores = _to_matrices(multi_ranks)
+    if not docs:
+        return []
+
+    fused = fuse_scores(ranks, scores, method=method, weights=weights, k=k)
+    order = np.argsort(-fused, kind="stable")[:limit]
+
+    return [replace(docs[i], score=float(fused[i])) for i in order]
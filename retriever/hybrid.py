@@ -1,78 +1,219 @@
 from retriever.base import BaseRetriever, Candidate
-from typing import List
+from retriever.fusion import FusionMethod, fuse
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import time
+from utils.timing_utils import timeit
+from utils.trace_utils import TraceSink
 
 class HybridRetriever(BaseRetriever):
-    def __init__(self, vector_retriever, raw_retriever):
+    """
+    BM25 + vector retrieval fused with a pluggable fusion method
+    (see retriever/fusion.py), selectable per call.
+    The two legs run concurrently, each on its own thread pool, so a stuck
+    leg cannot starve the other one; a leg that errors or misses its
+    deadline is dropped and the query degrades to the other leg. A late leg
+    cannot be interrupted: it keeps running to completion in its pool and
+    its result is discarded. Call close() (or use `with`) to release the pools.
+
+    Two-phase mode (default): the legs return ids + scores only, and content
+    is fetched for the final fused top-`limit` in a single id lookup.
+
+    Tracing (trace_sink): after hydration, one record per leg and one 'fused'
+    record. In two-phase mode the leg records hold ids + scores only
+    (content null); the 'fused' record carries the hydrated content.
+    """
+
+    def __init__(
+        self,
+        vector_retriever,
+        raw_retriever,
+        raw_limit: int = 50,                       # fan-out mỗi leg trước khi fuse
+        vector_limit: int = 50,
+        fusion: FusionMethod = "rrf",
+        fusion_weights: Optional[Dict[str, float]] = None,   # {'raw': w, 'vector': w}
+        rrf_k: int = 60,
+        raw_timeout: Optional[float] = 5.0,        # giây, None = chờ vô hạn
+        vector_timeout: Optional[float] = 5.0,
+        max_workers: int = 4,                      # thread mỗi leg (số query chạy đồng thời của leg đó)
+        trace_sink: Optional[TraceSink] = None,    # opt-in: ghi kết quả từng leg ở background
+        two_phase: bool = True,                    # False = mỗi leg tự lấy content cho toàn bộ fan-out
+    ):
         self.vector_retriever = vector_retriever
         self.raw_retriver = raw_retriever
-        
-    def search(self, query: str, limit: int = 5) -> List[Candidate]:
-        raw_results = self._rank(
-            self.raw_retriver.search(query, limit=50),
-            descent=True
-        )
-        self.raw_retriver.save(query=query,candidates=raw_results, path_dir='_raw')
+        self.leg_limits = {"raw": raw_limit, "vector": vector_limit}
+        self.fusion = fusion
+        self.fusion_weights = fusion_weights
+        self.rrf_k = rrf_k
+        self.timeouts = {"raw": raw_timeout, "vector": vector_timeout}
+        self.leg_failures = {"raw": 0, "vector": 0}     # số lần mỗi leg bị bỏ (timeout / lỗi)
+        self.trace_sink = trace_sink
+        self.two_phase = two_phase
+        # Retriever dùng để lấy content ở phase 2 (cùng collection với cả hai leg)
+        self.content_retriever = raw_retriever if hasattr(raw_retriever, "hydrate_batch") else vector_retriever
+        # Một pool cho mỗi leg: leg bị treo chỉ giữ thread của chính nó
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hybrid-{name}")
+            for name in ("raw", "vector")
+        }
 
-        vector_results = self._rank(
-            self.vector_retriever.search(query, limit=50),
-            descent=True
-        )
-        self.vector_retriever.save(query=query, candidates=vector_results, path_dir='_vector')
-        
-        final_results = self._compute_RRF(
-            [raw_results, vector_results],
-            k=60,
-            limit=limit
-        )
+    def close(self) -> None:
+        """Shut down the leg pools: queued legs are cancelled, running ones finish in the background."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        return final_results
-    
-    def _rank(self, candidates: List[Candidate], descent: bool = True) -> List[Candidate]:
-        if not candidates:
-            return []
-        return sorted(
-            candidates,
-            key=lambda c: c.score,
-            reverse=descent
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, "_executors"):
+            self.close()
+
+    def _run_legs(
+        self,
+        legs: Dict[str, Callable],
+        timeouts: Dict[str, Optional[float]]
+    ) -> Dict[str, Optional[object]]:
+        """
+        Submit every leg at once, then wait for each until its own deadline
+        (measured from submission). Failed / late legs map to None.
+        """
+        start = time.perf_counter()
+        futures = {name: self._executors[name].submit(fn) for name, fn in legs.items()}
+
+        results = {}
+        for name, future in futures.items():
+            timeout = timeouts.get(name)
+            remaining = None if timeout is None else max(0.0, start + timeout - time.perf_counter())
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                # Chỉ hủy được nếu leg chưa chạy; thread đang chạy thì chạy tiếp đến hết
+                future.cancel()
+                self.leg_failures[name] += 1
+                print(f"⚠️ Hybrid: {name} leg missed its {timeout}s deadline, using remaining leg(s)")
+                results[name] = None
+            except Exception as e:
+                self.leg_failures[name] += 1
+                print(f"❌ Hybrid: {name} leg failed ({e}), using remaining leg(s)")
+                results[name] = None
+
+        return results
+
+    def _leg_fns(self, batch: bool, query, raw_limit: int, vector_limit: int) -> Dict[str, Callable]:
+        """Leg callables; a leg with fan-out 0 is not run at all."""
+        raw_fn = self.raw_retriver.search_batch if batch else self.raw_retriver.search
+        vector_fn = self.vector_retriever.search_batch if batch else self.vector_retriever.search
+
+        with_content = not self.two_phase
+        legs = {}
+        if raw_limit > 0:
+            legs["raw"] = lambda: raw_fn(query, limit=raw_limit, with_content=with_content)
+        if vector_limit > 0:
+            legs["vector"] = lambda: vector_fn(query, limit=vector_limit, with_content=with_content)
+        return legs
+
+    def _fuse(
+        self,
+        legs: Dict[str, List[Candidate]],
+        limit: int,
+        fusion: Optional[FusionMethod],
+        weights: Optional[Dict[str, float]],
+    ) -> List[Candidate]:
+        names = list(legs)
+        weights = weights if weights is not None else self.fusion_weights
+        return fuse(
+            [self._rank(legs[name], descent=True) for name in names],
+            method=fusion or self.fusion,
+            weights=None if weights is None else [weights.get(name, 1.0) for name in names],
+            k=self.rrf_k,
+            limit=limit
         )
 
-    def _compute_RRF(
+    @timeit("Hybrid::search")
+    def search(
         self,
-        multi_ranks: List[List[Candidate]],
-        k: int = 60,
-        limit: int = 5
+        query: str,
+        limit: int = 5,
+        fusion: Optional[FusionMethod] = None,
+        weights: Optional[Dict[str, float]] = None,
+        raw_limit: Optional[int] = None,
+        vector_limit: Optional[int] = None,
     ) -> List[Candidate]:
-        from collections import defaultdict
+        """
+        Args:
+            query: Search query string
+            limit: Number of fused results to return
+            fusion: Override the default fusion method for this call
+            weights: Per-leg weights {'raw': w, 'vector': w} for this call
+            raw_limit / vector_limit: Per-leg fan-out for this call (0 = skip leg)
+        """
+        legs = self._run_legs(
+            self._leg_fns(
+                False, query,
+                self.leg_limits["raw"] if raw_limit is None else raw_limit,
+                self.leg_limits["vector"] if vector_limit is None else vector_limit,
+            ),
+            self.timeouts
+        )
+        legs = {name: results for name, results in legs.items() if results is not None}
 
-        rrf_scores = defaultdict(float)
-        candidate_map = {}
+        if not legs:
+            print("⚠️ Hybrid: no leg returned results")
+            return []
 
-        for ranked_list in multi_ranks:
-            for idx, candidate in enumerate(ranked_list):
-                rank = idx + 1
-                doc_id = candidate.id
+        fused = self._fuse(legs, limit, fusion, weights)
+        if self.two_phase:
+            fused = self.content_retriever.hydrate(fused)
 
-                rrf_scores[doc_id] += 1.0 / (k + rank)
+        if self.trace_sink is not None:
+            for name, results in legs.items():
+                self.trace_sink.emit(name, query, self._rank(results, descent=True))
+            self.trace_sink.emit("fused", query, fused, fusion=fusion or self.fusion)
 
-                if doc_id not in candidate_map:
-                    candidate_map[doc_id] = candidate
+        return fused
 
-        sorted_docs = sorted(
-            rrf_scores.items(),
-            key=lambda x: x[1],
-            reverse=True
+    def search_batch(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        fusion: Optional[FusionMethod] = None,
+        weights: Optional[Dict[str, float]] = None,
+        raw_limit: Optional[int] = None,
+        vector_limit: Optional[int] = None,
+    ) -> List[List[Candidate]]:
+        """
+        Batched hybrid search: each leg answers all queries with its native
+        search_batch (both legs in parallel, no deadline), then fusion is
+        applied per query.
+        Per-query leg results are not traced here (offline evaluation over
+        thousands of queries).
+        """
+        legs = self._run_legs(
+            self._leg_fns(
+                True, queries,
+                self.leg_limits["raw"] if raw_limit is None else raw_limit,
+                self.leg_limits["vector"] if vector_limit is None else vector_limit,
+            ),
+            {"raw": None, "vector": None}
         )
+        legs = {name: results for name, results in legs.items() if results is not None}
 
-        final_candidates = []
-        for doc_id, score in sorted_docs[:limit]:
-            base = candidate_map[doc_id]
-            final_candidates.append(
-                Candidate(
-                    id=doc_id,
-                    category=base.category,
-                    content=base.content,
-                    score=score
-                )
-            )
-
-        return final_candidates
+        fused = [
+            self._fuse({name: batch[q] for name, batch in legs.items()}, limit, fusion, weights)
+            for q in range(len(queries))
+        ]
+        # Một lần lookup content cho top-`limit` của mọi query
+        return self.content_retriever.hydrate_batch(fused) if self.two_phase else fused
+
+    def _rank(self, candidates: List[Candidate], descent: bool = True) -> List[Candidate]:
+        if not candidates:
+            return []
+        return sorted(
+            candidates,
+            key=lambda c: c.score,
+            reverse=descent
+        )
@@ -4,7 +4,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import numpy as np
 from kneed import KneeLocator
 from typing import List, Dict, Any
-from retriever.base import BaseVectorRetriever
+from retriever.base import BaseRetriever, BaseVectorRetriever, Candidate
 from config import QDRANT_API_KEY, QDRANT_URL, EMBEDDING_MODEL_NAME
 import matplotlib.pyplot as plt
 
@@ -48,13 +48,14 @@ class KneedleRetriever(BaseVectorRetriever):
         print(f"🧮 Detected curve nature: {nature} (mean curvature={curvature_mean:.4f})")
         return nature
     
-    def search(self, user_query: str, limit: int = 4) -> List[Dict[str, Any]]:
+    def search(self, user_query: str, limit: int = 4, with_content: bool = True) -> List[Dict[str, Any]]:
         """
         Perform vector search using Kneedle algorithm to find optimal cutoff.
         
         Args:
             user_query (str): The user's query string
             limit (int): Minimum number of results to return (fallback)
+            with_content (bool): False = ids + scores only (two-phase search)
             
         Returns:
             List[Dict]: Documents up to the knee point in similarity scores
@@ -62,7 +63,7 @@ class KneedleRetriever(BaseVectorRetriever):
         print(f"🔍 Kneedle Retrieval: Fetching up to {self.max_candidates} candidates")
         
         # Fetch more candidates than limit for knee detection
-        results = self._raw_vector_search(user_query, limit=self.max_candidates)
+        results = self._raw_vector_search(user_query, limit=self.max_candidates, with_content=with_content)
         
         if len(results) <= limit:
             print(f"⚠️ Only {len(results)} results found, returning all")
@@ -97,6 +98,10 @@ class KneedleRetriever(BaseVectorRetriever):
         except Exception as e:
             print(f"⚠️ Kneedle algorithm failed: {e}, returning top {limit} results")
             return results[:limit]
+
+    def search_batch(self, queries: List[str], limit: int = 5, with_content: bool = True) -> List[List[Candidate]]:
+        """Per-query post-processing, fall back to one search() per query."""
+        return BaseRetriever.search_batch(self, queries, limit=limit, with_content=with_content)
         
 if __name__ == '__main__':
     kneedle_retriever = KneedleRetriever(
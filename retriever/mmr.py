@@ -3,7 +3,7 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from typing import List, Dict, Any, Optional, Literal
 import numpy as np
-from retriever.base import BaseVectorRetriever
+from retriever.base import BaseRetriever, BaseVectorRetriever
 from config import QDRANT_API_KEY, QDRANT_URL, EMBEDDING_MODEL_NAME
 from retriever.base import Candidate
 
@@ -27,6 +27,7 @@ class MMRRetriever(BaseVectorRetriever):
         embeddingName: str = None,
         vector_size: int = None,
         llm=None,
+        embedding=None,
     ):
         """
         Initialize MMR Retriever
@@ -50,6 +51,7 @@ class MMRRetriever(BaseVectorRetriever):
             embeddingName=embeddingName,
             vector_size=vector_size,
             llm=llm,
+            embedding=embedding,
         )
     
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
@@ -65,15 +67,15 @@ class MMRRetriever(BaseVectorRetriever):
         
         return dot_product / (norm1 * norm2)
     
-    def _compute_similarities(self,  embeddings):
-        num_embeddings = embeddings.shape[0]
-        similarities = np.zeros((num_embeddings, num_embeddings))
-
-        for i in range(num_embeddings):
-            for j in range(num_embeddings):
-                similarities[i, j] = self._cosine_similarity(embeddings[i], embeddings[j])
-
-        return similarities
+    def _compute_similarities(self, embeddings) -> np.ndarray:
+        """
+        Cosine similarity matrix (N x N) in one normalized matrix product.
+        Zero vectors get similarity 0 with everything.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        normalized = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+        return normalized @ normalized.T
     
     def _combine_similarity_matrices(self, candidates_similarities, scores_with_query):
         """
@@ -103,61 +105,72 @@ class MMRRetriever(BaseVectorRetriever):
     ) -> np.ndarray:
 
         if not candidates:
-            return []
-        # Build candidate embeddings array efficiently
-        candidate_embeddings = []
-        scores_with_query = []
-        for candidate in candidates:
-            emb = candidate.embedding
-            if emb:
-                candidate_embeddings.append(np.array(emb))
-            else:
-                candidate_embeddings.append(np.zeros(self.vector_size))
-
-            score = candidate.score
-            if score:
-                scores_with_query.append(np.array(score))
-            else:
-                scores_with_query.append(np.zeros(1))
+            return np.zeros((0, 0))
 
-        
-        # Convert to numpy array for vectorized operations
-        candidates_similarities = self._compute_similarities(np.array(candidate_embeddings))
-        scores_with_query = np.array(scores_with_query)
+        # Embedding = view vào block vector trả về cùng kết quả search (không encode lại)
+        # Candidate không có embedding -> vector 0 (similarity 0)
+        dim = next((len(c.embedding) for c in candidates if c.embedding is not None and len(c.embedding)), self.vector_size)
+        candidate_embeddings = np.zeros((len(candidates), dim), dtype=np.float32)
+        for i, candidate in enumerate(candidates):
+            if candidate.embedding is not None and len(candidate.embedding):
+                candidate_embeddings[i] = candidate.embedding
+
+        scores_with_query = np.array([c.score or 0.0 for c in candidates], dtype=np.float64)
+
+        candidates_similarities = self._compute_similarities(candidate_embeddings)
         sim_matrix = self._combine_similarity_matrices(candidates_similarities, scores_with_query)
         return sim_matrix
        
     def _maximal_marginal_relevance(self, similarities:np.ndarray, num_to_select:int, lambda_param:float):
+        """
+        Greedy MMR over the (N+1)x(N+1) matrix (row/col 0 = query).
+        max-similarity-to-selected is kept as a vector and updated with one
+        np.maximum per step, so selection is O(N*k) NumPy work.
+        """
         if similarities.shape[0] <= 1 or num_to_select <= 0:
             return []
 
-        most_similar = np.argmax(similarities[0, 1:])
+        query_sims = similarities[0, 1:]
+        cand_sims = similarities[1:, 1:]
+        num_candidates = len(query_sims)
 
+        most_similar = int(np.argmax(query_sims))
         selected = [most_similar]
-        candidates = set(range(len(similarities) - 1))
-        candidates.remove(most_similar)
 
-        while (len(selected) < num_to_select):
-            if not candidates:
-                break
+        remaining = np.ones(num_candidates, dtype=bool)
+        remaining[most_similar] = False
+        max_sim_to_selected = cand_sims[:, most_similar].copy()
 
-            mmr_scores = {}
-            for i in candidates:
-                mmr_scores[i] = (lambda_param * similarities[i+1, 0] -
-                    (1 - lambda_param) * max([similarities[i+1, j+1] for j in selected]))
+        relevance = lambda_param * query_sims
+        while len(selected) < num_to_select and remaining.any():
+            mmr_scores = relevance - (1 - lambda_param) * max_sim_to_selected
+            mmr_scores[~remaining] = -np.inf
 
-            next_best = max(mmr_scores, key=mmr_scores.get)
+            next_best = int(np.argmax(mmr_scores))
             selected.append(next_best)
-            candidates.remove(next_best)
+            remaining[next_best] = False
+            np.maximum(max_sim_to_selected, cand_sims[:, next_best], out=max_sim_to_selected)
+
         return selected
     
-    def search(self, user_query:str, raw_limit:int=100, limit:int=10, lambda_param:float=0.5) -> List[Dict[str, Any]]:
+    def search(
+        self,
+        user_query:str,
+        raw_limit:int=100,
+        limit:int=10,
+        lambda_param:float=0.5,
+        embedding_dtype:Literal['float32', 'int8']='float32',
+        with_content:bool=True,
+    ) -> List[Dict[str, Any]]:
         """
         Perform MMR-based vector search
         
         Args:
             user_query: User's search query
             limit: Number of final results to return (k in MMR)
+            embedding_dtype: dtype of the stored vectors fetched with the hits
+                             ('int8' = 4x smaller block, cosine preserved)
+            with_content: False = ids + scores only (two-phase search)
             
         Returns:
             List of diverse and relevant documents
@@ -168,12 +181,17 @@ class MMRRetriever(BaseVectorRetriever):
         print(f"\n🔍 MMR Search: query='{user_query[:50]}...', limit={raw_limit}, lambda_param={lambda_param}")
         
         # Step 1: Fetch initial candidates (fetch_k documents)
-        candidates = self._raw_vector_search(user_query, limit=raw_limit, return_embedding=True)
+        candidates = self._raw_vector_search(user_query, limit=raw_limit, return_embedding=True, embedding_dtype=embedding_dtype, with_content=with_content)
         sim_matrix = self._generate_similarity_matrices(candidates=candidates)
         selected_indices = self._maximal_marginal_relevance(similarities=sim_matrix, num_to_select=limit, lambda_param=lambda_param)
-        results = [c for idx, c in enumerate(candidates) if idx in selected_indices]
+        selected_set = set(selected_indices)
+        results = [c for idx, c in enumerate(candidates) if idx in selected_set]
 
         return results
+
+    def search_batch(self, queries: List[str], limit: int = 5, with_content: bool = True) -> List[List[Candidate]]:
+        """Per-query post-processing, fall back to one search() per query."""
+        return BaseRetriever.search_batch(self, queries, limit=limit, with_content=with_content)
     
 if __name__ == '__main__':
     mmr_retriever = MMRRetriever(
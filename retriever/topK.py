@@ -11,19 +11,20 @@ from retriever.base import BaseVectorRetriever
 class TopKRetriever(BaseVectorRetriever):
     """Traditional Top-K retrieval strategy"""
     
-    def search(self, query: str, limit: int = 4) -> List[Dict[str, Any]]:
+    def search(self, query: str, limit: int = 4, with_content: bool = True) -> List[Dict[str, Any]]:
         """
         Perform traditional top-k vector search.
         
         Args:
             user_query (str): The user's query string
             limit (int): Number of top results to return
+            with_content (bool): False = ids + scores only (two-phase search)
             
         Returns:
             List[Dict]: Top-k matching documents
         """
         print(f"🔍 TopK Retrieval: Fetching top {limit} results")
-        results = self._raw_vector_search(query, limit=limit)
+        results = self._raw_vector_search(query, limit=limit, with_content=with_content)
         return results[:limit]
 
 # Usage example:
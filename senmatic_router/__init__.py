@@ -1,2 +1,3 @@
 from senmatic_router.route import *
-from senmatic_router.router import *
\ No newline at end of file
+from senmatic_router.router import *
+from senmatic_router.route_store import *
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import json
+import shutil
+import hashlib
+from typing import Dict, List, Literal, Optional
+import numpy as np
+
+STORE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+
+def hash_samples(samples: List[str]) -> str:
+    """Content hash of a route's samples (order-sensitive), used to detect stale stores."""
+    h = hashlib.blake2b(digest_size=16)
+    for sample in samples:
+        h.update(sample.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class RouteStore:
+    """
+    Binary on-disk store of route sample embeddings.
+
+    Layout (one directory):
+        manifest.json   {version, model, dim, dtype, routes: {name: {file, count, samples_hash}}}
+        route_<i>.npy   float32 / float16 (count, dim), L2-normalized, opened with mmap
+
+    Replaces the old JSON file (nested float lists), which is migrated
+    once with migrate_json().
+    """
+
+    def __init__(self, store_dir: str, mmap: bool = True):
+        self.store_dir = store_dir
+        self.mmap = mmap
+        self.manifest: Optional[Dict] = None
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.store_dir, MANIFEST_FILE))
+
+    def read_manifest(self) -> Dict:
+        with open(os.path.join(self.store_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported route store version: {manifest.get('version')}")
+        self.manifest = manifest
+        return manifest
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """Route name -> (count, dim) array (memory-mapped, read-only)."""
+        manifest = self.read_manifest()
+
+        routes_embedding = {}
+        for route_name, info in manifest["routes"].items():
+            emb = np.load(os.path.join(self.store_dir, info["file"]), mmap_mode="r" if self.mmap else None)
+            if emb.shape != (info["count"], manifest["dim"]):
+                raise ValueError(f"Corrupted route store in {self.store_dir}: '{route_name}' has shape {emb.shape}")
+            routes_embedding[route_name] = emb
+
+        return routes_embedding
+
+    def save(
+        self,
+        routes_embedding: Dict[str, np.ndarray],
+        model: Optional[str] = None,
+        dtype: Literal["float32", "float16"] = "float32",
+        samples_hash: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Write the store to a temp dir, then swap it in."""
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported route store dtype: {dtype}")
+
+        tmp_dir = self.store_dir.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        dim = None
+        routes = {}
+        for i, (route_name, emb) in enumerate(routes_embedding.items()):
+            emb = np.asarray(emb, dtype=np.float32)
+            norms = np.linalg.norm(emb, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            emb = emb / norms
+            dim = emb.shape[1] if dim is None else dim
+
+            file_name = f"route_{i}.npy"
+            np.save(os.path.join(tmp_dir, file_name), emb.astype(dtype))
+            routes[route_name] = {
+                "file": file_name,
+                "count": len(emb),
+                "samples_hash": (samples_hash or {}).get(route_name),
+            }
+
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "model": model,
+                "dim": dim,
+                "dtype": dtype,
+                "routes": routes,
+            }, f, indent=2, ensure_ascii=False)
+
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        os.replace(tmp_dir, self.store_dir)
+        print(f"💾 Route store saved: {sum(r['count'] for r in routes.values())} vectors ({dtype}) -> {self.store_dir}")
+
+    def migrate_json(
+        self,
+        json_path: str,
+        model: Optional[str] = None,
+        dtype: Literal["float32", "float16"] = "float32",
+    ) -> None:
+        """One-time conversion of the legacy {'routes': {name: [[...], ...]}} JSON file."""
+        print(f"🔵 Migrating route embeddings {json_path} -> {self.store_dir}...")
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        self.save(
+            {route_name: np.asarray(emb, dtype=np.float32) for route_name, emb in data["routes"].items()},
+            model=model,
+            dtype=dtype,
+        )
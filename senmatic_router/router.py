@@ -4,57 +4,334 @@ import json
 from tqdm import tqdm
 import faiss
 import time
+from typing import Any, Callable, Dict, Literal, Optional
+from senmatic_router.route_store import RouteStore, hash_samples
+
+# Luật chấm điểm route (dùng chung cho guide / batch_guide)
+HIGH_SIM = 0.95         # có hit > HIGH_SIM -> điểm = trung bình các hit đó
+BOOST_SIM = 0.75        # ngược lại: hit > BOOST_SIM được bình phương ...
+TOP_N = 100             # ... rồi lấy trung bình TOP_N hit cao nhất của route
+
+IndexType = Literal["flat", "ivf_flat", "ivf_pq", "hnsw"]
+MIN_POINTS_PER_CENTROID = 39    # k-means của FAISS cần >= 39 điểm mỗi centroid
+DEFAULT_INDEX_PARAMS = {
+    "nlist": None,              # IVF: số cluster, None = 4 * sqrt(N)
+    "nprobe": None,             # IVF: số cluster được quét khi search, None = nlist / 8 (>= 8)
+    "pq_m": 64,                 # IVF-PQ: số sub-quantizer (dim phải chia hết)
+    "pq_bits": 8,               # IVF-PQ: bit mỗi code
+    "hnsw_m": 32,               # HNSW: số cạnh mỗi node
+    "ef_construction": 200,     # HNSW: độ rộng tìm kiếm khi build
+    "ef_search": 128,           # HNSW: độ rộng tìm kiếm khi query (>= top_k)
+    "verify_queries": 200,      # số route vector làm query để so route với flat khi build
+    "verify_top_k": 200,        # top_k của phép so sánh (như guide)
+    "min_agreement": 0.95,      # agreement dưới ngưỡng -> dùng flat
+}
 
 class SemanticRouter():
-    def __init__(self, embedding, routes=None, batch=64, save_path='data/routingEmbedddings/bgem3_routing_embedding_1000.json'):
+    def __init__(
+        self,
+        embedding,
+        routes=None,
+        batch=64,
+        save_path='data/routingEmbedddings/bgem3_routing_embedding_1000.json',
+        store_dtype='float32',          # 'float16' = route store nhỏ một nửa
+        metrics_hook: Optional[Callable[[Dict[str, Any]], None]] = None,   # nhận timing của mỗi guide()
+        prototypes_per_route: int = 0,  # > 0: bật tầng centroid k-means trước khi search toàn bộ samples
+        prototype_margin: float = 0.05, # margin centroid (top1 - top2) tối thiểu để bỏ qua full search
+        index_type: IndexType = "flat", # 'ivf_flat' | 'ivf_pq' | 'hnsw' cho tập sample lớn (xấp xỉ)
+        index_params: Optional[Dict[str, Any]] = None,   # ghi đè DEFAULT_INDEX_PARAMS
+    ):
         self.routes = routes
         self.embedding = embedding
         self.routesEmbedding = {}
         self.save_path = save_path
-        
-        print(os.path.exists(self.save_path))
-        # Kiểm tra xem có file embeddings đã lưu không
-        if os.path.exists(self.save_path):
-            print(f'🔵 Loading embeddings from {self.save_path}...')
+        self.store_dtype = store_dtype
+        self.metrics_hook = metrics_hook
+        self.batch_errors = {}          # lỗi từng query của lần batch_guide gần nhất
+        self.last_path = None           # nhánh của lần guide() gần nhất: 'prototype' | 'full'
+        self.batch_paths = []           # nhánh từng query của lần batch_guide gần nhất (None = lỗi)
+        self.prototypes_per_route = prototypes_per_route
+        self.prototype_margin = prototype_margin
+        self.prototypes = None
+        self.prototype_stats = {"queries": 0, "fallbacks": 0}
+        if index_type not in ("flat", "ivf_flat", "ivf_pq", "hnsw"):
+            raise ValueError(f"Unsupported index_type: {index_type}")
+        self.requested_index_type = index_type
+        self.index_type = index_type        # index thực sự dùng (có thể fallback về 'flat')
+        self.index_agreement = None         # route agreement với flat lúc build (index xấp xỉ)
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+
+        # Route store nhị phân nằm cạnh file JSON cũ: foo.json -> foo/
+        self.store = RouteStore(os.path.splitext(save_path)[0])
+
+        # Migrate một lần từ file JSON cũ
+        if not self.store.exists and os.path.exists(self.save_path):
+            self.store.migrate_json(self.save_path, model=self._model_name(), dtype=store_dtype)
+
+        if self.store.exists and self._store_is_current():
+            print(f'🔵 Loading embeddings from {self.store.store_dir}...')
             self._load_embeddings()
-            
             print('🟢 Loaded embeddings successfully!')
-            self._build_faiss_index()
         else:
             print('🔵 Generating new embeddings...')
             self._generate_embeddings(batch)
             self._save_embeddings()
             print('🟢 Encoded and saved successfully!')
 
+        self._build_faiss_index()
+
+    def _model_name(self):
+        return getattr(self.embedding, "name", None)
+
+    def _store_is_current(self):
+        """
+        Compare the store manifest with the current model / route samples.
+        Without `routes` the store cannot be rebuilt, so it is used as is.
+        """
+        manifest = self.store.read_manifest()
+        if self.routes is None:
+            return True
+
+        model = self._model_name()
+        if manifest.get("model") and model and manifest["model"] != model:
+            print(f"⚠️ Route store was built with '{manifest['model']}', current model is '{model}'")
+            return False
+
+        stored = manifest["routes"]
+        if set(stored) != {route.name for route in self.routes}:
+            print("⚠️ Route store has different routes, rebuilding")
+            return False
+        for route in self.routes:
+            # Store migrate từ JSON không có hash -> không kiểm tra được
+            if stored[route.name].get("samples_hash") not in (None, hash_samples(route.samples)):
+                print(f"⚠️ Samples of route '{route.name}' changed, rebuilding")
+                return False
+        return True
 
     def _build_faiss_index(self):
         """
         Build FAISS index from self.routesEmbedding
         """
         all_embeddings = []
-        self.id2route = []
+        self.route_names = []       # route_id -> route name
+        route_ids = []
 
         for route_name, emb in self.routesEmbedding.items():
             if emb is None or len(emb) == 0:
                 continue
 
-            # float32 + normalize (FAISS dùng inner product)
-            emb = emb.astype("float32")
-            faiss.normalize_L2(emb)
-
             all_embeddings.append(emb)
-            self.id2route.extend([route_name] * len(emb))
+            route_ids.append(np.full(len(emb), len(self.route_names), dtype=np.int64))
+            self.route_names.append(route_name)
 
         if not all_embeddings:
             raise RuntimeError("No embeddings to build FAISS index")
 
-        all_embeddings = np.vstack(all_embeddings)
+        # Một bản copy float32 duy nhất từ các mảng mmap (float32 / float16)
+        all_embeddings = np.concatenate(all_embeddings, axis=0, dtype="float32")
+        # FAISS row -> route_id (int), dùng cho chấm điểm vector hóa
+        self.route_ids = np.concatenate(route_ids)
+        self.id2route = [self.route_names[r] for r in self.route_ids]
+        # float32 + normalize (FAISS dùng inner product)
+        faiss.normalize_L2(all_embeddings)
+
+        self.index_type = self.requested_index_type
+        self.index_agreement = None
+        if self.index_type != "flat":
+            reason = self._too_few_vectors(len(all_embeddings))
+            if reason:
+                print(f"⚠️ {reason}, using flat index instead of {self.index_type}")
+                self.index_type = "flat"
+
+        if self.index_type == "flat":
+            self.index = self._flat_index(all_embeddings)
+        else:
+            self.index = self._load_or_train_index(all_embeddings)
+            self.set_search_params()
+            self._verify_against_flat(all_embeddings)
+
+        print(f"🟢 FAISS index ({self.index_type}) built with {self.index.ntotal} vectors")
+
+        if self.prototypes_per_route > 0:
+            self._build_prototypes(all_embeddings)
+
+    # ======================================================
+    # APPROXIMATE INDEXES
+    # ======================================================
+    @staticmethod
+    def _flat_index(all_embeddings):
+        index = faiss.IndexFlatIP(all_embeddings.shape[1])  # cosine similarity
+        index.add(all_embeddings)
+        return index
+
+    def _too_few_vectors(self, n_vectors):
+        """Why an IVF / PQ index cannot be trained on n_vectors (None = it can)."""
+        params = self._index_build_params(n_vectors)
+        if "nlist" in params and n_vectors < MIN_POINTS_PER_CENTROID * params["nlist"]:
+            return f"{n_vectors} vectors < {MIN_POINTS_PER_CENTROID} x nlist={params['nlist']}"
+        if self.index_type == "ivf_pq" and n_vectors < MIN_POINTS_PER_CENTROID * 2 ** params["pq_bits"]:
+            return f"{n_vectors} vectors < {MIN_POINTS_PER_CENTROID} x 2^pq_bits={2 ** params['pq_bits']}"
+        return None
+
+    def _verify_against_flat(self, all_embeddings):
+        """
+        Route agreement of the approximate index with exact search, using a
+        sample of the route vectors as queries (same top_k and scoring as
+        guide). Below min_agreement the router falls back to a flat index.
+        Self-hits make this an optimistic estimate for unseen queries.
+        """
+        p = self.index_params
+        n = len(all_embeddings)
+        rng = np.random.default_rng(0)
+        sample = rng.choice(n, size=min(p["verify_queries"], n), replace=False)
+        queries = np.ascontiguousarray(all_embeddings[np.sort(sample)])
+        top_k = min(p["verify_top_k"], n)
+
+        exact = self._score_routes(*faiss.knn(queries, all_embeddings, top_k, metric=faiss.METRIC_INNER_PRODUCT))
+        approx = self._score_routes(*self.index.search(queries, top_k))
+        self.index_agreement = float(np.mean(exact.argmax(axis=1) == approx.argmax(axis=1)))
+        print(f"🔵 {self.index_type} route agreement with flat on {len(queries)} sample vectors: {self.index_agreement:.3f}")
+
+        if self.index_agreement < p["min_agreement"]:
+            print(f"⚠️ Agreement below min_agreement={p['min_agreement']}, using flat index instead of {self.index_type}")
+            self.index_type = "flat"
+            self.index = self._flat_index(all_embeddings)
+
+    def _index_paths(self):
+        """Trained index + its build params, saved inside the route store dir."""
+        base = os.path.join(self.store.store_dir, f"index_{self.index_type}")
+        return base + ".faiss", base + ".json"
+
+    def _index_build_params(self, n_vectors):
+        """Params that change the trained index (search-time knobs excluded)."""
+        p = self.index_params
+        params = {"index_type": self.index_type, "ntotal": int(n_vectors)}
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            nlist = p["nlist"] or int(4 * np.sqrt(n_vectors))
+            params["nlist"] = max(1, min(nlist, n_vectors))
+        if self.index_type == "ivf_pq":
+            params.update(pq_m=p["pq_m"], pq_bits=p["pq_bits"])
+        if self.index_type == "hnsw":
+            params.update(hnsw_m=p["hnsw_m"], ef_construction=p["ef_construction"])
+        return params
+
+    def _load_or_train_index(self, all_embeddings):
+        index_path, meta_path = self._index_paths()
+        params = self._index_build_params(len(all_embeddings))
+
+        if os.path.exists(index_path) and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f) == params:
+                    print(f"📂 Loading FAISS index from {index_path}")
+                    return faiss.read_index(index_path)
+            print(f"⚠️ {index_path} was built with other params, rebuilding")
 
         dim = all_embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dim)  # cosine similarity
-        self.index.add(all_embeddings)
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = params["ef_construction"]
+        else:
+            quantizer = faiss.IndexFlatIP(dim)
+            if self.index_type == "ivf_flat":
+                index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"], faiss.METRIC_INNER_PRODUCT)
+            else:
+                if dim % params["pq_m"]:
+                    raise ValueError(f"pq_m={params['pq_m']} must divide dim={dim}")
+                index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["pq_m"], params["pq_bits"], faiss.METRIC_INNER_PRODUCT)
+
+            print(f"🔵 Training FAISS {self.index_type} index (nlist={params['nlist']}) on {len(all_embeddings)} vectors...")
+            index.train(all_embeddings)
+
+        index.add(all_embeddings)
 
-        print(f"🟢 FAISS index built with {self.index.ntotal} vectors")
+        os.makedirs(self.store.store_dir, exist_ok=True)
+        faiss.write_index(index, index_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(params, f, indent=2)
+        print(f"💾 FAISS index saved to {index_path}")
+        return index
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        Search-time knobs (no rebuild): IVF nprobe, HNSW efSearch.
+        nprobe=None in index_params scales with the trained nlist.
+        """
+        if nprobe is not None:
+            self.index_params["nprobe"] = nprobe
+        if ef_search is not None:
+            self.index_params["ef_search"] = ef_search
+
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            ivf = faiss.extract_index_ivf(self.index)
+            ivf.nprobe = min(ivf.nlist, self.index_params["nprobe"] or max(8, ivf.nlist // 8))
+        elif self.index_type == "hnsw":
+            self.index.hnsw.efSearch = self.index_params["ef_search"]
+
+    def _build_prototypes(self, all_embeddings):
+        """
+        Spherical k-means centroids per route (rows grouped by route, in
+        self.route_names order) for the prototype fast path.
+        """
+        prototypes, starts = [], []
+        for route_id in range(len(self.route_names)):
+            emb = all_embeddings[self.route_ids == route_id]
+            k = min(self.prototypes_per_route, len(emb))
+            starts.append(sum(len(p) for p in prototypes))
+
+            if k == len(emb):
+                prototypes.append(emb)
+                continue
+            kmeans = faiss.Kmeans(emb.shape[1], k, niter=20, seed=1234, spherical=True, verbose=False)
+            kmeans.train(emb)
+            centroids = np.ascontiguousarray(kmeans.centroids, dtype="float32")
+            faiss.normalize_L2(centroids)
+            prototypes.append(centroids)
+
+        self.prototypes = np.concatenate(prototypes, axis=0)
+        self.prototype_starts = np.array(starts)
+        print(f"🟢 Route prototypes built: {len(self.prototypes)} centroids ({self.prototypes_per_route}/route)")
+
+    @property
+    def fallback_rate(self):
+        """Share of prototype-path queries that fell back to the full sample search."""
+        queries = self.prototype_stats["queries"]
+        return self.prototype_stats["fallbacks"] / queries if queries else 0.0
+
+    def _prototype_decisions(self, q):
+        """
+        Args:
+            q: (n_queries, dim) L2-normalized query embeddings
+
+        Returns:
+            best route_id, its max centroid similarity and the margin over
+            the runner-up route, each of shape (n_queries,)
+        """
+        sims = q @ self.prototypes.T                                             # (n, n_prototypes)
+        route_sims = np.maximum.reduceat(sims, self.prototype_starts, axis=1)    # (n, n_routes)
+
+        best = np.argmax(route_sims, axis=1)
+        best_sims = route_sims[np.arange(len(q)), best]
+        if route_sims.shape[1] == 1:
+            margin = np.full(len(q), np.inf)
+        else:
+            runner_up = np.partition(route_sims, -2, axis=1)[:, -2]
+            margin = best_sims - runner_up
+        return best, best_sims, margin
+
+    def prototype_guide(self, queries):
+        """
+        Prototype stage only (no fallback), for tuning prototype_margin.
+        Returns [(centroid_score, route_name, margin)] per query.
+        """
+        if self.prototypes is None:
+            raise RuntimeError("Prototypes disabled (prototypes_per_route=0)")
+        q = np.array(self.embedding.encode(list(queries)), dtype="float32")
+        faiss.normalize_L2(q)
+        best, best_sims, margin = self._prototype_decisions(q)
+        return [
+            (float(s), self.route_names[b], float(m))
+            for b, s, m in zip(best, best_sims, margin)
+        ]
 
     def _generate_embeddings(self, batch):
         """Generate embeddings for all routes"""
@@ -69,25 +346,18 @@ class SemanticRouter():
             self.routesEmbedding[route.name] = np.vstack(embeddings)
 
     def _save_embeddings(self):
-        """Save embeddings to JSON file"""
-        data = {
-            'routes': {}
-        }
-        
-        for route_name, embeddings in self.routesEmbedding.items():
-            data['routes'][route_name] = embeddings.tolist()
-        
-        with open(self.save_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f)
-        print(f'💾 Embeddings saved to {self.save_path}')
+        """Save embeddings to the binary route store, then reopen it memory-mapped"""
+        self.store.save(
+            self.routesEmbedding,
+            model=self._model_name(),
+            dtype=self.store_dtype,
+            samples_hash={route.name: hash_samples(route.samples) for route in self.routes or []},
+        )
+        self._load_embeddings()
 
     def _load_embeddings(self):
-        """Load embeddings from JSON file"""
-        with open(self.save_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        for route_name, embeddings in data['routes'].items():
-            self.routesEmbedding[route_name] = np.array(embeddings)
+        """Load embeddings from the route store (memory-mapped .npy per route)"""
+        self.routesEmbedding = self.store.load()
 
     def force_regenerate(self, batch=64):
         """Force regenerate embeddings (bỏ qua cache)"""
@@ -95,173 +365,205 @@ class SemanticRouter():
         self.routesEmbedding = {}
         self._generate_embeddings(batch)
         self._save_embeddings()
+        self._build_faiss_index()
         print('🟢 Regenerated and saved successfully!')
 
     def get_routes(self):
         return self.routes
 
     
-    def guide(self, query, top_k=200, debug_time=True):
+    def _score_routes(self, scores: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """
+        Route scores for a block of FAISS results, as pure array ops.
+
+        Args:
+            scores / indices: (n_queries, top_k) FAISS output, each row sorted
+                              by decreasing similarity (index -1 = no hit)
+
+        Returns:
+            (n_queries, n_routes) scores, -inf for routes without hits
+        """
+        n_queries, n_routes = scores.shape[0], len(self.route_names)
+
+        # Segment = (query, route) -> mỗi hit thuộc đúng một segment
+        segments = np.arange(n_queries)[:, None] * n_routes + self.route_ids[indices]
+        sims = scores.astype(np.float64)
+        valid = indices >= 0
+        if valid.all():
+            segments, sims = segments.ravel(), sims.ravel()
+        else:
+            segments, sims = segments[valid], sims[valid]
+        n_segments = n_queries * n_routes
+
+        counts = np.bincount(segments, minlength=n_segments)
+
+        # Hit > HIGH_SIM: trung bình nhóm cao
+        high = sims > HIGH_SIM
+        high_count = np.bincount(segments, weights=high, minlength=n_segments)
+        high_sum = np.bincount(segments, weights=np.where(high, sims, 0.0), minlength=n_segments)
+
+        # TOP_N hit cao nhất, hit > BOOST_SIM được bình phương
+        boosted = np.where(sims > BOOST_SIM, sims ** 2, sims)
+        if counts.max(initial=0) > TOP_N:
+            # Hạng của hit trong segment (hits đã sắp giảm dần trong mỗi query)
+            order = np.argsort(segments, kind="stable")
+            starts = np.cumsum(counts) - counts
+            rank = np.empty_like(segments)
+            rank[order] = np.arange(len(segments)) - starts[segments[order]]
+            boosted = np.where(rank < TOP_N, boosted, 0.0)
+        top_sum = np.bincount(segments, weights=boosted, minlength=n_segments)
+        top_count = np.minimum(counts, TOP_N)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            route_scores = np.where(high_count > 0, high_sum / high_count, top_sum / top_count)
+        route_scores[counts == 0] = -np.inf
+        return route_scores.reshape(n_queries, n_routes)
+
+    def _report(self, metrics, debug_time):
+        if self.metrics_hook is not None:
+            self.metrics_hook(metrics)
+        if debug_time:
+            print({k: round(v, 3) if isinstance(v, float) else v for k, v in metrics.items()})
+
+    def guide(self, query, top_k=200, debug_time=False, use_prototypes=True):
         """
         Route a single query using FAISS
         Trả về (best_score, best_route_name)
+
+        With prototypes enabled, the query is first compared to the route
+        centroids; the full sample search only runs when the centroid margin
+        is below prototype_margin. The fast path returns the centroid
+        cosine similarity as score, which is NOT on the scale of the full
+        path's route score (HIGH_SIM / BOOST_SIM rule): the path taken is
+        kept in self.last_path (and in the metrics), so only threshold
+        scores of the same path.
+
+        Timings go to `metrics_hook` (if set); debug_time=True also prints them.
         """
 
         t0 = time.perf_counter()
 
+        self.last_path = None
         if not query:
             raise ValueError("Empty query provided.")
 
         # ================== 1. ENCODE ==================
-        t_encode_start = time.perf_counter()
         q = self.embedding.encode([query])
         q = np.array(q, dtype="float32")
         faiss.normalize_L2(q)
-        t_encode_end = time.perf_counter()
-
-        # ================== 2. FAISS SEARCH ==================
-        t_faiss_start = time.perf_counter()
+        t_encode = time.perf_counter()
+
+        # ================== 2. PROTOTYPES (optional) ==================
+        if use_prototypes and self.prototypes is not None:
+            best, best_sims, margin = self._prototype_decisions(q)
+            self.prototype_stats["queries"] += 1
+            if margin[0] >= self.prototype_margin:
+                if self.metrics_hook is not None or debug_time:
+                    t_end = time.perf_counter()
+                    self._report({
+                        "encode_ms": (t_encode - t0) * 1000,
+                        "prototype_ms": (t_end - t_encode) * 1000,
+                        "total_ms": (t_end - t0) * 1000,
+                        "path": "prototype",
+                    }, debug_time)
+                self.last_path = "prototype"
+                return float(best_sims[0]), self.route_names[best[0]]
+            self.prototype_stats["fallbacks"] += 1
+        t_proto = time.perf_counter()
+
+        # ================== 3. FAISS SEARCH ==================
         scores, indices = self.index.search(q, top_k)
-        t_faiss_end = time.perf_counter()
-
-        scores = scores.flatten()
-        indices = indices.flatten()
-
-        # ================== 3. GROUP BY ROUTE ==================
-        t_group_start = time.perf_counter()
-        route_sims = {}
-        for sim, idx in zip(scores, indices):
-            if idx < 0:
-                continue
-            route = self.id2route[idx]
-            route_sims.setdefault(route, []).append(sim)
-        t_group_end = time.perf_counter()
-
-        if not route_sims:
-            raise RuntimeError("No route matched")
+        t_faiss = time.perf_counter()
 
         # ================== 4. SCORE CALCULATION ==================
-        t_score_start = time.perf_counter()
-        final_scores = []
-
-        for route_name, sims in route_sims.items():
-            sims = np.array(sims)
-
-            if np.any(sims > 0.95):
-                high_sim_values = sims[sims > 0.95]
-                score = np.mean(high_sim_values)
-            else:
-                k = min(100, len(sims))
-                top_similarities = np.partition(sims, -k)[-k:]
-                top_similarities = np.where(
-                    top_similarities > 0.75,
-                    top_similarities ** 2,
-                    top_similarities
-                )
-                score = np.mean(top_similarities)
-
-            final_scores.append((float(score), route_name))
-
-        final_scores.sort(reverse=True, key=lambda x: x[0])
-        t_score_end = time.perf_counter()
-
-        t_end = time.perf_counter()
-
-        # ================== DEBUG OUTPUT ==================
-        if debug_time:
-            print({
-                "encode_ms": round((t_encode_end - t_encode_start) * 1000, 2),
-                "faiss_ms": round((t_faiss_end - t_faiss_start) * 1000, 2),
-                "group_ms": round((t_group_end - t_group_start) * 1000, 2),
-                "score_ms": round((t_score_end - t_score_start) * 1000, 2),
-                "total_ms": round((t_end - t0) * 1000, 2),
-                "routes_hit": len(route_sims),
-            })
-
-        return final_scores[0]
+        route_scores = self._score_routes(scores, indices)[0]
+        best = int(np.argmax(route_scores))
+        if route_scores[best] == -np.inf:
+            raise RuntimeError("No route matched")
+        t_score = time.perf_counter()
+
+        if self.metrics_hook is not None or debug_time:
+            self._report({
+                "encode_ms": (t_encode - t0) * 1000,
+                "prototype_ms": (t_proto - t_encode) * 1000,
+                "faiss_ms": (t_faiss - t_proto) * 1000,
+                "score_ms": (t_score - t_faiss) * 1000,
+                "total_ms": (t_score - t0) * 1000,
+                "routes_hit": int(np.sum(route_scores > -np.inf)),
+                "path": "full",
+            }, debug_time)
+
+        self.last_path = "full"
+        return float(route_scores[best]), self.route_names[best]
        
-    def batch_guide(self, queries):
+    def batch_guide(self, queries, top_k=200, use_prototypes=True):
         """
-        Route multiple queries in batch using vectorized operations
-        (logic giống guide, nhưng xử lý nhiều queries)
+        Route multiple queries: one batched encode, one FAISS search for the
+        whole batch, then the same vectorized scorer as guide() on the
+        (n_queries, top_k) hit block -> same result as guide() per query.
+        With prototypes enabled, only the queries below the centroid margin
+        go through the FAISS search; the others get the centroid similarity
+        as score, like guide(). The path of every query is kept in
+        self.batch_paths ('prototype' | 'full', None on error) so scores of
+        the two paths are never compared against one threshold.
+
+        A query that fails (empty, no route matched) gets (None, "error");
+        the others are unaffected. Reasons are kept in self.batch_errors
+        as {query index: message}.
         """
-        try:
-            if not queries:
-                raise ValueError("Empty query list provided.")
+        self.batch_errors = {}
+        self.batch_paths = [None] * len(queries)
+        results = [(None, "error")] * len(queries)
+
+        valid = [i for i, query in enumerate(queries) if query]
+        for i in range(len(queries)):
+            if not queries[i]:
+                self.batch_errors[i] = "Empty query provided."
+        if not valid:
+            return results
 
+        try:
             # Encode tất cả queries cùng lúc
-            queries_embeddings = self.embedding.encode(queries)
-            if queries_embeddings is None:
+            q = self.embedding.encode([queries[i] for i in valid])
+            if q is None:
                 raise ValueError("Embedding model returned None.")
-
-            # Chuẩn hóa embedding (L2 normalization)
-            queries_embeddings = queries_embeddings / np.linalg.norm(queries_embeddings, axis=1, keepdims=True)
-
-            results = []
-            route_names = list(self.routesEmbedding.keys())
-
-            for route_name, route_emb in self.routesEmbedding.items():
-                try:
-                    if route_emb is None or len(route_emb) == 0:
-                        raise ValueError(f"Route '{route_name}' has no embeddings.")
-
-                    # Chuẩn hóa route embeddings
-                    routes_embedding = route_emb / np.linalg.norm(route_emb, axis=1, keepdims=True)
-
-                    # Tính cosine similarity cho toàn bộ batch queries
-                    similarities = np.dot(queries_embeddings, routes_embedding.T)  # shape (n_queries, n_routesamples)
-
-                    # Mảng điểm cho từng query
-                    scores_per_query = np.zeros(similarities.shape[0])
-
-                    for i in range(similarities.shape[0]):
-                        sims = similarities[i]
-
-                        # Nếu tồn tại similarity > 0.95 → dùng trung bình nhóm cao
-                        if np.any(sims > 0.95):
-                            high_sim_values = sims[sims > 0.95]
-                            score = np.mean(high_sim_values)
-                        else:
-                            # Lấy top 100 similarity cao nhất
-                            top_k = min(100, len(sims))
-                            top_similarities = np.partition(sims, -top_k)[-top_k:]
-
-                            # Tăng trọng số các giá trị > 0.75
-                            top_similarities = np.where(top_similarities > 0.75,
-                                                        top_similarities ** 2,
-                                                        top_similarities)
-
-                            # Trung bình sau hiệu chỉnh
-                            score = np.mean(top_similarities)
-
-                        scores_per_query[i] = score
-
-                    results.append(scores_per_query)
-
-                except Exception as e:
-                    print(f"⚠️ Error processing route '{route_name}': {e}")
-                    results.append(np.zeros(len(queries)))
-
-            if not results:
-                raise RuntimeError("No route embeddings processed successfully.")
-
-            # Kết hợp kết quả: (n_routes, n_queries)
-            results = np.array(results)
-
-            # Chọn route tốt nhất cho từng query
-            best_route_indices = np.argmax(results, axis=0)
-            best_scores = np.max(results, axis=0)
-
-            final_results = [
-                (float(best_scores[i]), route_names[best_route_indices[i]])
-                for i in range(len(queries))
-            ]
-
-            return final_results
-
+            q = np.array(q, dtype="float32")
+            faiss.normalize_L2(q)
+
+            best = np.zeros(len(valid), dtype=np.int64)
+            best_scores = np.full(len(valid), -np.inf)
+            full = np.arange(len(valid))        # hàng cần full search
+            confident = np.zeros(len(valid), dtype=bool)
+
+            if use_prototypes and self.prototypes is not None:
+                proto_best, proto_sims, margin = self._prototype_decisions(q)
+                confident = margin >= self.prototype_margin
+                best[confident] = proto_best[confident]
+                best_scores[confident] = proto_sims[confident]
+                full = np.flatnonzero(~confident)
+                self.prototype_stats["queries"] += len(valid)
+                self.prototype_stats["fallbacks"] += len(full)
+
+            if len(full):
+                scores, indices = self.index.search(np.ascontiguousarray(q[full]), top_k)
+                route_scores = self._score_routes(scores, indices)      # (n_full, n_routes)
+                best[full] = np.argmax(route_scores, axis=1)
+                best_scores[full] = route_scores[np.arange(len(full)), best[full]]
         except Exception as e:
             print(f"❌ batch_guide failed: {e}")
-            return [(None, "error")] * len(queries)
+            self.batch_errors.update({i: str(e) for i in valid})
+            return results
+
+        for row, i in enumerate(valid):
+            if best_scores[row] == -np.inf:
+                self.batch_errors[i] = "No route matched"
+            else:
+                results[i] = (float(best_scores[row]), self.route_names[best[row]])
+                self.batch_paths[i] = "prototype" if confident[row] else "full"
+
+        if self.batch_errors:
+            print(f"⚠️ batch_guide: {len(self.batch_errors)}/{len(queries)} queries failed")
+        return results
 
      
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+"""
+Test doubles for BM25Retriever: a MongoDB-like collection, a counting
+segmenter and a retriever built on a small JSON index without any DB
+connection, VnCoreNLP or PhoBERT download.
+"""
+import json
+import math
+from collections import defaultdict
+
+from utils.cache_utils import LRUCache
+
+DOCS = {
+    101: "sốt cao kéo dài ba ngày",
+    102: "ho khan và sốt nhẹ về đêm",
+    103: "đau đầu chóng mặt buồn nôn",
+    104: "đau bụng sau khi ăn",
+    105: "sốt xuất huyết cần đến bệnh viện",
+    106: "tiêm vắc xin cho trẻ em",
+    107: "ho có đờm kéo dài",
+    108: "đau đầu về đêm",
+}
+
+
+class FakeMongoCollection:
+    """find({'id': {'$in': ids}}, projection) over DOCS, counts round trips."""
+
+    def __init__(self, docs=DOCS):
+        self.docs = docs
+        self.finds = 0
+
+    def find(self, query, projection):
+        self.finds += 1
+        return [
+            {"id": i, "category": "c", "content": self.docs[i]}
+            for i in query["id"]["$in"] if i in self.docs
+        ]
+
+
+class CountingSegmenter:
+    """VnTextProcessor stand-in: identity segmentation, counts calls and texts."""
+
+    def __init__(self):
+        self.calls = 0
+        self.texts = []
+
+    def preprocess(self, text):
+        self.calls += 1
+        self.texts.append(text)
+        return text
+
+    def preprocess_batch(self, texts):
+        self.calls += 1
+        self.texts.extend(texts)
+        return list(texts)
+
+
+class SplitTokenizer:
+    """phobert_tokenizer stand-in: whitespace tokens."""
+
+    @staticmethod
+    def tokenize(text):
+        return text.split()
+
+
+def write_json_index(path, docs=DOCS, k1=1.5, b=0.75):
+    """Index JSON in the BM25Index.save() layout, whitespace tokens."""
+    doc_len, postings = {}, defaultdict(dict)
+    for doc_id, text in docs.items():
+        tokens = text.lower().split()
+        doc_len[str(doc_id)] = len(tokens)
+        for token in tokens:
+            postings[token][str(doc_id)] = postings[token].get(str(doc_id), 0) + 1
+
+    N = len(docs)
+    idf = {t: math.log((N - len(d) + 0.5) / (len(d) + 0.5) + 1) for t, d in postings.items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {"N": N, "avg_doc_len": sum(doc_len.values()) / N, "k1": k1, "b": b},
+            "doc_len": doc_len,
+            "idf": idf,
+            "postings": postings,
+        }, f, ensure_ascii=False)
+    return path
+
+
+def make_retriever(bm25, index_path, backend="csr", segmenter=None, token_cache_size=4096, token_cache_ttl=None):
+    """BM25Retriever over index_path and a FakeMongoCollection (no __init__: no DB / VnCoreNLP)."""
+    retriever = bm25.BM25Retriever.__new__(bm25.BM25Retriever)
+    retriever.__dict__.update(
+        type="mongodb",
+        collection=FakeMongoCollection(),
+        index_path=index_path,
+        index_loaded=False,
+        k1=1.5,
+        b=0.75,
+        use_segmentation=segmenter is not None,
+        segmenter=segmenter,
+        index_backend=backend,
+        index_format="auto",
+        use_mmap=True,
+        N=0,
+        avg_doc_len=0.0,
+        doc_len={},
+        postings={},
+        idf={},
+        index=None,
+        segments=None,
+        token_cache=LRUCache(maxsize=token_cache_size, ttl=token_cache_ttl),
+    )
+    retriever.load_index(index_path, backend=backend)
+    return retriever
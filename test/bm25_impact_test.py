@@ -0,0 +1,137 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+from datetime import datetime
+from typing import List, Dict, Any
+import numpy as np
+from tqdm import tqdm
+from data_generator.utils import CSRIndex
+
+
+class ImpactBenchmark:
+    """
+    Compare quantized impact scoring (CSRIndex.top_k_impacts) against exact
+    BM25 scoring (CSRIndex.top_k): ranking quality loss and query latency.
+    """
+
+    def __init__(self, index: CSRIndex, k: int = 10):
+        self.index = index
+        self.k = k
+        self.results = {}
+
+    def sample_queries(self, num_queries: int = 1000, max_len: int = 12, seed: int = 0) -> List[List[str]]:
+        """Random queries, terms drawn proportionally to document frequency."""
+        rng = np.random.default_rng(seed)
+        terms = sorted(self.index.vocab, key=self.index.vocab.get)
+        df = np.diff(self.index.offsets).astype(np.float64)
+        p = df / df.sum()
+        return [
+            [terms[t] for t in rng.choice(len(terms), size=rng.integers(1, max_len + 1), p=p)]
+            for _ in range(num_queries)
+        ]
+
+    @staticmethod
+    def _timed(fn, *args):
+        start = time.perf_counter()
+        out = fn(*args)
+        return out, (time.perf_counter() - start) * 1000
+
+    def eval(self, queries: List[List[str]], bits_list=(8, 16)) -> Dict[str, Any]:
+        exact, exact_ms = [], []
+        for q in tqdm(queries, desc="Exact BM25"):
+            out, ms = self._timed(self.index.top_k, q, self.k)
+            exact.append(out)
+            exact_ms.append(ms)
+
+        self.results = {
+            'timestamp': datetime.now().isoformat(),
+            'configuration': {
+                'k': self.k,
+                'num_queries': len(queries),
+                'num_docs': self.index.num_docs,
+                'vocab_size': len(self.index),
+            },
+            'exact': {
+                'p50_ms': round(float(np.percentile(exact_ms, 50)), 4),
+                'p95_ms': round(float(np.percentile(exact_ms, 95)), 4),
+            },
+            'impact': {},
+        }
+
+        for bits in bits_list:
+            self.index.build_impacts(bits=bits)
+            overlaps, same_order, rel_errors, impact_ms = [], [], [], []
+
+            for q, (ids, scores) in tqdm(zip(queries, exact), total=len(queries), desc=f"Impact {bits}-bit"):
+                (q_ids, q_scores), ms = self._timed(self.index.top_k_impacts, q, self.k)
+                impact_ms.append(ms)
+
+                if len(ids) == 0:
+                    continue
+                overlaps.append(len(set(ids.tolist()) & set(q_ids.tolist())) / len(ids))
+                same_order.append(ids.tolist() == q_ids.tolist())
+
+                approx = self.index.score_impacts(q)[ids] * self.index.impact_scale
+                rel_errors.append(float(np.mean(np.abs(approx - scores) / scores)))
+
+            self.results['impact'][f'{bits}bit'] = {
+                'recall_at_k': round(float(np.mean(overlaps)), 4),
+                'exact_order_rate': round(float(np.mean(same_order)), 4),
+                'mean_rel_score_error': round(float(np.mean(rel_errors)), 6),
+                'p50_ms': round(float(np.percentile(impact_ms, 50)), 4),
+                'p95_ms': round(float(np.percentile(impact_ms, 95)), 4),
+                'speedup_p50': round(float(np.percentile(exact_ms, 50) / np.percentile(impact_ms, 50)), 2),
+                'impact_bytes': int(self.index.impacts.nbytes),
+            }
+
+        return self.results
+
+    def save(self, output_dir: str) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"impact_{timestamp}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {output_file}")
+        return output_file
+
+    def print_summary(self):
+        print("\n" + "=" * 60)
+        print("BM25 IMPACT BENCHMARK")
+        print("=" * 60)
+        print(f"Exact:  p50 {self.results['exact']['p50_ms']} ms | p95 {self.results['exact']['p95_ms']} ms")
+        for name, m in self.results['impact'].items():
+            print(f"\n{name}:")
+            print(f"  Recall@{self.k}:          {m['recall_at_k']:.4f}")
+            print(f"  Exact order rate:   {m['exact_order_rate']:.4f}")
+            print(f"  Mean rel. error:    {m['mean_rel_score_error']:.6f}")
+            print(f"  p50 / p95 (ms):     {m['p50_ms']} / {m['p95_ms']}")
+            print(f"  Speed-up (p50):     {m['speedup_p50']}x")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Quality / speed of quantized BM25 impacts vs exact scoring")
+    parser.add_argument("index_path", help="Binary BM25 index (see data_generator/utils/bm25_csr.py)")
+    parser.add_argument("--queries", default=None, help="JSON list of tokenized queries (list of list of str)")
+    parser.add_argument("--num-queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output-dir", default="test/bm25Results")
+    args = parser.parse_args()
+
+    index = CSRIndex.open_binary(args.index_path, mmap=False)
+    bench = ImpactBenchmark(index, k=args.k)
+
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = json.load(f)
+    else:
+        queries = bench.sample_queries(num_queries=args.num_queries)
+
+    bench.eval(queries)
+    bench.save(args.output_dir)
+    bench.print_summary()
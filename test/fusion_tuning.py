@@ -0,0 +1,181 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+import itertools
+from datetime import datetime
+from typing import List, Dict, Any, Sequence
+import numpy as np
+from tqdm import tqdm
+from retriever.fusion import FUSION_METHODS, fuse
+
+
+class FusionTuner:
+    """
+    Offline grid search over fusion method, leg weights and per-leg fan-out
+    of a HybridRetriever, maximizing recall@k per millisecond.
+
+    Each leg is run once per (query, fan-out) and timed; fused results for
+    every configuration are then computed offline. Hybrid latency of a
+    configuration = max(raw leg, vector leg), since legs run concurrently.
+    """
+
+    def __init__(
+        self,
+        hybrid,
+        k: int = 5,
+        fanouts: Sequence[int] = (10, 20, 50, 100),
+        weight_grid: Sequence[float] = (0.2, 0.35, 0.5, 0.65, 0.8),
+        methods: Sequence[str] = FUSION_METHODS,
+    ):
+        self.legs = {"raw": hybrid.raw_retriver, "vector": hybrid.vector_retriever}
+        self.rrf_k = hybrid.rrf_k
+        self.k = k
+        self.fanouts = sorted(fanouts)
+        self.weight_grid = weight_grid
+        self.methods = methods
+        self.results = {}
+
+    def collect(self, questions: List[str]) -> Dict[str, Any]:
+        """Run + time every leg at every fan-out (leg results sorted by score)."""
+        runs = {name: {} for name in self.legs}
+        for name, retriever in self.legs.items():
+            for fanout in self.fanouts:
+                outputs, latencies = [], []
+                for q in tqdm(questions, desc=f"{name}@{fanout}"):
+                    start = time.perf_counter()
+                    candidates = retriever.search(q, limit=fanout)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    outputs.append(sorted(candidates, key=lambda c: c.score, reverse=True))
+                runs[name][fanout] = {"outputs": outputs, "latency_ms": np.array(latencies)}
+        return runs
+
+    def _configs(self):
+        for method in self.methods:
+            if method == "rrf":
+                weight_options = [None]
+            else:
+                weight_options = [{"raw": w, "vector": 1.0 - w} for w in self.weight_grid]
+            for weights, raw_f, vec_f in itertools.product(weight_options, self.fanouts, self.fanouts):
+                yield method, weights, raw_f, vec_f
+
+    def eval(self, eval_set: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Args:
+            eval_set: [{'question': str, 'relevant_ids': [doc ids]}, ...]
+        """
+        questions = [s["question"] for s in eval_set]
+        relevant = [set(s["relevant_ids"]) for s in eval_set]
+        runs = self.collect(questions)
+
+        configs = []
+        for method, weights, raw_f, vec_f in tqdm(list(self._configs()), desc="Fusion grid"):
+            raw, vec = runs["raw"][raw_f], runs["vector"][vec_f]
+
+            recalls = []
+            for i, rel in enumerate(relevant):
+                if not rel:
+                    continue
+                fused = fuse(
+                    [raw["outputs"][i], vec["outputs"][i]],
+                    method=method,
+                    weights=None if weights is None else [weights["raw"], weights["vector"]],
+                    k=self.rrf_k,
+                    limit=self.k
+                )
+                recalls.append(len(rel & {c.id for c in fused}) / len(rel))
+
+            latency = np.maximum(raw["latency_ms"], vec["latency_ms"])
+            recall = float(np.mean(recalls)) if recalls else 0.0
+            p50 = float(np.percentile(latency, 50))
+            configs.append({
+                "method": method,
+                "weights": weights,
+                "raw_limit": raw_f,
+                "vector_limit": vec_f,
+                f"recall_at_{self.k}": round(recall, 4),
+                "p50_ms": round(p50, 3),
+                "p95_ms": round(float(np.percentile(latency, 95)), 3),
+                "recall_per_ms": recall / p50 if p50 > 0 else 0.0,
+            })
+
+        configs.sort(key=lambda c: c["recall_per_ms"], reverse=True)
+        self.results = {
+            "timestamp": datetime.now().isoformat(),
+            "configuration": {
+                "k": self.k,
+                "num_queries": len(eval_set),
+                "fanouts": list(self.fanouts),
+                "weight_grid": list(self.weight_grid),
+                "methods": list(self.methods),
+            },
+            "best": configs[0] if configs else None,
+            "best_recall": max(configs, key=lambda c: c[f"recall_at_{self.k}"]) if configs else None,
+            "configs": configs,
+        }
+        return self.results
+
+    def save(self, output_dir: str) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"fusion_{timestamp}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {output_file}")
+        return output_file
+
+    def print_summary(self, top: int = 10):
+        print("\n" + "=" * 60)
+        print("HYBRID FUSION TUNING")
+        print("=" * 60)
+        for c in self.results["configs"][:top]:
+            print(
+                f"{c['method']:<13} w={c['weights']} raw@{c['raw_limit']:<4} vec@{c['vector_limit']:<4} "
+                f"recall@{self.k}={c[f'recall_at_{self.k}']:.4f}  p50={c['p50_ms']:.1f} ms"
+            )
+        best = self.results["best_recall"]
+        if best:
+            print(f"\nBest recall: {best['method']} w={best['weights']} raw@{best['raw_limit']} "
+                  f"vec@{best['vector_limit']} -> {best[f'recall_at_{self.k}']:.4f}")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+    from retriever import TopKRetriever, BM25Retriever, HybridRetriever
+    from config import VECTOR_SIZE, QDRANT_API_KEY, QDRANT_URL, EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Tune hybrid fusion method / weights / fan-out for recall per ms")
+    parser.add_argument("eval_set", help="JSON list of {'question': str, 'relevant_ids': [...]} ")
+    parser.add_argument("--index-path", required=True, help="BM25 index (json / binary / segments dir)")
+    parser.add_argument("--segmenter-path", default="vncorenlp")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--fanouts", type=int, nargs="+", default=[10, 20, 50, 100])
+    parser.add_argument("--output-dir", default="test/fusionResults")
+    args = parser.parse_args()
+
+    with open(args.eval_set, 'r', encoding='utf-8') as f:
+        eval_set = json.load(f)
+
+    hybrid = HybridRetriever(
+        vector_retriever=TopKRetriever(
+            type='qdrant',
+            embeddingName=EMBEDDING_MODEL_NAME,
+            vector_size=VECTOR_SIZE,
+            qdrant_api=QDRANT_API_KEY,
+            qdrant_url=QDRANT_URL
+        ),
+        raw_retriever=BM25Retriever(
+            type='qdrant',
+            index_path=args.index_path,
+            segmenter_path=args.segmenter_path,
+            qdrant_api=QDRANT_API_KEY,
+            qdrant_url=QDRANT_URL
+        )
+    )
+
+    tuner = FusionTuner(hybrid, k=args.k, fanouts=args.fanouts)
+    tuner.eval(eval_set)
+    tuner.save(args.output_dir)
+    tuner.print_summary()
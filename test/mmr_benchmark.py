@@ -0,0 +1,157 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+from datetime import datetime
+from typing import List, Dict, Any
+import numpy as np
+
+
+# ======================================================
+# LEGACY MMR (double loop, reference implementation)
+# ======================================================
+def legacy_cosine_similarity(vec1, vec2) -> float:
+    vec1 = np.array(vec1)
+    vec2 = np.array(vec2)
+    norm1 = np.linalg.norm(vec1)
+    norm2 = np.linalg.norm(vec2)
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+    return np.dot(vec1, vec2) / (norm1 * norm2)
+
+
+def legacy_similarities(embeddings: np.ndarray) -> np.ndarray:
+    n = embeddings.shape[0]
+    similarities = np.zeros((n, n))
+    for i in range(n):
+        for j in range(n):
+            similarities[i, j] = legacy_cosine_similarity(embeddings[i], embeddings[j])
+    return similarities
+
+
+def legacy_mmr(similarities: np.ndarray, num_to_select: int, lambda_param: float) -> List[int]:
+    most_similar = int(np.argmax(similarities[0, 1:]))
+    selected = [most_similar]
+    candidates = set(range(len(similarities) - 1))
+    candidates.remove(most_similar)
+
+    while len(selected) < num_to_select and candidates:
+        mmr_scores = {}
+        for i in candidates:
+            mmr_scores[i] = (lambda_param * similarities[i + 1, 0] -
+                (1 - lambda_param) * max([similarities[i + 1, j + 1] for j in selected]))
+        next_best = max(mmr_scores, key=mmr_scores.get)
+        selected.append(next_best)
+        candidates.remove(next_best)
+    return selected
+
+
+class MMRBenchmark:
+    """
+    Legacy double-loop MMR vs the vectorized MMRRetriever engine on random
+    candidate sets: similarity matrix + greedy selection latency, and whether
+    both pick the same documents in the same order.
+    """
+
+    def __init__(self, dim: int = 1024, limit: int = 10, lambda_param: float = 0.5, repeats: int = 3, seed: int = 0):
+        from retriever.mmr import MMRRetriever
+
+        # Chỉ dùng phần tính toán MMR, không cần kết nối DB
+        self.engine = MMRRetriever.__new__(MMRRetriever)
+        self.engine.vector_size = dim
+        self.dim = dim
+        self.limit = limit
+        self.lambda_param = lambda_param
+        self.repeats = repeats
+        self.rng = np.random.default_rng(seed)
+        self.results = {}
+
+    def _sample(self, n: int):
+        embeddings = self.rng.standard_normal((n, self.dim)).astype(np.float32)
+        query = self.rng.standard_normal(self.dim).astype(np.float32)
+        scores = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+        return embeddings, scores.astype(np.float64)
+
+    def _time(self, fn) -> float:
+        best = float("inf")
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def _run_legacy(self, embeddings, scores):
+        sim = self.engine._combine_similarity_matrices(legacy_similarities(embeddings), scores)
+        return legacy_mmr(sim, self.limit, self.lambda_param)
+
+    def _run_vectorized(self, embeddings, scores):
+        sim = self.engine._combine_similarity_matrices(self.engine._compute_similarities(embeddings), scores)
+        return self.engine._maximal_marginal_relevance(sim, self.limit, self.lambda_param)
+
+    def eval(self, sizes: List[int]) -> Dict[str, Any]:
+        self.results = {
+            'timestamp': datetime.now().isoformat(),
+            'configuration': {
+                'dim': self.dim,
+                'limit': self.limit,
+                'lambda_param': self.lambda_param,
+                'repeats': self.repeats,
+            },
+            'sizes': {},
+        }
+
+        for n in sizes:
+            print(f"🔵 N = {n}")
+            embeddings, scores = self._sample(n)
+
+            legacy_sel = self._run_legacy(embeddings, scores)
+            vector_sel = self._run_vectorized(embeddings, scores)
+
+            legacy_ms = self._time(lambda: self._run_legacy(embeddings, scores))
+            vector_ms = self._time(lambda: self._run_vectorized(embeddings, scores))
+
+            self.results['sizes'][str(n)] = {
+                'legacy_ms': round(legacy_ms, 3),
+                'vectorized_ms': round(vector_ms, 3),
+                'speedup': round(legacy_ms / vector_ms, 1) if vector_ms else None,
+                'same_selection': legacy_sel == vector_sel,
+            }
+
+        return self.results
+
+    def save(self, output_dir: str) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"mmr_benchmark_{timestamp}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {output_file}")
+        return output_file
+
+    def print_summary(self):
+        print("\n" + "=" * 60)
+        print("MMR: LEGACY LOOPS vs VECTORIZED")
+        print("=" * 60)
+        print(f"{'N':>6} | {'legacy (ms)':>12} | {'vectorized (ms)':>15} | {'speed-up':>8} | same")
+        for n, m in self.results['sizes'].items():
+            print(f"{n:>6} | {m['legacy_ms']:>12} | {m['vectorized_ms']:>15} | {m['speedup']:>7}x | {'✅' if m['same_selection'] else '❌'}")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs vectorized MMR")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--lambda-param", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output-dir", default="test/mmrResults")
+    args = parser.parse_args()
+
+    bench = MMRBenchmark(dim=args.dim, limit=args.limit, lambda_param=args.lambda_param, repeats=args.repeats)
+    bench.eval(args.sizes)
+    bench.save(args.output_dir)
+    bench.print_summary()
@@ -0,0 +1,161 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+import numpy as np
+from tqdm import tqdm
+
+
+class EmbeddingBackendBenchmark:
+    """
+    Compare embedding backends (e.g. ONNX int8) against a reference encoder
+    (FlagBaseEmbedding): vector agreement, retrieval recall@k on the vector
+    collection and CPU latency.
+    """
+
+    def __init__(self, reference, backends: Dict[str, Any], snapshot=None, k: int = 10):
+        """
+        Args:
+            reference: Reference embedder (vectors stored in Qdrant were built with it)
+            backends: name -> embedder to evaluate
+            snapshot: Optional LocalVectorDB of the collection for recall@k
+            k: Cut-off for recall
+        """
+        self.reference = reference
+        self.backends = backends
+        self.snapshot = snapshot
+        self.k = k
+        self.results = {}
+
+    @staticmethod
+    def _normalize(v) -> np.ndarray:
+        v = np.asarray(v, dtype=np.float32)
+        return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+    def _latency(self, embedder, queries: List[str], batch_size: int) -> Dict[str, float]:
+        embedder.encode(queries[:2])        # warm up
+
+        single_ms = []
+        for q in tqdm(queries, desc="single"):
+            start = time.perf_counter()
+            embedder.encode([q])
+            single_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch_size):
+            embedder.encode(queries[i:i + batch_size])
+        batch_s = time.perf_counter() - start
+
+        return {
+            'p50_ms': round(float(np.percentile(single_ms, 50)), 3),
+            'p95_ms': round(float(np.percentile(single_ms, 95)), 3),
+            'batch_texts_per_s': round(len(queries) / batch_s, 2),
+        }
+
+    def _top_k(self, vectors: np.ndarray) -> List[set]:
+        rows, _ = self.snapshot.search_batch(vectors, self.k)
+        return [set(r.tolist()) for r in rows]
+
+    def eval(self, queries: List[str], batch_size: int = 32) -> Dict[str, Any]:
+        print("🔵 Reference encoder")
+        ref = self._normalize(self.reference.encode(queries))
+        ref_top = self._top_k(ref) if self.snapshot is not None else None
+
+        self.results = {
+            'timestamp': datetime.now().isoformat(),
+            'configuration': {
+                'num_queries': len(queries),
+                'k': self.k,
+                'batch_size': batch_size,
+                'snapshot_points': len(self.snapshot) if self.snapshot is not None else None,
+            },
+            'reference': self._latency(self.reference, queries, batch_size),
+            'backends': {},
+        }
+
+        for name, embedder in self.backends.items():
+            print(f"🔵 Backend: {name}")
+            vectors = self._normalize(embedder.encode(queries))
+            cosine = np.sum(vectors * ref, axis=1)
+
+            metrics = {
+                'mean_cosine_to_reference': round(float(cosine.mean()), 6),
+                'min_cosine_to_reference': round(float(cosine.min()), 6),
+            }
+            if ref_top is not None:
+                top = self._top_k(vectors)
+                metrics[f'recall_at_{self.k}'] = round(float(np.mean([
+                    len(a & b) / len(a) for a, b in zip(ref_top, top) if a
+                ])), 4)
+
+            metrics.update(self._latency(embedder, queries, batch_size))
+            metrics['speedup_p50'] = round(self.results['reference']['p50_ms'] / metrics['p50_ms'], 2)
+            self.results['backends'][name] = metrics
+
+        return self.results
+
+    def save(self, output_dir: str) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"embedding_backends_{timestamp}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {output_file}")
+        return output_file
+
+    def print_summary(self):
+        print("\n" + "=" * 60)
+        print("EMBEDDING BACKENDS vs REFERENCE")
+        print("=" * 60)
+        ref = self.results['reference']
+        print(f"Reference:  p50 {ref['p50_ms']} ms | p95 {ref['p95_ms']} ms | {ref['batch_texts_per_s']} texts/s")
+        for name, m in self.results['backends'].items():
+            print(f"\n{name}:")
+            print(f"  Cosine to ref (mean/min): {m['mean_cosine_to_reference']:.4f} / {m['min_cosine_to_reference']:.4f}")
+            if f'recall_at_{self.k}' in m:
+                print(f"  Recall@{self.k} vs ref:       {m[f'recall_at_{self.k}']:.4f}")
+            print(f"  p50 / p95 (ms):           {m['p50_ms']} / {m['p95_ms']}")
+            print(f"  Batch throughput:         {m['batch_texts_per_s']} texts/s")
+            print(f"  Speed-up (p50):           {m['speedup_p50']}x")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+    from embedders import FlagBaseEmbedding, ONNXEmbedding, EmbeddingConfig
+    from database import LocalVectorDB
+    from config import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="ONNX Runtime (int8 / fp32) vs FlagBaseEmbedding on CPU")
+    parser.add_argument("--queries", default="data/router/trainData/train_med.json", help="JSON list of query strings")
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--snapshot", default=None, help="LocalVectorDB snapshot dir for recall@k")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--model-dir", default="models/onnx/bge-m3")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--with-fp32", action="store_true", help="Also evaluate the non-quantized ONNX model")
+    parser.add_argument("--output-dir", default="test/embeddingResults")
+    args = parser.parse_args()
+
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        queries = json.load(f)[:args.num_queries]
+
+    config = EmbeddingConfig(name=EMBEDDING_MODEL_NAME)
+    backends = {
+        'onnx_int8': ONNXEmbedding(config, model_dir=args.model_dir, quantize=True, intra_op_threads=args.threads),
+    }
+    if args.with_fp32:
+        backends['onnx_fp32'] = ONNXEmbedding(config, model_dir=args.model_dir, quantize=False, intra_op_threads=args.threads)
+
+    bench = EmbeddingBackendBenchmark(
+        reference=FlagBaseEmbedding(config, use_fp16=False, device='cpu'),
+        backends=backends,
+        snapshot=LocalVectorDB(args.snapshot) if args.snapshot else None,
+        k=args.k
+    )
+    bench.eval(queries)
+    bench.save(args.output_dir)
+    bench.print_summary()
@@ -316,6 +316,9 @@ if __name__ == "__main__":
     
     print("🚀 Bắt đầu đánh giá...")
     print("="*50)
+
+    # Retrieve contexts cho toàn bộ câu hỏi: 1 lần encode batch + 1 batch query
+    batch_candidates = retriever.search_batch(list(samples['question']), limit=5)
     
     for i, sample in enumerate(samples, 1):
         try:
@@ -323,8 +326,7 @@ if __name__ == "__main__":
             question = sample['question']
             answer = sample['answer']
 
-            # Retrieve contexts
-            candidates = retriever.vector_search(user_query=question, limit=5)
+            candidates = batch_candidates[i - 1]
             retrived_texts = [c.content for c in candidates]
             retrieved_ids = [c.id for c in candidates]
 
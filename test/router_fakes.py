@@ -0,0 +1,22 @@
+"""
+Test doubles shared by the SemanticRouter tests and benchmarks: a
+synthetic embedding that maps 'q<i>' to precomputed vector i (no model
+load) and row-wise L2 normalization.
+"""
+import numpy as np
+
+
+class QueryVectors:
+    """Embedding stand-in: 'q<i>' -> precomputed query vector i."""
+    name = "synthetic"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def encode(self, texts):
+        return self.vectors[[int(t[1:]) for t in texts]]
+
+
+def unit(x: np.ndarray) -> np.ndarray:
+    """Row-wise L2-normalized float32 copy of x."""
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
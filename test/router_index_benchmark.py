@@ -0,0 +1,167 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Any
+import numpy as np
+from router_fakes import QueryVectors, unit
+
+
+class RouterIndexBenchmark:
+    """
+    SemanticRouter latency (FAISS search + route scoring, encode excluded)
+    and route agreement with the exact flat index, for each FAISS index
+    type as the route sample set grows.
+
+    Route samples are synthetic: `topics` gaussian clusters per route on
+    the unit sphere, queries drawn from the same clusters.
+    """
+
+    def __init__(
+        self,
+        index_types: List[str],
+        dim: int = 1024,
+        num_routes: int = 2,
+        topics: int = 50,
+        num_queries: int = 500,
+        top_k: int = 200,
+        index_params: Dict[str, Any] = None,
+        seed: int = 0
+    ):
+        self.index_types = index_types
+        self.dim = dim
+        self.num_routes = num_routes
+        self.topics = topics
+        self.num_queries = num_queries
+        self.top_k = top_k
+        self.index_params = index_params or {}
+        self.rng = np.random.default_rng(seed)
+        self.results = {}
+
+    def _sample(self, centers: np.ndarray, n: int, noise: float = 0.8) -> np.ndarray:
+        x = centers[self.rng.integers(0, len(centers), n)] + noise * self.rng.standard_normal((n, self.dim)) / np.sqrt(self.dim)
+        return unit(x)
+
+    def _make_store(self, store_dir: str, size: int):
+        from senmatic_router.route_store import RouteStore
+
+        centers = self.rng.standard_normal((self.num_routes, self.topics, self.dim)).astype(np.float32)
+        centers /= np.linalg.norm(centers, axis=2, keepdims=True)
+
+        per_route = size // self.num_routes
+        RouteStore(store_dir).save(
+            {f"route_{r}": self._sample(centers[r], per_route) for r in range(self.num_routes)},
+            model=QueryVectors.name
+        )
+        route_of_query = self.rng.integers(0, self.num_routes, self.num_queries)
+        queries = np.stack([self._sample(centers[r], 1)[0] for r in route_of_query])
+        return queries
+
+    def _run(self, router, queries: np.ndarray) -> Dict[str, Any]:
+        latencies = []
+        router.metrics_hook = lambda m: latencies.append(m["faiss_ms"] + m["score_ms"])
+
+        labels = [router.guide(f"q{i}", top_k=self.top_k)[1] for i in range(len(queries))]
+        return {
+            'labels': labels,
+            'p50_ms': round(float(np.percentile(latencies, 50)), 4),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 4),
+        }
+
+    def eval(self, sizes: List[int]) -> Dict[str, Any]:
+        from senmatic_router import SemanticRouter
+
+        self.results = {
+            'timestamp': datetime.now().isoformat(),
+            'configuration': {
+                'dim': self.dim,
+                'num_routes': self.num_routes,
+                'num_queries': self.num_queries,
+                'top_k': self.top_k,
+                'index_params': self.index_params,
+            },
+            'sizes': {},
+        }
+
+        for size in sizes:
+            print(f"🔵 Route samples: {size}")
+            work_dir = tempfile.mkdtemp(prefix="router_bench_")
+            try:
+                store_dir = os.path.join(work_dir, "routes")
+                queries = self._make_store(store_dir, size)
+                embedding = QueryVectors(queries)
+
+                per_index = {}
+                reference = None
+                for index_type in ["flat"] + [t for t in self.index_types if t != "flat"]:
+                    router = SemanticRouter(
+                        embedding=embedding,
+                        save_path=store_dir + ".json",
+                        index_type=index_type,
+                        index_params=self.index_params
+                    )
+                    run = self._run(router, queries)
+                    labels = run.pop('labels')
+                    if reference is None:
+                        reference = labels
+                    run['agreement_with_flat'] = round(float(np.mean([a == b for a, b in zip(labels, reference)])), 4)
+                    # Index thực sự dùng (fallback về flat khi ít vector / agreement thấp)
+                    run['index_used'] = router.index_type
+                    run['build_agreement'] = router.index_agreement
+                    per_index[index_type] = run
+
+                self.results['sizes'][str(size)] = per_index
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return self.results
+
+    def save(self, output_dir: str) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(output_dir, f"router_index_{timestamp}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"💾 Results saved to {output_file}")
+        return output_file
+
+    def print_summary(self):
+        print("\n" + "=" * 60)
+        print("ROUTER LATENCY (search + scoring) BY INDEX TYPE")
+        print("=" * 60)
+        print(f"{'samples':>9} | {'index':>8} | {'used':>8} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | agreement")
+        for size, per_index in self.results['sizes'].items():
+            for index_type, m in per_index.items():
+                print(f"{size:>9} | {index_type:>8} | {m['index_used']:>8} | {m['p50_ms']:>9} | {m['p95_ms']:>9} | {m['agreement_with_flat']:.4f}")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SemanticRouter FAISS index types vs route sample count")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 20000, 200000])
+    parser.add_argument("--index-types", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--num-routes", type=int, default=2)
+    parser.add_argument("--top-k", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=None)     # None = nlist / 8
+    parser.add_argument("--ef-search", type=int, default=256)
+    parser.add_argument("--output-dir", default="test/routerResults/index")
+    args = parser.parse_args()
+
+    bench = RouterIndexBenchmark(
+        index_types=args.index_types,
+        dim=args.dim,
+        num_routes=args.num_routes,
+        num_queries=args.num_queries,
+        top_k=args.top_k,
+        index_params={"nprobe": args.nprobe, "ef_search": args.ef_search}
+    )
+    bench.eval(args.sizes)
+    bench.save(args.output_dir)
+    bench.print_summary()
@@ -1,5 +1,6 @@
 import json
 import csv
+import time
 from typing import List, Tuple, Dict, Any
 from tqdm import tqdm
 import numpy as np
@@ -42,13 +43,19 @@ class RoutingTester:
         try:
             # Assuming router has a predict or route method
             _, pred_labels = zip(*router.batch_guide(queries))
-            for query, pred_label, true_label in zip(queries, pred_labels, true_labels):
-                predictions.append({
+            # Lỗi riêng từng query (router.batch_errors: index -> message)
+            errors = getattr(router, 'batch_errors', {})
+            for i, (query, pred_label, true_label) in enumerate(zip(queries, pred_labels, true_labels)):
+                prediction = {
                     'query': query,
                     'true_label': true_label,
                     'predicted_label': pred_label,
                     'correct': pred_label == true_label
-                })
+                }
+                if i in errors:
+                    prediction['predicted_label'] = None
+                    prediction['error'] = errors[i]
+                predictions.append(prediction)
         except Exception as e:
             error_msg = f"Error processing batch: {str(e)}"
             for query, true_label in zip(queries, true_labels):
@@ -165,9 +172,11 @@ class RoutingTester:
         self.all_predictions = []
         
         # Sequential processing with progress bar
+        start = time.perf_counter()
         for batch in tqdm(batches, desc="Processing batches"):
             batch_predictions = self._process_batch(router, batch)
             self.all_predictions.extend(batch_predictions)
+        elapsed = time.perf_counter() - start
         
         # Compute metrics
         print("\nComputing metrics...")
@@ -182,6 +191,10 @@ class RoutingTester:
             'metrics': metrics,
             'configuration': {
                 'batch_size': batch_size
+            },
+            'timing': {
+                'elapsed_s': round(elapsed, 3),
+                'queries_per_s': round(len(test_data) / elapsed, 2) if elapsed > 0 else None
             }
         }
 
@@ -189,10 +202,74 @@ class RoutingTester:
         
         # Print summary
         self._print_summary(metrics)
+        print(f"Routing throughput: {self.results['timing']['queries_per_s']} queries/s")
         
         return self.results
     
 
+    def eval_prototype_gate(
+        self,
+        router,
+        test_data: List[Tuple[str, str]],
+        margins: List[float] = (0.0, 0.01, 0.02, 0.05, 0.1, 0.2),
+        output_dir: str = "./router_results",
+        batch_size: int = 256
+    ) -> List[Dict[str, Any]]:
+        """
+        Tune the prototype (centroid) gate of a router built with
+        prototypes_per_route > 0: for each margin, the fallback rate (share of
+        queries sent to the full sample search) and the accuracy delta
+        against full search for every query.
+        """
+        queries, true_labels = map(list, zip(*test_data))
+
+        full_labels, proto_labels, proto_margins = [], [], []
+        for i in tqdm(range(0, len(queries), batch_size), desc="Prototype gate"):
+            batch = queries[i:i + batch_size]
+            full_labels.extend(label for _, label in router.batch_guide(batch, use_prototypes=False))
+            for _, label, margin in router.prototype_guide(batch):
+                proto_labels.append(label)
+                proto_margins.append(margin)
+
+        true_labels = np.array(true_labels)
+        full_correct = np.array(full_labels) == true_labels
+        proto_correct = np.array(proto_labels) == true_labels
+        proto_margins = np.array(proto_margins)
+        full_accuracy = float(full_correct.mean())
+
+        gate = []
+        for margin in margins:
+            fallback = proto_margins < margin
+            accuracy = float(np.where(fallback, full_correct, proto_correct).mean())
+            gate.append({
+                'margin': margin,
+                'fallback_rate': round(float(fallback.mean()), 4),
+                'accuracy': round(accuracy, 4),
+                'accuracy_delta': round(accuracy - full_accuracy, 4),
+            })
+
+        self.results['prototype_gate'] = {
+            'prototypes_per_route': router.prototypes_per_route,
+            'full_search_accuracy': round(full_accuracy, 4),
+            'margins': gate,
+        }
+
+        os.makedirs(output_dir, exist_ok=True)
+        output_file = os.path.join(output_dir, f"prototype_gate_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results['prototype_gate'], f, indent=2, ensure_ascii=False)
+        print(f"💾 Prototype gate results saved to {output_file}")
+
+        print("\n" + "="*60)
+        print(f"PROTOTYPE GATE (full search accuracy: {full_accuracy:.4f})")
+        print("="*60)
+        print(f"{'margin':>8} | {'fallback':>8} | {'accuracy':>8} | {'delta':>8}")
+        for g in gate:
+            print(f"{g['margin']:>8} | {g['fallback_rate']:>8.2%} | {g['accuracy']:>8.4f} | {g['accuracy_delta']:>+8.4f}")
+        print("="*60)
+
+        return gate
+
     def _save_results(self, output_dir):
         """
         Lưu kết quả ra JSON, CSV, và JSON riêng cho các mẫu sai.
@@ -312,7 +389,8 @@ if __name__ == "__main__":
     )
     router = SemanticRouter(
         embedding=st,
-        save_path='data/router/routingEmbedddings/visbert_routing_embedding_1000.json'
+        save_path='data/router/routingEmbedddings/visbert_routing_embedding_1000.json',
+        prototypes_per_route=8
     )
     # Run evaluation
     tester = RoutingTester()
@@ -320,5 +398,10 @@ if __name__ == "__main__":
         router=router,
         test_data=test_samples,
         output_dir='test/routerResults/visbert_1000',
-        batch_size=8
+        batch_size=256
+    )
+    tester.eval_prototype_gate(
+        router=router,
+        test_data=test_samples,
+        output_dir='test/routerResults/visbert_1000'
     )
\ No newline at end of file
@@ -0,0 +1,104 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import socket
+import threading
+import numpy as np
+import pytest
+
+embedders = pytest.importorskip("embedders")
+batching = embedders.batching
+
+
+class ToyEmbedding(embedders.cached.BaseEmbedding):
+    """Vector = [len(text), index of first char]; texts containing 'BAD' raise."""
+
+    def __init__(self):
+        super().__init__("toy")
+        self.calls = []
+
+    def encode(self, text):
+        texts = [text] if isinstance(text, str) else list(text)
+        self.calls.append(texts)
+        if any("BAD" in t for t in texts):
+            raise ValueError("cannot encode")
+        return np.array([[len(t), ord(t[0]) if t else 0] for t in texts], dtype=np.float32)
+
+
+def _expected(texts):
+    return np.array([[len(t), ord(t[0]) if t else 0] for t in texts], dtype=np.float32)
+
+
+def _submit_together(encoder, requests):
+    """All requests are queued well inside the batching window -> one batch."""
+    return [encoder.submit(texts) for texts in requests]
+
+
+def test_concurrent_requests_share_a_batch_and_keep_order():
+    base = ToyEmbedding()
+    encoder = batching.MicroBatchEncoder(base, max_wait_ms=200, max_batch=64)
+    requests = [["ccc", "a"], ["bb"], ["dddd", "e", "ff"]]
+
+    futures = _submit_together(encoder, requests)
+    for texts, future in zip(requests, futures):
+        assert np.array_equal(future.result(timeout=5), _expected(texts))
+    assert len(base.calls) == 1
+    assert base.calls[0] == sorted(base.calls[0], key=len)
+
+
+def test_failing_request_does_not_fail_its_batch_mates():
+    base = ToyEmbedding()
+    encoder = batching.MicroBatchEncoder(base, max_wait_ms=200, max_batch=64)
+    requests = [["ok 1"], ["BAD text", "fine"], ["ok 2", "ok 3"]]
+
+    good_1, bad, good_2 = _submit_together(encoder, requests)
+    assert np.array_equal(good_1.result(timeout=5), _expected(requests[0]))
+    assert np.array_equal(good_2.result(timeout=5), _expected(requests[2]))
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+
+
+def _raw_request(port, payload):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        batching._send_msg(sock, payload)
+        header = json.loads(batching._recv_msg(sock))
+        body = batching._recv_msg(sock)
+        # Kết nối vẫn dùng được sau một request hỏng
+        batching._send_msg(sock, json.dumps({"texts": ["xin chào"]}).encode("utf-8"))
+        follow_up = json.loads(batching._recv_msg(sock))
+        batching._recv_msg(sock)
+    return header, body, follow_up
+
+
+@pytest.fixture
+def server():
+    encoder = batching.MicroBatchEncoder(ToyEmbedding(), max_wait_ms=1)
+    srv = batching.EmbeddingServer(encoder, port=0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_remote_embedding_round_trip(server):
+    remote = batching.RemoteEmbedding("toy", port=server.server_address[1])
+    texts = ["sốt", "đau đầu"]
+    assert np.array_equal(remote.encode(texts), _expected(texts))
+    with pytest.raises(RuntimeError, match="cannot encode"):
+        remote.encode("BAD")
+
+
+@pytest.mark.parametrize("payload", [b"not json", b'{"query": 1}', b'{"texts": "abc"}', b"[1, 2]", b"\xff\xfe"])
+def test_malformed_requests_get_an_error_reply(server, payload):
+    header, body, follow_up = _raw_request(server.server_address[1], payload)
+    assert header["error"].startswith("Malformed request")
+    assert body == b""
+    assert follow_up == {"shape": [1, 2], "error": None}
+
+
+def test_oversized_frame_closes_the_connection(server):
+    with socket.create_connection(("127.0.0.1", server.server_address[1]), timeout=5) as sock:
+        sock.sendall(batching._LEN.pack(batching.MAX_MESSAGE_BYTES + 1))
+        assert sock.recv(1) == b""
@@ -0,0 +1,263 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import math
+import random
+import tempfile
+from collections import defaultdict
+from data_generator.utils import CSRIndex, SegmentedBM25Index, is_binary_index, wand_top_k
+
+
+def _make_dict_index(num_docs=200, vocab_size=50, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"t{i}" for i in range(vocab_size)]
+    doc_ids = rng.sample(range(10, 10 * num_docs), num_docs)
+
+    doc_len, postings = {}, defaultdict(dict)
+    for doc_id in doc_ids:
+        tokens = [rng.choice(vocab[: rng.randint(5, vocab_size)]) for _ in range(rng.randint(1, 40))]
+        doc_len[doc_id] = len(tokens)
+        for t in tokens:
+            postings[t][doc_id] = postings[t].get(doc_id, 0) + 1
+
+    N = len(doc_len)
+    idf = {
+        t: math.log((N - len(d) + 0.5) / (len(d) + 0.5) + 1)
+        for t, d in postings.items()
+    }
+    return dict(postings), doc_len, idf, N, sum(doc_len.values()) / N
+
+
+def test_csr_roundtrip_matches_dict():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+
+    assert len(index) == len(postings)
+    assert index.to_dict() == postings
+
+    for term, docs in postings.items():
+        for doc_id, tf in docs.items():
+            assert index.tf(term, index.to_internal(doc_id)) == tf
+
+
+def test_csr_candidates_match_dict():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+
+    query = ["t1", "t7", "t7", "unknown"]
+    expected = set()
+    for t in query:
+        expected.update(postings.get(t, {}).keys())
+
+    got = index.doc_keys[index.candidates(query)].tolist()
+    assert sorted(expected) == got
+
+
+def _legacy_score(postings, doc_len, idf, avg, query_terms, doc_id, k1=1.5, b=0.75):
+    score = 0.0
+    dl = doc_len.get(doc_id, 0)
+    for term in query_terms:
+        if term not in postings or doc_id not in postings[term]:
+            continue
+        tf = postings[term][doc_id]
+        denom = tf + k1 * (1 - b + b * dl / avg)
+        score += idf.get(term, 0.0) * (tf * (k1 + 1)) / denom
+    return score
+
+
+def test_taat_scores_identical_to_legacy():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+
+    query = ["t3", "t1", "t3", "t20", "unknown"]
+    acc = index.score(query)
+    for internal_id, doc_id in enumerate(index.doc_keys.tolist()):
+        assert acc[internal_id] == _legacy_score(postings, doc_len, idf, avg, query, doc_id)
+
+    top_ids, top_scores = index.top_k(query, 5)
+    expected = sorted(
+        (_legacy_score(postings, doc_len, idf, avg, query, d) for d in doc_len),
+        reverse=True
+    )[:5]
+    assert top_scores.tolist() == expected
+
+
+def test_score_batch_matches_single_queries():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+
+    queries = [["t3", "t1", "t3"], [], ["unknown"], ["t1", "t20", "t4"], ["t3"]]
+    acc = index.score_batch(queries)
+    for row, query in zip(acc, queries):
+        assert (row == index.score(query)).all()
+
+    for (ids, scores), query in zip(index.top_k_batch(queries, 5, block_size=2), queries):
+        exp_ids, exp_scores = index.top_k(query, 5)
+        assert ids.tolist() == exp_ids.tolist()
+        assert scores.tolist() == exp_scores.tolist()
+
+
+def test_binary_roundtrip_mmap():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+    index.build_bounds()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25.bin")
+        index.save_binary(path)
+        assert is_binary_index(path)
+
+        loaded = CSRIndex.open_binary(path, mmap=True)
+        assert loaded.to_dict() == postings
+        assert loaded.has_bounds
+        assert (loaded.block_max == index.block_max).all()
+        assert (loaded.score(["t2", "t9"]) == index.score(["t2", "t9"])).all()
+        del loaded
+
+
+def test_wand_matches_exhaustive_top_k():
+    postings, doc_len, idf, N, avg = _make_dict_index(num_docs=500, vocab_size=80, seed=3)
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+    index.build_bounds(block_size=8)
+
+    rng = random.Random(7)
+    skipped = 0
+    for _ in range(50):
+        query = [f"t{rng.randint(0, 90)}" for _ in range(rng.randint(1, 10))]
+        for k in (1, 5, 20):
+            exp_ids, expected = index.top_k(query, k)
+            stats = {}
+            ids, got = wand_top_k(index, query, k, stats=stats)
+            assert got.tolist() == expected.tolist()
+            assert set(index.score(query)[ids].tolist()) == set(got.tolist())
+            assert stats["postings_scored"] + stats["postings_skipped"] == stats["postings_total"]
+            skipped += stats["postings_skipped"]
+    assert skipped > 0
+
+
+def test_wand_requires_bounds():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+
+    try:
+        wand_top_k(index, ["t1"], 5)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("wand_top_k must not build bounds on the query path")
+    assert not index.has_bounds
+
+
+def test_impacts_roundtrip_and_ranking():
+    postings, doc_len, idf, N, avg = _make_dict_index()
+    index = CSRIndex.from_dict(postings, doc_len, idf, N, avg)
+    index.build_impacts(bits=16)
+
+    query = ["t2", "t11", "t30"]
+    exact_ids, exact_scores = index.top_k(query, 5)
+    approx_ids, approx_scores = index.top_k_impacts(query, 5)
+    assert set(exact_ids.tolist()) == set(approx_ids.tolist())
+    assert abs(approx_scores - exact_scores).max() < 1e-3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bm25.bin")
+        index.save_binary(path)
+        loaded = CSRIndex.open_binary(path)
+        assert loaded.impact_scale == index.impact_scale
+        assert (loaded.score_impacts(query) == index.score_impacts(query)).all()
+        del loaded
+
+
+def _index_from_tokens(docs):
+    postings, doc_len = defaultdict(dict), {}
+    for doc_id, tokens in docs.items():
+        doc_len[doc_id] = len(tokens)
+        for t in tokens:
+            postings[t][doc_id] = postings[t].get(doc_id, 0) + 1
+    N = len(doc_len)
+    idf = {t: math.log((N - len(d) + 0.5) / (len(d) + 0.5) + 1) for t, d in postings.items()}
+    return CSRIndex.from_dict(dict(postings), doc_len, idf, N, sum(doc_len.values()) / N)
+
+
+def test_segments_match_monolithic_after_delete_and_replace():
+    rng = random.Random(11)
+    docs = {d: [f"t{rng.randint(0, 30)}" for _ in range(rng.randint(1, 25))] for d in range(120)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        segments = SegmentedBM25Index(tmp, merge_factor=3, background_merge=False)
+        items = list(docs.items())
+        for i in range(0, len(items), 10):
+            segments.add_documents(items[i:i + 10])
+
+        segments.delete([3, 50])
+        replaced = {7: ["t1", "t1", "t2"]}
+        segments.add_documents(replaced.items())
+
+        live = {d: t for d, t in docs.items() if d not in (3, 50)}
+        live.update(replaced)
+        mono = _index_from_tokens(live)
+
+        query = ["t1", "t2", "t1", "t17"]
+        ids, scores = segments.top_k(query, 8)
+        mono_ids, mono_scores = mono.top_k(query, 8)
+        assert scores.tolist() == mono_scores.tolist()
+        assert ids.tolist() == mono.doc_keys[mono_ids].tolist()
+
+        reopened = SegmentedBM25Index(tmp)
+        assert reopened.N == len(live)
+        assert reopened.top_k(query, 8)[1].tolist() == mono_scores.tolist()
+
+
+def test_segment_tiers_use_integer_log():
+    with tempfile.TemporaryDirectory() as tmp:
+        segments = SegmentedBM25Index(tmp, merge_factor=10, background_merge=False)
+        assert [segments._tier(n) for n in (1, 9, 10, 999, 1000, 10 ** 6)] == [0, 0, 1, 2, 3, 6]
+
+
+def test_segment_delete_expunges_and_drops():
+    docs = {d: ["t1", f"t{d}"] for d in range(10)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        segments = SegmentedBM25Index(tmp, expunge_ratio=0.3, background_merge=False)
+        segments.add_documents(docs.items())
+        name = segments.segments[0].name
+
+        segments.delete([0, 1, 2, 3])
+        assert [s.name for s in segments.segments] != [name]
+        assert segments.segments[0].deleted_ratio == 0.0
+        assert segments.N == 6
+
+        segments.delete(range(4, 10))
+        assert segments.segments == []
+        assert SegmentedBM25Index(tmp).N == 0
+
+
+def test_segment_global_stats_follow_snapshot_masks():
+    docs = {d: ["t1"] * (d + 1) for d in range(10)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        segments = SegmentedBM25Index(tmp, expunge_ratio=1.0, background_merge=False)
+        segments.add_documents(docs.items())
+        snapshot = [(s, s.deleted) for s in segments.segments]
+
+        segments.delete([9])
+        N, avg_doc_len, idf = segments.global_stats(snapshot, ["t1"])
+        assert N == 10
+        assert avg_doc_len == sum(len(t) for t in docs.values()) / 10
+        assert segments.global_stats([(s, s.deleted) for s in segments.segments], ["t1"])[0] == 9
+
+
+if __name__ == '__main__':
+    test_csr_roundtrip_matches_dict()
+    test_csr_candidates_match_dict()
+    test_taat_scores_identical_to_legacy()
+    test_score_batch_matches_single_queries()
+    test_binary_roundtrip_mmap()
+    test_wand_matches_exhaustive_top_k()
+    test_wand_requires_bounds()
+    test_impacts_roundtrip_and_ranking()
+    test_segments_match_monolithic_after_delete_and_replace()
+    test_segment_tiers_use_integer_log()
+    test_segment_delete_expunges_and_drops()
+    test_segment_global_stats_follow_snapshot_masks()
+    print('BM25 CSR tests passed')
@@ -0,0 +1,39 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import pytest
+
+generator = pytest.importorskip("data_generator.BM25Generator")
+
+
+def _write_chunks(path, num_docs=23):
+    words = ["sốt", "ho", "đau_đầu", "covid", "tiêm", "vắc_xin", "khám", "bệnh_viện"]
+    chunks = [
+        {"id": 100 + i, "content": " ".join(words[(i * j) % len(words)] for j in range(1, 3 + i % 5))}
+        for i in range(num_docs)
+    ]
+    chunks.append(dict(chunks[0]))      # id trùng -> bị bỏ qua
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chunks, f, ensure_ascii=False)
+
+
+def _state(index):
+    return index.N, index.avg_doc_len, index.doc_len, index.postings, index.idf
+
+
+@pytest.mark.parametrize("num_workers", [1, 3])
+def test_build_parallel_matches_build_from_json(tmp_path, monkeypatch, num_workers):
+    json_path = str(tmp_path / "chunks.json")
+    _write_chunks(json_path)
+
+    # Không khởi động VnCoreNLP: tách từ theo khoảng trắng
+    monkeypatch.setattr(generator, "tokenize_document", str.split)
+
+    sequential = generator.BM25Index()
+    sequential.build_from_json(json_path)
+
+    parallel = generator.BM25Index()
+    parallel.build_parallel(json_path, num_workers=num_workers, shard_size=4, tokenizer=str.split)
+
+    assert _state(parallel) == _state(sequential)
@@ -0,0 +1,53 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pytest
+
+bm25 = pytest.importorskip("retriever.bm25")
+from bm25_fakes import CountingSegmenter, SplitTokenizer, make_retriever, write_json_index
+
+# Trùng lặp (kể cả khác hoa/thường), query không có hit, query rỗng
+QUERIES = ["sốt cao", "đau đầu về đêm", "sốt cao", "ho", "kháng sinh", "Đau Đầu về đêm", "sốt", ""]
+
+
+@pytest.fixture
+def retriever(tmp_path, monkeypatch, request):
+    monkeypatch.setattr(bm25, "phobert_tokenizer", SplitTokenizer())
+    return make_retriever(bm25, write_json_index(str(tmp_path / "bm25.json")), backend=request.param, segmenter=CountingSegmenter())
+
+
+def _rows(results):
+    return [[(c.id, c.category, c.content) for c in hits] for hits in results]
+
+
+def _scores(results):
+    return [[c.score for c in hits] for hits in results]
+
+
+@pytest.mark.parametrize("retriever", ["csr", "dict"], indirect=True)
+@pytest.mark.parametrize("limit", [1, 3, 20])
+@pytest.mark.parametrize("with_content", [True, False])
+def test_search_batch_matches_search(retriever, limit, with_content):
+    batch = retriever.search_batch(QUERIES, limit=limit, with_content=with_content)
+    single = [retriever.search(q, limit=limit, with_content=with_content) for q in QUERIES]
+
+    assert len(batch) == len(QUERIES)
+    assert _rows(batch) == _rows(single)
+    for got, expected in zip(_scores(batch), _scores(single)):
+        assert got == pytest.approx(expected, rel=1e-6)
+
+    assert batch[0] and _rows(batch)[0] == _rows(batch)[2]
+    assert batch[4] == [] and batch[7] == []
+    if with_content:
+        assert all(c.content is not None for hits in batch for c in hits)
+    else:
+        assert all(c.content is None for hits in batch for c in hits)
+
+
+@pytest.mark.parametrize("retriever", ["csr", "dict"], indirect=True)
+def test_search_batch_fetches_content_in_one_round_trip(retriever):
+    retriever.search_batch(QUERIES, limit=3)
+    assert retriever.collection.finds == 1
+
+    retriever.search_batch(["kháng sinh", ""], limit=3)      # không có hit -> không gọi DB
+    assert retriever.collection.finds == 1
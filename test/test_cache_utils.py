@@ -0,0 +1,80 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+import pytest
+from utils.cache_utils import LRUCache
+
+
+def test_lru_eviction_order():
+    cache = LRUCache(maxsize=3)
+    for key in "abc":
+        cache.put(key, key.upper())
+
+    assert cache.get("a") == "A"        # a thành mới nhất -> b bị đẩy ra trước
+    cache.put("d", "D")
+    cache.put("e", "E")
+
+    assert [k for k, _ in cache.items()] == ["a", "d", "e"]
+    assert "b" not in cache and "c" not in cache
+    assert cache.stats()["evictions"] == 2
+
+    cache.put("a", "A2")                # ghi đè: không evict, chuyển về cuối
+    assert [k for k, _ in cache.items()] == ["d", "e", "a"]
+    assert cache.get("a") == "A2" and len(cache) == 3
+
+
+def test_ttl_expiry_is_seen_by_contains_len_and_stats():
+    cache = LRUCache(maxsize=10, ttl=0.01)
+    cache.put("a", 1)
+    assert "a" in cache and len(cache) == 1
+
+    time.sleep(0.03)
+    assert "a" not in cache
+    assert len(cache) == 0
+    assert cache.stats()["size"] == 0
+    assert cache.items() == []
+
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["expirations"], stats["misses"], stats["hits"]) == (1, 1, 0)
+
+
+def test_counters_and_disabled_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+    assert cache.get("missing", "default") == "default"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 2, 0.5)
+    assert (stats["size"], stats["maxsize"]) == (1, 2)
+
+    disabled = LRUCache(maxsize=0)
+    disabled.put("a", 1)
+    assert len(disabled) == 0 and disabled.get("a") is None
+
+
+def test_bm25_search_batch_reuses_cached_tokens(tmp_path, monkeypatch):
+    bm25 = pytest.importorskip("retriever.bm25")
+    from bm25_fakes import CountingSegmenter, SplitTokenizer, make_retriever, write_json_index
+
+    monkeypatch.setattr(bm25, "phobert_tokenizer", SplitTokenizer())
+    segmenter = CountingSegmenter()
+    retriever = make_retriever(bm25, write_json_index(str(tmp_path / "bm25.json")), segmenter=segmenter)
+    queries = ["Sốt cao", "đau đầu", "sốt cao", "ho"]
+
+    first = retriever.search_batch(queries, with_content=False)
+    # Các miss được tách từ trong MỘT lần gọi, query trùng chỉ một lần
+    assert segmenter.calls == 1 and segmenter.texts == ["sốt cao", "đau đầu", "ho"]
+
+    second = retriever.search_batch(queries, with_content=False)
+    assert segmenter.calls == 1
+    assert second == first
+
+    retriever.search("đau đầu", with_content=False)
+    assert segmenter.calls == 1
+    stats = retriever.cache_stats()
+    assert (stats["misses"], stats["hits"], stats["size"]) == (4, 5, 3)
@@ -0,0 +1,211 @@
+import os
+import sys
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+import importlib
+import json
+import types
+import numpy as np
+import pytest
+
+
+def _load_db_local():
+    """
+    database/__init__ also imports db_qdrant (qdrant_client). When that is
+    not installed, import db_local on its own, bypassing the package
+    __init__, and restore sys.modules afterwards.
+    """
+    try:
+        from database import db_local
+        return db_local
+    except ImportError:
+        pass
+
+    saved = {name: mod for name, mod in sys.modules.items() if name == "database" or name.startswith("database.")}
+    package = types.ModuleType("database")
+    package.__path__ = [os.path.join(ROOT, "database")]
+    sys.modules["database"] = package
+    try:
+        return importlib.import_module("database.db_local")
+    finally:
+        for name in [n for n in sys.modules if n == "database" or n.startswith("database.")]:
+            del sys.modules[name]
+        sys.modules.update(saved)
+
+
+db_local = _load_db_local()
+BACKENDS = [pytest.param(True, id="faiss"), pytest.param(False, id="numpy")]
+
+
+def _points(ids, dim=16, seed=0, tag="v1"):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": i, "embedding": rng.standard_normal(dim).tolist(), "category": "c", "content": f"{tag} doc {i}"}
+        for i in ids
+    ]
+
+
+def _db(path, use_faiss, **kwargs):
+    if use_faiss and db_local.faiss is None:
+        pytest.skip("faiss not installed")
+    db = db_local.LocalVectorDB(str(path), use_faiss=use_faiss, **kwargs)
+    assert (db.index is not None) == use_faiss or len(db) == 0
+    return db
+
+
+@pytest.mark.parametrize("use_faiss", BACKENDS)
+def test_upsert_search_retrieve(tmp_path, use_faiss):
+    db = _db(tmp_path / "snap", use_faiss)
+    points = _points(range(40))
+    db.upsert_points(points)
+
+    assert len(db) == 40
+    assert (db.index is not None) == use_faiss
+
+    queries = np.array([p["embedding"] for p in points[:5]], dtype=np.float32)
+    rows, scores = db.search_batch(queries, limit=3)
+    assert [int(db.ids[r[0]]) for r in rows] == [0, 1, 2, 3, 4]
+    assert np.allclose([s[0] for s in scores], 1.0, atol=1e-5)
+    assert all((np.diff(s) <= 1e-6).all() for s in scores)
+
+    hits = db.search(points[7]["embedding"], limit=2)
+    assert hits[0]["id"] == 7 and hits[0]["payload"]["content"] == "v1 doc 7"
+
+    assert db.retrieve([3, 999, 5]) == [(3, db.payloads[db.id_to_row[3]]), (5, db.payloads[db.id_to_row[5]])]
+
+
+@pytest.mark.parametrize("use_faiss", BACKENDS)
+def test_upsert_replaces_existing_ids(tmp_path, use_faiss):
+    db = _db(tmp_path / "snap", use_faiss)
+    db.upsert_points(_points(range(10)))
+
+    replacement = _points([3, 10], seed=1, tag="v2")
+    db.upsert_points(replacement)
+
+    assert len(db) == 11
+    assert sorted(db.ids.tolist()) == list(range(11))
+    assert db.retrieve([3])[0][1]["content"] == "v2 doc 3"
+    assert db.search(replacement[0]["embedding"], limit=1)[0]["id"] == 3
+
+
+@pytest.mark.parametrize("use_faiss", BACKENDS)
+def test_save_and_reopen(tmp_path, use_faiss):
+    path = tmp_path / "snap"
+    db = _db(path, use_faiss)
+    db.upsert_points(_points(range(20)))
+    db.upsert_points(_points(range(15, 25), seed=2, tag="v2"))
+
+    reopened = _db(path, use_faiss)
+    assert reopened.ids.tolist() == db.ids.tolist()
+    assert reopened.payloads == db.payloads
+
+    queries = np.random.default_rng(3).standard_normal((4, 16)).astype(np.float32)
+    rows, scores = reopened.search_batch(queries, limit=5)
+    exp_rows, exp_scores = db.search_batch(queries, limit=5)
+    assert [r.tolist() for r in rows] == [r.tolist() for r in exp_rows]
+    assert np.allclose(scores, exp_scores, atol=1e-6)
+
+    # Chỉ còn thế hệ dữ liệu hiện tại
+    assert sorted(n for n in os.listdir(path) if n.startswith(db_local.DATA_PREFIX)) == [reopened._generations()[-1]]
+
+
+def test_interrupted_save_keeps_previous_snapshot(tmp_path):
+    path = tmp_path / "snap"
+    db = db_local.LocalVectorDB(str(path), use_faiss=False)
+    db.upsert_points(_points(range(5)))
+
+    # save() bị ngắt trước khi manifest được thay: thư mục dữ liệu dở dang
+    os.makedirs(path / "data_000099")
+    (path / "data_000099" / db_local.VECTORS_FILE).write_bytes(b"partial")
+
+    reopened = db_local.LocalVectorDB(str(path), use_faiss=False)
+    assert reopened.ids.tolist() == list(range(5))
+
+    reopened.upsert_points(_points([5]))
+    assert reopened._generations() == ["data_000100"]
+    assert len(db_local.LocalVectorDB(str(path), use_faiss=False)) == 6
+
+
+def test_version_1_flat_snapshot_is_read_and_migrated(tmp_path):
+    path = tmp_path / "snap"
+    os.makedirs(path)
+    vectors = db_local._normalize(np.eye(3, 4, dtype=np.float32))
+    np.save(path / db_local.VECTORS_FILE, vectors)
+    np.save(path / db_local.IDS_FILE, np.array([1, 2, 3], dtype=np.int64))
+    with open(path / db_local.PAYLOADS_FILE, "w", encoding="utf-8") as f:
+        for i in (1, 2, 3):
+            f.write(json.dumps({"content": f"doc {i}"}) + "\n")
+    with open(path / db_local.MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "dim": 4, "count": 3, "distance": "cosine"}, f)
+
+    db = db_local.LocalVectorDB(str(path), use_faiss=False)
+    assert db.retrieve([2]) == [(2, {"content": "doc 2"})]
+
+    db.upsert_points([{"id": 4, "embedding": [0, 0, 0, 1], "content": "doc 4"}])
+    assert not os.path.exists(path / db_local.VECTORS_FILE)
+    assert db_local.LocalVectorDB(str(path), use_faiss=False).ids.tolist() == [1, 2, 3, 4]
+
+
+def test_large_mmap_snapshot_skips_faiss_copy(tmp_path):
+    if db_local.faiss is None:
+        pytest.skip("faiss not installed")
+    path = tmp_path / "snap"
+    db_local.LocalVectorDB(str(path), use_faiss=True).upsert_points(_points(range(10)))
+
+    assert db_local.LocalVectorDB(str(path), mmap=True, faiss_max_bytes=0).index is None
+    assert db_local.LocalVectorDB(str(path), mmap=False, faiss_max_bytes=0).index is not None
+
+
+class FakeQdrant:
+    """Qdrant client stand-in: count / scroll (pages of `page` points) / get_collection."""
+
+    def __init__(self, points, dim, page=3):
+        self.points = points
+        self.dim = dim
+        self.page = page
+
+    def count(self, collection_name, exact):
+        return types.SimpleNamespace(count=len(self.points))
+
+    def scroll(self, collection_name, limit, offset, with_payload, with_vectors):
+        start = offset or 0
+        end = start + min(limit, self.page)
+        batch = [
+            types.SimpleNamespace(id=p["id"], vector=p["embedding"], payload={"content": p["content"]})
+            for p in self.points[start:end]
+        ]
+        return batch, (end if end < len(self.points) else None)
+
+    def get_collection(self, collection_name):
+        vectors = types.SimpleNamespace(size=self.dim) if self.dim is not None else {"dense": None}
+        return types.SimpleNamespace(config=types.SimpleNamespace(params=types.SimpleNamespace(vectors=vectors)))
+
+
+def test_from_qdrant_exports_all_pages(tmp_path):
+    points = _points(range(7))
+    db = db_local.LocalVectorDB.from_qdrant(FakeQdrant(points, dim=16), "c", str(tmp_path / "snap"), use_faiss=False)
+
+    assert db.ids.tolist() == list(range(7)) and db.dim == 16
+    assert db.search(points[4]["embedding"], limit=1)[0]["id"] == 4
+    assert len(db_local.LocalVectorDB(str(tmp_path / "snap"), use_faiss=False)) == 7
+
+
+@pytest.mark.parametrize("use_faiss", BACKENDS)
+def test_from_qdrant_empty_collection(tmp_path, use_faiss):
+    if use_faiss and db_local.faiss is None:
+        pytest.skip("faiss not installed")
+    path = str(tmp_path / "snap")
+    db = db_local.LocalVectorDB.from_qdrant(FakeQdrant([], dim=16), "c", path, use_faiss=use_faiss)
+
+    assert len(db) == 0 and db.dim == 16
+    assert db.search([1.0] * 16, limit=3) == []
+
+    reopened = db_local.LocalVectorDB(path, use_faiss=use_faiss)
+    assert reopened.vectors.shape == (0, 16)
+    reopened.upsert_points(_points([1]))
+    assert len(reopened) == 1
+
+
+def test_from_qdrant_empty_collection_without_vector_size(tmp_path):
+    with pytest.raises(ValueError, match="empty"):
+        db_local.LocalVectorDB.from_qdrant(FakeQdrant([], dim=None), "c", str(tmp_path / "snap"))
@@ -0,0 +1,73 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+
+embedders = pytest.importorskip("embedders")
+
+
+class CountingEmbedding(embedders.cached.BaseEmbedding):
+    """Deterministic stand-in: vector depends on text and a per-variant offset."""
+
+    def __init__(self, name="m", offset=0.0):
+        super().__init__(name)
+        self.offset = offset
+        self.texts = []
+
+    def encode(self, text):
+        texts = [text] if isinstance(text, str) else list(text)
+        self.texts.extend(texts)
+        return np.array([[len(t), sum(map(ord, t)) % 97, self.offset] for t in texts], dtype=np.float32)
+
+
+def _shared(precision, offset):
+    return embedders.get_encoder("cache-test-model", precision=precision, loader=lambda *_: CountingEmbedding("cache-test-model", offset))
+
+
+def test_variant_comes_from_registry_key_through_wrappers():
+    shared = _shared("int8", 1.0)
+    assert embedders.CachedEmbedding(shared).variant == "cpu:int8"
+
+    batcher = embedders.MicroBatchEncoder(shared, max_wait_ms=0)
+    assert embedders.CachedEmbedding(batcher).variant == "cpu:int8"
+    assert embedders.CachedEmbedding(CountingEmbedding(), variant="remote:fp16").variant == "remote:fp16"
+
+
+def test_cache_hits_and_variant_isolated_keys():
+    base = CountingEmbedding()
+    cache = embedders.CachedEmbedding(base, variant="cpu:fp32")
+
+    first = cache.encode(["a", "bb", "a"])
+    second = cache.encode("bb")
+    assert base.texts == ["a", "bb"]
+    assert np.array_equal(second[0], first[1])
+
+    other = embedders.CachedEmbedding(base, variant="cpu:int8")
+    assert other._key("a") != cache._key("a")
+
+
+def test_persisted_cache_only_reloads_for_same_variant(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    fp32 = embedders.CachedEmbedding(CountingEmbedding(offset=0.0), variant="cpu:fp32")
+    fp32.encode(["đau đầu", "sốt"])
+    fp32.save(path)
+
+    same = embedders.CachedEmbedding(CountingEmbedding(), variant="cpu:fp32")
+    same.load(path)
+    assert len(same.cache) == 2
+
+    int8_base = CountingEmbedding(offset=1.0)
+    int8 = embedders.CachedEmbedding(int8_base, variant="cpu:int8")
+    int8.load(path)
+    assert len(int8.cache) == 0
+    assert int8.encode("sốt")[0, 2] == 1.0 and int8_base.texts == ["sốt"]
+
+
+def test_legacy_cache_without_variant_is_skipped(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    np.savez(path, model=np.array("m"), keys=np.array(["k"]), vectors=np.zeros((1, 3), dtype=np.float32))
+
+    cache = embedders.CachedEmbedding(CountingEmbedding(), variant="cpu:fp32")
+    cache.load(path)
+    assert len(cache.cache) == 0
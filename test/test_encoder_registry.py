@@ -0,0 +1,97 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import types
+import time
+import numpy as np
+import pytest
+
+embedders = pytest.importorskip("embedders")
+registry = embedders.registry
+
+
+class FixedModel(embedders.cached.BaseEmbedding):
+    def __init__(self, name):
+        super().__init__(name)
+
+    def encode(self, text):
+        texts = [text] if isinstance(text, str) else list(text)
+        return np.full((len(texts), 2), len(self.name), dtype=np.float32)
+
+
+class CountingLoader:
+    """Loader that counts builds and is slow enough to expose load races."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, device, precision):
+        self.calls.append((name, device, precision))
+        time.sleep(0.05)
+        return FixedModel(name)
+
+
+def test_same_key_shares_one_lazily_loaded_model():
+    loader = CountingLoader()
+    first = embedders.get_encoder("reg-shared", device="cuda", precision="int8", loader=loader)
+    second = embedders.get_encoder("reg-shared", device=None, precision="int8", loader=loader)
+
+    # int8 = ONNX trên CPU -> mọi device dùng chung một key
+    assert first is second
+    assert first.key == ("reg-shared", "cpu", "int8")
+    assert loader.calls == [] and not first.loaded
+    assert embedders.registered_encoders()[first.key] is False
+
+    threads = [threading.Thread(target=first.encode, args=(["x"],)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert loader.calls == [("reg-shared", "cpu", "int8")]
+    assert embedders.registered_encoders()[first.key] is True
+
+
+def test_device_spellings_and_cpu_fp16_resolve_to_one_key(monkeypatch):
+    monkeypatch.setattr(registry, "_resolve_device", lambda device: "cpu")
+    loader = CountingLoader()
+
+    fp32 = embedders.get_encoder("reg-device", device="auto", precision="fp32", loader=loader)
+    fp16 = embedders.get_encoder("reg-device", device="mps", precision="fp16", loader=loader)
+    assert fp16 is fp32 and fp32.key == ("reg-device", "cpu", "fp32")
+
+    monkeypatch.setattr(registry, "_resolve_device", lambda device: "cuda")
+    gpu = embedders.get_encoder("reg-device", device="cuda", precision="fp16", loader=loader)
+    assert gpu is not fp32 and gpu.key == ("reg-device", "cuda", "fp16")
+
+
+def test_different_models_get_different_encoders():
+    loader = CountingLoader()
+    a = embedders.get_encoder("reg-a", precision="int8", loader=loader)
+    b = embedders.get_encoder("reg-b", precision="int8", loader=loader)
+
+    assert a is not b
+    assert a.encode("q")[0, 0] == 5 and b.encode(["q", "r"]).shape == (2, 2)
+    assert [name for name, _, _ in loader.calls] == ["reg-a", "reg-b"]
+
+
+def _fake_torch(cuda, mps):
+    return types.SimpleNamespace(
+        cuda=types.SimpleNamespace(is_available=lambda: cuda),
+        backends=types.SimpleNamespace(mps=types.SimpleNamespace(is_available=lambda: mps)),
+    )
+
+
+@pytest.mark.parametrize("cuda, expected", [(True, "cuda"), (False, "cpu")])
+def test_unavailable_mps_shares_the_auto_key_on_non_mac_hosts(monkeypatch, cuda, expected):
+    monkeypatch.setitem(sys.modules, "torch", _fake_torch(cuda=cuda, mps=False))
+    loader = CountingLoader()
+    name = f"reg-host-{expected}"
+
+    auto = embedders.get_encoder(name, loader=loader)
+    mps = embedders.get_encoder(name, device="mps", loader=loader)
+    cuda_or_auto = embedders.get_encoder(name, device="cuda", loader=loader)
+
+    assert auto is mps is cuda_or_auto
+    assert auto.key == (name, expected, "fp32")
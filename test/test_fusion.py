@@ -0,0 +1,80 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+
+fusion = pytest.importorskip("retriever.fusion")
+Candidate = fusion.Candidate
+
+
+def _leg(pairs):
+    return [Candidate(id=i, category=None, content=f"doc {i}", score=s) for i, s in pairs]
+
+
+# Leg A: 3 docs, leg B: doc 3 (chung) + doc 4
+LEG_A = _leg([(1, 3.0), (2, 2.0), (3, 1.0)])
+LEG_B = _leg([(3, 0.9), (4, 0.5)])
+
+STD_A = np.sqrt(2 / 3)      # scores 3, 2, 1
+Z_A = {1: 1 / STD_A, 2: 0.0, 3: -1 / STD_A}
+Z_B = {3: 1.0, 4: -1.0}     # scores 0.9, 0.5 -> mean 0.7, std 0.2
+DBSF_A = {d: (s - (2 - 3 * STD_A)) / (6 * STD_A) for d, s in [(1, 3.0), (2, 2.0), (3, 1.0)]}
+DBSF_B = {3: 0.8 / 1.2, 4: 0.4 / 1.2}
+
+EXPECTED = {
+    "rrf": {1: 1 / 61, 2: 1 / 62, 3: 1 / 63 + 1 / 61, 4: 1 / 62},
+    "minmax": {1: 0.5, 2: 0.25, 3: 0.5, 4: 0.0},
+    # Doc thiếu trong một leg nhận z nhỏ nhất của leg đó
+    "zscore": {
+        1: (Z_A[1] + Z_B[4]) / 2,
+        2: (Z_A[2] + Z_B[4]) / 2,
+        3: (Z_A[3] + Z_B[3]) / 2,
+        4: (Z_A[3] + Z_B[4]) / 2,
+    },
+    "dbsf": {1: DBSF_A[1] / 2, 2: DBSF_A[2] / 2, 3: (DBSF_A[3] + DBSF_B[3]) / 2, 4: DBSF_B[4] / 2},
+}
+
+
+@pytest.mark.parametrize("method", sorted(EXPECTED))
+def test_fused_scores_match_hand_computed_values(method):
+    results = fusion.fuse([LEG_A, LEG_B], method=method, limit=10)
+    expected = EXPECTED[method]
+
+    assert {c.id: c.score for c in results} == pytest.approx(expected)
+    assert [c.score for c in results] == sorted((c.score for c in results), reverse=True)
+
+
+def test_weighted_rrf_and_convex_weights():
+    results = fusion.fuse([LEG_A, LEG_B], method="weighted_rrf", weights=[2, 1], limit=10)
+    assert {c.id: c.score for c in results} == pytest.approx({1: 2 / 61, 2: 2 / 62, 3: 2 / 63 + 1 / 61, 4: 1 / 62})
+
+    # minmax: weights được chuẩn hóa về tổng 1
+    results = fusion.fuse([LEG_A, LEG_B], method="minmax", weights=[3, 1], limit=10)
+    assert {c.id: c.score for c in results} == pytest.approx({1: 0.75, 2: 0.375, 3: 0.25, 4: 0.0})
+
+
+def test_original_candidates_are_kept():
+    embedding = np.ones(4, dtype=np.float32)
+    leg = [Candidate(id=7, category="c", content="x", score=1.0, embedding=embedding)]
+    [result] = fusion.fuse([leg, []], method="minmax")
+
+    assert result.embedding is embedding and result.category == "c"
+    assert result.score == pytest.approx(0.5)
+    assert leg[0].score == 1.0
+
+
+def test_duplicate_in_leg_keeps_best_rank_and_limit():
+    leg = _leg([(1, 5.0), (2, 4.0), (1, 1.0)])
+    results = fusion.fuse([leg], method="rrf", limit=1)
+    assert [(c.id, c.score) for c in results] == [(1, pytest.approx(1 / 61))]
+
+
+def test_invalid_arguments():
+    assert fusion.fuse([[], []]) == []
+    with pytest.raises(ValueError):
+        fusion.fuse([LEG_A, LEG_B], method="borda")
+    with pytest.raises(ValueError):
+        fusion.fuse([LEG_A, LEG_B], method="minmax", weights=[1])
+    with pytest.raises(ValueError):
+        fusion.fuse([LEG_A, LEG_B], method="minmax", weights=[1, -1])
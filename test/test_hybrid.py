@@ -0,0 +1,115 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import threading
+import time
+import pytest
+
+hybrid = pytest.importorskip("retriever.hybrid")
+Candidate = hybrid.Candidate
+
+
+class StubRetriever:
+    """Leg stand-in: fixed ids, optional delay / blocking event / exception."""
+
+    def __init__(self, ids, delay=0.0, block=None, error=None):
+        self.ids = ids
+        self.delay = delay
+        self.block = block
+        self.error = error
+
+    def search(self, query, limit=5, with_content=True):
+        if self.block is not None:
+            self.block.wait()
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [
+            Candidate(id=i, category=None, content=f"doc {i}" if with_content else None, score=1.0 / (r + 1))
+            for r, i in enumerate(self.ids[:limit])
+        ]
+
+    def search_batch(self, queries, limit=5, with_content=True):
+        return [self.search(q, limit=limit, with_content=with_content) for q in queries]
+
+    def hydrate_batch(self, batch):
+        return [[Candidate(id=c.id, category=None, content=f"doc {c.id}", score=c.score) for c in cands] for cands in batch]
+
+    def hydrate(self, candidates):
+        return self.hydrate_batch([candidates])[0]
+
+
+def test_both_legs_fused_and_hydrated():
+    with hybrid.HybridRetriever(StubRetriever([1, 2, 3]), StubRetriever([3, 4])) as retriever:
+        results = retriever.search("q", limit=3)
+
+    assert results[0].id == 3
+    assert all(c.content == f"doc {c.id}" for c in results)
+    assert retriever.leg_failures == {"raw": 0, "vector": 0}
+
+
+def test_late_leg_is_dropped_at_its_deadline():
+    with hybrid.HybridRetriever(
+        StubRetriever([1, 2]), StubRetriever([7, 8], delay=1.0), raw_timeout=0.1
+    ) as retriever:
+        start = time.perf_counter()
+        results = retriever.search("q", limit=5)
+        elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.8
+    assert [c.id for c in results] == [1, 2]
+    assert retriever.leg_failures == {"raw": 1, "vector": 0}
+
+
+def test_failing_leg_degrades_to_the_other_leg():
+    with hybrid.HybridRetriever(
+        StubRetriever([1, 2], error=RuntimeError("db down")), StubRetriever([7, 8])
+    ) as retriever:
+        results = retriever.search("q", limit=5)
+
+    assert [c.id for c in results] == [7, 8]
+    assert retriever.leg_failures == {"raw": 0, "vector": 1}
+
+
+def test_stuck_leg_does_not_block_the_other_pool():
+    release = threading.Event()
+    retriever = hybrid.HybridRetriever(
+        StubRetriever([1]), StubRetriever([7], block=release), raw_timeout=0.05, max_workers=1
+    )
+    try:
+        # Pool của leg raw (1 thread) bị giữ bởi các leg treo; leg vector vẫn trả lời
+        for _ in range(3):
+            start = time.perf_counter()
+            assert [c.id for c in retriever.search("q", limit=5)] == [1]
+            assert time.perf_counter() - start < 0.5
+        assert retriever.leg_failures["raw"] == 3
+    finally:
+        release.set()
+        retriever.close()
+
+
+def test_search_after_close_raises():
+    retriever = hybrid.HybridRetriever(StubRetriever([1]), StubRetriever([2]))
+    retriever.close()
+    with pytest.raises(RuntimeError):
+        retriever.search("q")
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, stage, query, candidates, **extra):
+        self.records.append((stage, [(c.id, c.content) for c in candidates]))
+        return True
+
+
+def test_traces_are_emitted_after_hydration():
+    sink = ListSink()
+    with hybrid.HybridRetriever(StubRetriever([1, 2]), StubRetriever([2, 3]), trace_sink=sink) as retriever:
+        retriever.search("q", limit=2)
+
+    stages = dict(sink.records)
+    assert set(stages) == {"raw", "vector", "fused"}
+    assert all(content is None for _, content in stages["raw"])         # two-phase: chỉ id + score
+    assert stages["fused"] == [(2, "doc 2"), (1, "doc 1")]
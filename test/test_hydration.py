@@ -0,0 +1,76 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+
+base = pytest.importorskip("retriever.base")
+
+
+class FakeChromaCollection:
+    """ChromaDB collection stand-in: ids are stored (and returned) as strings."""
+
+    def __init__(self, docs):
+        self.docs = docs    # {int id: (content, category)}
+
+    def query(self, query_embeddings, n_results, include):
+        ids = [str(i) for i in sorted(self.docs)[:n_results]]
+        return {
+            "ids": [ids for _ in query_embeddings],
+            "distances": [[0.1 * k for k in range(len(ids))] for _ in query_embeddings],
+        }
+
+    def get(self, ids, include):
+        found = [i for i in ids if int(i) in self.docs]
+        return {
+            "ids": found,
+            "documents": [self.docs[int(i)][0] for i in found] if "documents" in include else None,
+            "metadatas": [{"category": self.docs[int(i)][1]} for i in found] if "metadatas" in include else None,
+        }
+
+
+class FakeEncoder:
+    def encode(self, texts):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class VectorRetriever(base.BaseVectorRetriever):
+    def search(self, query, limit=5):
+        return self._raw_vector_search(query, limit=limit)
+
+
+def _chroma_retriever(docs):
+    # Không kết nối DB: chỉ gắn collection giả
+    retriever = VectorRetriever.__new__(VectorRetriever)
+    retriever.type = "chromadb"
+    retriever.collection = FakeChromaCollection(docs)
+    retriever.embedding_model = FakeEncoder()
+    return retriever
+
+
+def test_chroma_vector_ids_are_int():
+    retriever = _chroma_retriever({1: ("a", "x"), 2: ("b", "y")})
+    hits = retriever._raw_vector_search_batch(["q"], limit=2, with_content=False)[0]
+
+    assert [c.id for c in hits] == [1, 2]
+    assert all(c.content is None for c in hits)
+
+
+def test_hydrate_mixed_raw_and_vector_batch():
+    docs = {1: ("doc 1", "x"), 2: ("doc 2", "y"), 3: ("doc 3", "z")}
+    retriever = _chroma_retriever(docs)
+
+    vector_hits = retriever._raw_vector_search_batch(["q"], limit=2, with_content=False)[0]
+    raw_hits = [
+        base.Candidate(id=3, category=None, content=None, score=7.5),   # BM25: id int, chưa có content
+        base.Candidate(id=99, category=None, content=None, score=1.0),  # không có trong DB -> bỏ
+    ]
+    ready = [base.Candidate(id=2, category="y", content="already", score=0.3)]
+
+    hydrated = retriever.hydrate_batch([vector_hits + raw_hits, ready])
+
+    assert [(c.id, c.content, c.category) for c in hydrated[0]] == [
+        (1, "doc 1", "x"), (2, "doc 2", "y"), (3, "doc 3", "z")
+    ]
+    assert [c.score for c in hydrated[0]] == [h.score for h in vector_hits] + [7.5]
+    assert hydrated[1] == ready
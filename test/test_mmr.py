@@ -0,0 +1,116 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+
+mmr = pytest.importorskip("retriever.mmr")
+from mmr_benchmark import legacy_similarities, legacy_mmr
+
+Candidate = mmr.Candidate
+
+
+def _retriever(**attrs):
+    # Không kết nối DB: chỉ dùng engine MMR
+    retriever = mmr.MMRRetriever.__new__(mmr.MMRRetriever)
+    retriever.vector_size = 8
+    retriever.__dict__.update(attrs)
+    return retriever
+
+
+def _candidates(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    scores = np.sort(rng.uniform(0.3, 0.9, n))[::-1]
+    return [Candidate(id=i, category=None, content=None, score=float(s), embedding=v) for i, (s, v) in enumerate(zip(scores, vectors))]
+
+
+def test_similarities_match_legacy_including_zero_vectors():
+    embeddings = np.random.default_rng(1).standard_normal((12, 8)).astype(np.float32)
+    embeddings[4] = 0.0
+
+    sims = _retriever()._compute_similarities(embeddings)
+    assert np.allclose(sims, legacy_similarities(embeddings), atol=1e-5)
+    assert not sims[4].any()
+
+
+@pytest.mark.parametrize("lambda_param", [0.0, 0.3, 0.5, 0.9, 1.0])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_selection_matches_legacy_mmr(lambda_param, seed):
+    retriever = _retriever()
+    candidates = _candidates(40, seed=seed)
+    sim_matrix = retriever._generate_similarity_matrices(candidates)
+
+    embeddings = np.stack([c.embedding for c in candidates])
+    legacy_matrix = retriever._combine_similarity_matrices(
+        legacy_similarities(embeddings), np.array([c.score for c in candidates])
+    )
+    assert np.allclose(sim_matrix, legacy_matrix, atol=1e-5)
+
+    selected = retriever._maximal_marginal_relevance(sim_matrix, num_to_select=10, lambda_param=lambda_param)
+    assert selected == legacy_mmr(legacy_matrix, num_to_select=10, lambda_param=lambda_param)
+
+
+def test_edge_cases():
+    retriever = _retriever()
+    assert retriever._generate_similarity_matrices([]).shape == (0, 0)
+    assert retriever._maximal_marginal_relevance(np.zeros((0, 0)), 5, 0.5) == []
+
+    # Ít candidate hơn num_to_select -> chọn hết, không lặp
+    sim_matrix = retriever._generate_similarity_matrices(_candidates(3))
+    assert sorted(retriever._maximal_marginal_relevance(sim_matrix, 10, 0.5)) == [0, 1, 2]
+
+    # Candidate không có embedding -> vector 0, vẫn có thể được chọn
+    candidates = _candidates(3)
+    candidates[1].embedding = None
+    sim_matrix = retriever._generate_similarity_matrices(candidates)
+    assert not sim_matrix[2, 1:].any()
+
+
+class FixedEncoder:
+    def __init__(self, vector):
+        self.vector = np.asarray(vector, dtype=np.float32)
+
+    def encode(self, texts):
+        return np.tile(self.vector, (len(texts), 1))
+
+
+def _local_retriever(tmp_path, vectors, query):
+    base = sys.modules["retriever.base"]
+    db = base.LocalVectorDB(str(tmp_path / "snap"), use_faiss=False)
+    db.upsert_points([
+        {"id": 100 + i, "embedding": v.tolist(), "content": f"doc {i}", "category": "c"}
+        for i, v in enumerate(vectors)
+    ])
+    return _retriever(type="local", client=db, embedding_model=FixedEncoder(query))
+
+
+@pytest.mark.parametrize("embedding_dtype", ["float32", "int8"])
+def test_search_hits_carry_stored_vectors(tmp_path, embedding_dtype):
+    vectors = np.random.default_rng(3).standard_normal((20, 8)).astype(np.float32)
+    retriever = _local_retriever(tmp_path, vectors, query=vectors[0])
+
+    [hits] = retriever._raw_vector_search_batch(["q"], limit=6, return_embedding=True, embedding_dtype=embedding_dtype)
+    block = hits[0].embedding.base
+    assert block is not None and all(h.embedding.base is block for h in hits)   # một block chung
+    assert block.dtype == np.dtype(embedding_dtype)
+
+    stored = retriever.client.vectors[[retriever.client.id_to_row[h.id] for h in hits]]
+    got = np.stack([h.embedding for h in hits]).astype(np.float32)
+    assert np.allclose(retriever._compute_similarities(got), retriever._compute_similarities(stored), atol=0.02)
+
+
+def test_mmr_search_diversifies_near_duplicates(tmp_path):
+    rng = np.random.default_rng(4)
+    query = rng.standard_normal(8)
+    other = rng.standard_normal(8)
+    # 3 bản gần trùng với query, 1 doc khác hướng
+    vectors = np.stack([query + 0.01 * rng.standard_normal(8) for _ in range(3)] + [query + 2 * other]).astype(np.float32)
+    retriever = _local_retriever(tmp_path, vectors, query=query)
+
+    relevant = retriever.search("q", raw_limit=4, limit=2, lambda_param=1.0)
+    diverse = retriever.search("q", raw_limit=4, limit=2, lambda_param=0.3)
+
+    assert 103 not in [c.id for c in relevant]
+    assert 103 in [c.id for c in diverse]
+    assert all(c.content.startswith("doc") for c in diverse)
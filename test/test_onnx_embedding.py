@@ -0,0 +1,86 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+
+embedders = pytest.importorskip("embedders")
+onnx_embedding = embedders.onnx_embedding
+
+
+class FakeTokenizer:
+    """Token id = character code, padded to the longest text of the call."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        self.batches.append(list(texts))
+        width = min(max(len(t) for t in texts) + 1, max_length)
+        ids = np.zeros((len(texts), width), dtype=np.int32)
+        mask = np.zeros_like(ids)
+        for row, text in enumerate(texts):
+            codes = [101] + [ord(c) for c in text][:width - 1]
+            ids[row, :len(codes)] = codes
+            mask[row, :len(codes)] = 1
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+class FakeSession:
+    """last_hidden_state: CLS = [n_tokens, sum of ids], other positions = noise."""
+
+    def __init__(self):
+        self.feeds = []
+
+    def run(self, outputs, feeds):
+        assert outputs == ["last_hidden_state"]
+        self.feeds.append(feeds)
+        ids, mask = feeds["input_ids"], feeds["attention_mask"]
+        hidden = np.random.default_rng(0).standard_normal((*ids.shape, 2)).astype(np.float32)
+        hidden[:, 0, 0] = mask.sum(axis=1)
+        hidden[:, 0, 1] = ids.sum(axis=1) / 100
+        return [hidden]
+
+
+def _embedding(batch_size=2):
+    model = onnx_embedding.ONNXEmbedding.__new__(onnx_embedding.ONNXEmbedding)
+    model.name = "bge-m3"
+    model.max_length = 512
+    model.batch_size = batch_size
+    model.tokenizer = FakeTokenizer()
+    model.session = FakeSession()
+    model.input_names = {"input_ids", "attention_mask"}
+    return model
+
+
+def _expected(text):
+    ids = [101] + [ord(c) for c in text]
+    v = np.array([len(ids), sum(ids) / 100], dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_cls_vectors_are_normalized_and_returned_in_input_order():
+    model = _embedding(batch_size=2)
+    texts = ["đau đầu kéo dài", "ho", "sốt cao", "a"]
+
+    vectors = model.encode(texts)
+
+    assert vectors.dtype == np.float32 and vectors.shape == (4, 2)
+    assert np.allclose(vectors, [_expected(t) for t in texts], atol=1e-6)
+    # Batch theo độ dài: các câu ngắn đi cùng nhau
+    assert model.tokenizer.batches == [["a", "ho"], ["sốt cao", "đau đầu kéo dài"]]
+
+
+def test_only_graph_inputs_are_fed_as_int64():
+    model = _embedding()
+    model.encode("xin chào")
+
+    [feeds] = model.session.feeds
+    assert set(feeds) == {"input_ids", "attention_mask"}
+    assert all(v.dtype == np.int64 for v in feeds.values())
+
+
+def test_single_string_and_empty_input():
+    model = _embedding()
+    assert model.encode("ho").shape == (1, 2)
+    assert model.encode([]).shape == (0, 0)
@@ -0,0 +1,106 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import hashlib
+import json
+import numpy as np
+import pytest
+from senmatic_router import Route, RouteStore, SemanticRouter, hash_samples
+from senmatic_router import route_store
+
+
+class HashEmbedding:
+    """Deterministic text -> vector (seeded by the text hash), counts encoded texts."""
+
+    def __init__(self, name="hash-embedding", dim=16):
+        self.name = name
+        self.dim = dim
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        seeds = [int(hashlib.md5(t.encode("utf-8")).hexdigest()[:8], 16) for t in texts]
+        return np.stack([np.random.default_rng(s).standard_normal(self.dim) for s in seeds]).astype(np.float32)
+
+
+ROUTES = [
+    Route("medical", ["đau đầu", "sốt cao", "ho kéo dài"]),
+    Route("chitchat", ["xin chào", "bạn là ai"]),
+]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_save_load_round_trip(tmp_path, dtype):
+    store = RouteStore(str(tmp_path / "routes"))
+    emb = {"a": np.random.default_rng(0).standard_normal((5, 8)), "b": np.zeros((2, 8))}
+    store.save(emb, model="m", dtype=dtype, samples_hash={"a": "h"})
+
+    loaded = RouteStore(str(tmp_path / "routes")).load()
+    assert isinstance(loaded["a"], np.memmap) and loaded["a"].dtype == np.dtype(dtype)
+    expected = emb["a"] / np.linalg.norm(emb["a"], axis=1, keepdims=True)
+    assert np.allclose(loaded["a"], expected, atol=1e-3)
+    assert not loaded["b"].any()        # vector 0 giữ nguyên, không NaN
+
+    manifest = store.read_manifest()
+    assert manifest["model"] == "m" and manifest["dim"] == 8
+    assert manifest["routes"]["a"] == {"file": "route_0.npy", "count": 5, "samples_hash": "h"}
+    assert not os.path.exists(str(tmp_path / "routes") + ".tmp")
+
+
+def test_corrupted_or_unknown_store_is_rejected(tmp_path):
+    store = RouteStore(str(tmp_path / "routes"))
+    store.save({"a": np.ones((3, 4))})
+
+    np.save(tmp_path / "routes" / "route_0.npy", np.ones((2, 4), dtype=np.float32))
+    with pytest.raises(ValueError, match="Corrupted"):
+        store.load()
+
+    manifest_path = tmp_path / "routes" / route_store.MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps({**manifest, "version": 99}))
+    with pytest.raises(ValueError, match="version"):
+        store.read_manifest()
+
+
+def test_hash_samples_is_order_and_boundary_sensitive():
+    assert hash_samples(["a", "b"]) == hash_samples(["a", "b"])
+    assert hash_samples(["a", "b"]) != hash_samples(["b", "a"])
+    assert hash_samples(["ab"]) != hash_samples(["a", "b"])
+
+
+def test_legacy_json_is_migrated_once(tmp_path):
+    json_path = tmp_path / "routing.json"
+    json_path.write_text(json.dumps({"routes": {"medical": [[1.0, 0.0], [0.0, 2.0]], "chitchat": [[3.0, 4.0]]}}))
+
+    embedding = HashEmbedding(dim=2)
+    router = SemanticRouter(embedding, save_path=str(json_path))
+
+    assert embedding.encoded == []
+    assert RouteStore(str(tmp_path / "routing")).exists
+    assert np.allclose(router.routesEmbedding["chitchat"], [[0.6, 0.8]])
+    assert router.guide("bất kỳ")[1] in ("medical", "chitchat")
+
+
+def test_router_reuses_store_until_samples_or_model_change(tmp_path):
+    save_path = str(tmp_path / "routing.json")
+    SemanticRouter(HashEmbedding(), routes=ROUTES, save_path=save_path)
+
+    # Cùng model + samples -> dùng lại store, không encode lại
+    embedding = HashEmbedding()
+    router = SemanticRouter(embedding, routes=ROUTES, save_path=save_path)
+    assert embedding.encoded == []
+    assert router.guide("sốt cao")[1] == "medical"
+
+    changed = [Route("medical", ["đau đầu", "sốt cao"]), ROUTES[1]]
+    embedding = HashEmbedding()
+    SemanticRouter(embedding, routes=changed, save_path=save_path)
+    assert embedding.encoded == ["đau đầu", "sốt cao", "xin chào", "bạn là ai"]
+
+    embedding = HashEmbedding(name="other-model")
+    SemanticRouter(embedding, routes=changed, save_path=save_path)
+    assert len(embedding.encoded) == 4
+
+    # Không có routes -> store được dùng nguyên trạng
+    embedding = HashEmbedding(name="third-model")
+    SemanticRouter(embedding, save_path=save_path)
+    assert embedding.encoded == []
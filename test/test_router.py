@@ -0,0 +1,167 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import pytest
+from senmatic_router import SemanticRouter, RouteStore
+from router_fakes import QueryVectors, unit
+
+
+def _router(tmp_path, sizes=(300, 40, 5), dim=16, num_queries=60, seed=0, **kwargs):
+    """Routes of different sizes around shared topics; queries near topics or exact samples."""
+    rng = np.random.default_rng(seed)
+    topics = unit(rng.standard_normal((6, dim)))
+    routes = {
+        f"route_{r}": unit(topics[rng.integers(0, 6, n)] + 0.6 * rng.standard_normal((n, dim)) / np.sqrt(dim))
+        for r, n in enumerate(sizes)
+    }
+    store_dir = str(tmp_path / "routes")
+    RouteStore(store_dir).save(routes, model=QueryVectors.name)
+
+    queries = unit(topics[rng.integers(0, 6, num_queries)] + 0.6 * rng.standard_normal((num_queries, dim)) / np.sqrt(dim))
+    queries[:5] = routes["route_2"][:5]       # hit > HIGH_SIM
+    return SemanticRouter(QueryVectors(queries), save_path=store_dir + ".json", **kwargs), queries
+
+
+def legacy_route_scores(router, scores, indices):
+    """Per-route loop of the original guide(): route name -> score."""
+    route_sims = {}
+    for sim, idx in zip(scores, indices):
+        if idx < 0:
+            continue
+        route_sims.setdefault(router.id2route[idx], []).append(sim)
+
+    final = {}
+    for route_name, sims in route_sims.items():
+        sims = np.array(sims)
+        if np.any(sims > 0.95):
+            final[route_name] = float(np.mean(sims[sims > 0.95]))
+        else:
+            k = min(100, len(sims))
+            top = np.partition(sims, -k)[-k:]
+            final[route_name] = float(np.mean(np.where(top > 0.75, top ** 2, top)))
+    return final
+
+
+@pytest.mark.parametrize("top_k", [10, 150, 400])
+def test_vectorized_scores_match_legacy_loop(tmp_path, top_k):
+    # top_k=150: route_0 > TOP_N hit; top_k=400 > ntotal: FAISS trả về -1
+    router, queries = _router(tmp_path)
+    scores, indices = router.index.search(queries, top_k)
+    if top_k == 150:
+        assert (router.route_ids[indices] == 0).sum(axis=1).max() > 100
+
+    route_scores = router._score_routes(scores, indices)
+    for row in range(len(queries)):
+        expected = legacy_route_scores(router, scores[row], indices[row])
+        got = {name: route_scores[row, r] for r, name in enumerate(router.route_names) if route_scores[row, r] > -np.inf}
+        assert got == pytest.approx(expected, abs=1e-5)
+
+
+def test_guide_returns_best_legacy_route(tmp_path):
+    router, queries = _router(tmp_path)
+    metrics = []
+    router.metrics_hook = metrics.append
+
+    for i in range(len(queries)):
+        scores, indices = router.index.search(queries[i:i + 1], 200)
+        expected = legacy_route_scores(router, scores[0], indices[0])
+        best = max(expected, key=expected.get)
+
+        score, route = router.guide(f"q{i}")
+        assert route == best and score == pytest.approx(expected[best], abs=1e-5)
+
+    assert router.guide("q0")[1] == "route_2"
+    assert metrics[0]["path"] == "full" and metrics[0]["routes_hit"] >= 1
+    assert router.last_path == "full"
+    with pytest.raises(ValueError):
+        router.guide("")
+
+
+@pytest.mark.parametrize("top_k", [20, 200])
+def test_batch_guide_matches_guide(tmp_path, top_k):
+    router, queries = _router(tmp_path)
+    names = [f"q{i}" for i in range(len(queries))]
+
+    batch = router.batch_guide(names, top_k=top_k)
+    single = [router.guide(name, top_k=top_k) for name in names]
+
+    assert [route for _, route in batch] == [route for _, route in single]
+    assert [score for score, _ in batch] == pytest.approx([score for score, _ in single], abs=1e-5)
+    assert router.batch_errors == {}
+
+
+def test_batch_guide_isolates_failing_queries(tmp_path):
+    router, _ = _router(tmp_path)
+
+    results = router.batch_guide(["q1", "", "q2", None])
+    assert results[1] == results[3] == (None, "error")
+    assert router.batch_paths == ["full", None, "full", None]
+    assert results[0] == pytest.approx(router.guide("q1"))
+    assert set(router.batch_errors) == {1, 3}
+
+    assert router.batch_guide(["", ""]) == [(None, "error")] * 2
+
+    # Lỗi encode -> mọi query hợp lệ nhận (None, "error"), không raise
+    results = router.batch_guide(["q1", "q9999"])
+    assert results == [(None, "error")] * 2 and set(router.batch_errors) == {0, 1}
+
+
+def test_prototypes_per_route(tmp_path):
+    router, _ = _router(tmp_path, prototypes_per_route=8)
+
+    # route_2 chỉ có 5 sample -> giữ nguyên sample làm prototype
+    assert router.prototype_starts.tolist() == [0, 8, 16]
+    assert len(router.prototypes) == 21
+    assert np.allclose(np.linalg.norm(router.prototypes, axis=1), 1.0, atol=1e-5)
+    assert np.allclose(router.prototypes[16:], router.routesEmbedding["route_2"])
+
+
+def test_prototype_gate_falls_back_below_margin(tmp_path):
+    full, queries = _router(tmp_path)
+    names = [f"q{i}" for i in range(len(queries))]
+    expected = [full.guide(name) for name in names]
+
+    # Margin không bao giờ đạt -> luôn full search, kết quả như không có prototype
+    gated, _ = _router(tmp_path, prototypes_per_route=8, prototype_margin=np.inf)
+    assert [gated.guide(name) for name in names] == expected
+    assert gated.fallback_rate == 1.0 and gated.last_path == "full"
+
+    # Margin luôn đạt -> luôn trả quyết định của centroid
+    fast, _ = _router(tmp_path, prototypes_per_route=8, prototype_margin=-1.0)
+    decisions = fast.prototype_guide(names)
+    assert [fast.guide(name) for name in names] == [(pytest.approx(s), r) for s, r, _ in decisions]
+    assert fast.fallback_rate == 0.0 and fast.last_path == "prototype"
+    assert fast.guide("q0", use_prototypes=False) == expected[0]
+    assert fast.last_path == "full"
+
+
+def test_batch_guide_applies_the_same_gate_as_guide(tmp_path):
+    router, queries = _router(tmp_path, prototypes_per_route=8, prototype_margin=0.05)
+    names = [f"q{i}" for i in range(len(queries))]
+
+    margins = np.array([m for _, _, m in router.prototype_guide(names)])
+    assert 0 < (margins >= 0.05).sum() < len(names)     # cả hai nhánh đều được dùng
+
+    batch = router.batch_guide(names)
+    router.prototype_stats = {"queries": 0, "fallbacks": 0}
+    single, paths = [], []
+    for name in names:
+        single.append(router.guide(name))
+        paths.append(router.last_path)
+    assert [r for _, r in batch] == [r for _, r in single]
+    assert [s for s, _ in batch] == pytest.approx([s for s, _ in single], abs=1e-5)
+    assert router.prototype_stats["fallbacks"] == (margins < 0.05).sum()
+
+    # Điểm centroid và điểm route khác thang đo -> nhánh được trả riêng
+    assert router.batch_paths == paths
+    assert router.batch_paths == ["prototype" if m >= 0.05 else "full" for m in margins]
+
+    router.batch_guide(["q1", ""])
+    assert router.batch_paths[1] is None
+
+
+def test_prototype_guide_requires_prototypes(tmp_path):
+    router, _ = _router(tmp_path)
+    with pytest.raises(RuntimeError):
+        router.prototype_guide(["q0"])
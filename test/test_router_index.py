@@ -0,0 +1,75 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import faiss
+import numpy as np
+import pytest
+from senmatic_router import SemanticRouter, RouteStore
+from router_fakes import QueryVectors, unit
+
+
+def _store(tmp_path, per_route, dim=32, num_routes=2, topics=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = unit(rng.standard_normal((num_routes * topics, dim)))
+    routes = {}
+    for r in range(num_routes):
+        picks = centers[r * topics + rng.integers(0, topics, per_route)]
+        routes[f"route_{r}"] = unit(picks + 0.3 * rng.standard_normal((per_route, dim)) / np.sqrt(dim))
+    store_dir = str(tmp_path / "routes")
+    RouteStore(store_dir).save(routes, model=QueryVectors.name)
+
+    queries = unit(centers + 0.3 * rng.standard_normal(centers.shape) / np.sqrt(dim))
+    return store_dir + ".json", queries
+
+
+def _router(save_path, queries, index_type, **params):
+    return SemanticRouter(QueryVectors(queries), save_path=save_path, index_type=index_type, index_params=params)
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_too_few_vectors_falls_back_to_flat(tmp_path, index_type):
+    # 2000 vectors: default nlist = 4*sqrt(2000) = 178 -> cần >= 39*178
+    save_path, queries = _store(tmp_path, per_route=1000)
+    router = _router(save_path, queries, index_type, pq_m=8)
+
+    assert router.requested_index_type == index_type
+    assert router.index_type == "flat"
+    assert router.index.ntotal == 2000
+    assert router.index_agreement is None
+
+
+def test_pq_needs_enough_points_per_code(tmp_path):
+    save_path, queries = _store(tmp_path, per_route=3000)
+    assert _router(save_path, queries, "ivf_flat", nlist=16).index_type == "ivf_flat"
+    # 6000 < 39 * 2^8 dù nlist nhỏ
+    assert _router(save_path, queries, "ivf_pq", nlist=16, pq_m=8).index_type == "flat"
+    assert _router(save_path, queries, "ivf_pq", nlist=16, pq_m=8, pq_bits=6).index_type == "ivf_pq"
+
+
+def test_nprobe_scales_with_nlist(tmp_path):
+    save_path, queries = _store(tmp_path, per_route=5000)
+    router = _router(save_path, queries, "ivf_flat", nlist=256)
+    ivf = faiss.extract_index_ivf(router.index)
+
+    assert ivf.nlist == 256 and ivf.nprobe == 32
+    router.set_search_params(nprobe=4)
+    assert ivf.nprobe == 4
+    router.set_search_params(nprobe=1000)
+    assert ivf.nprobe == 256
+
+
+def test_approximate_index_is_verified_against_flat(tmp_path):
+    save_path, queries = _store(tmp_path, per_route=3000)
+    router = _router(save_path, queries, "hnsw")
+    flat = _router(save_path, queries, "flat")
+
+    assert router.index_type == "hnsw"
+    assert 0.95 <= router.index_agreement <= 1.0
+    names = [f"q{i}" for i in range(len(queries))]
+    assert [r for _, r in router.batch_guide(names)] == [r for _, r in flat.batch_guide(names)]
+
+    # Ngưỡng không đạt -> dùng flat, cùng kết quả với flat
+    strict = _router(save_path, queries, "hnsw", min_agreement=1.01)
+    assert strict.index_type == "flat"
+    assert strict.index_agreement == router.index_agreement
+    assert strict.batch_guide(names) == flat.batch_guide(names)
@@ -0,0 +1,81 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import threading
+from utils.trace_utils import TraceSink
+
+
+class Item:
+    """Candidate stand-in: records which thread serialized it."""
+
+    def __init__(self, id, block=None):
+        self.id = id
+        self.block = block
+        self.serialized_by = None
+
+    def to_dict(self):
+        if self.block is not None:
+            self.block.wait()
+        self.serialized_by = threading.current_thread().name
+        return {"id": self.id}
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_emit_writes_jsonl_serialized_in_writer_thread(tmp_path):
+    sink = TraceSink(path_dir=str(tmp_path), name="t")
+    items = [Item(1), Item(2)]
+
+    assert sink.emit("raw", "đau đầu", items, is_sufficient=True)
+    items.append(Item(3))       # list của caller đổi sau emit -> không ảnh hưởng record
+    sink.flush()
+    sink.close()
+
+    [record] = _read(sink.file_path)
+    assert record["stage"] == "raw"
+    assert record["query"] == "đau đầu"
+    assert record["results"] == [{"id": 1}, {"id": 2}]
+    assert record["num_candidates"] == 2
+    assert record["is_sufficient"] is True
+    assert items[0].serialized_by == "trace-sink"
+    assert sink.stats() == {"emitted": 1, "written": 1, "dropped": 0, "pending": 0}
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    release = threading.Event()
+    sink = TraceSink(path_dir=str(tmp_path), name="t", max_queue=1)
+
+    sink.emit("raw", "q0", [Item(0, block=release)])    # writer thread kẹt ở record này
+    while sink.stats()["pending"]:
+        pass
+    assert sink.emit("raw", "q1", [Item(1)])
+    assert not sink.emit("raw", "q2", [Item(2)])
+
+    release.set()
+    sink.close()
+    assert [r["query"] for r in _read(sink.file_path)] == ["q0", "q1"]
+    assert sink.stats()["dropped"] == 1
+
+
+def test_sampling_and_emit_after_close(tmp_path):
+    sink = TraceSink(path_dir=str(tmp_path), name="t", sample_rate=0.0)
+    assert not sink.emit("raw", "q", [Item(1)])
+    sink.close()
+    assert not sink.emit("raw", "q", [Item(1)])
+    assert _read(sink.file_path) == []
+
+
+def test_rotation_keeps_backup_count(tmp_path):
+    sink = TraceSink(path_dir=str(tmp_path), name="t", max_bytes=200, backup_count=2)
+    for i in range(20):
+        sink.emit("raw", f"query {i}", [Item(i)])
+    sink.close()
+
+    assert os.path.exists(sink.file_path + ".1")
+    assert os.path.exists(sink.file_path + ".2")
+    assert not os.path.exists(sink.file_path + ".3")
+    assert sink.stats()["written"] == 20
@@ -0,0 +1,71 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import re
+import pytest
+
+vn_preprocess = pytest.importorskip("vn_preprocess")
+
+
+class FakeVnCoreNLP:
+    """
+    word_segment like VnCoreNLP: one string per sentence (split after '.',
+    '?', '!' and on new lines), punctuation split off, known compounds
+    joined with '_'. Empty sentences are dropped.
+    """
+    COMPOUNDS = {("bệnh", "viện"): "bệnh_viện", ("đau", "đầu"): "đau_đầu"}
+
+    def __init__(self):
+        self.calls = 0
+
+    def _words(self, sentence):
+        tokens = re.findall(r"\w+|[^\w\s]", sentence)
+        out = []
+        for token in tokens:
+            pair = (out[-1], token) if out else None
+            if pair in self.COMPOUNDS:
+                out[-1] = self.COMPOUNDS[pair]
+            else:
+                out.append(token)
+        return out
+
+    def word_segment(self, text):
+        self.calls += 1
+        sentences = re.split(r"(?<=[.?!])\s+|\n+", text)
+        return [" ".join(self._words(s)) for s in sentences if s.strip()]
+
+
+def _processor(backend):
+    processor = vn_preprocess.VnTextProcessor.__new__(vn_preprocess.VnTextProcessor)
+    processor.processor = backend
+    return processor
+
+
+TEXTS = [
+    "tôi bị đau đầu",
+    "",
+    "sốt 38.5 độ. ho nhiều!",
+    "bệnh viện mở cửa lúc mấy giờ?",
+    "",
+    "khám",
+]
+
+
+def test_preprocess_batch_matches_single_calls():
+    backend = FakeVnCoreNLP()
+    processor = _processor(backend)
+
+    expected = [processor.preprocess(t) for t in TEXTS]
+    backend.calls = 0
+
+    assert processor.preprocess_batch(TEXTS) == expected
+    assert backend.calls == 1
+    assert expected[0] == "tôi bị đau_đầu"
+    assert expected[1] == ""
+
+
+def test_preprocess_batch_with_dummy_processor():
+    processor = _processor(vn_preprocess.DummyProcessor())
+
+    assert processor.preprocess_batch(["a b", "", "c  d", "e"]) == ["a b", "", "c d", "e"]
+    assert processor.preprocess("x\ny") == "x y"
@@ -0,0 +1,161 @@
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_STOP = object()
+
+
+class TraceSink:
+    """
+    Non-blocking trace writer for retrieval results.
+
+    emit() only samples and enqueues the raw objects; a background thread
+    turns them into records (Candidate.to_dict, JSON) and appends them as
+    JSON lines to `<path_dir>/<name>.jsonl`, rotating the file once it
+    reaches `max_bytes` (name.jsonl.1, name.jsonl.2, ...).
+    When the queue is full the record is dropped instead of blocking.
+    """
+
+    def __init__(
+        self,
+        path_dir: str = "traces",
+        name: str = "retrieval",
+        sample_rate: float = 1.0,
+        max_queue: int = 1024,
+        max_bytes: int = 50 * 1024 ** 2,
+        backup_count: int = 5,
+    ):
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+
+        os.makedirs(path_dir, exist_ok=True)
+        self.file_path = os.path.join(path_dir, f"{name}.jsonl")
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self.emitted = 0
+        self.dropped = 0      # queue đầy
+        self.written = 0
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="trace-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ======================================================
+    # PRODUCER
+    # ======================================================
+    def emit(
+        self,
+        stage: str,
+        query: Any,
+        candidates: List[Any],
+        **extra
+    ) -> bool:
+        """
+        Queue one trace record. Returns False if it was sampled out or dropped.
+
+        Args:
+            stage: Where the results come from ('raw', 'vector', 'loop', ...)
+            query: Original query (str or chat messages)
+            candidates: List of Candidate
+        """
+        if self._closed or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return False
+
+        # Serialize ở writer thread; copy list để caller sửa list sau đó không ảnh hưởng
+        item = (datetime.now(), stage, query, list(candidates), extra)
+
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        self.emitted += 1
+        return True
+
+    # ======================================================
+    # WRITER THREAD
+    # ======================================================
+    @staticmethod
+    def _to_record(item) -> Dict[str, Any]:
+        timestamp, stage, query, candidates, extra = item
+        record: Dict[str, Any] = {
+            "timestamp": timestamp.isoformat(),
+            "stage": stage,
+            "query": query,
+            "num_candidates": len(candidates),
+            "results": [c.to_dict() for c in candidates],
+        }
+        record.update(extra)
+        return record
+
+    def _should_rotate(self, f) -> bool:
+        return self.max_bytes > 0 and f.tell() >= self.max_bytes
+
+    def _rotate(self) -> None:
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.file_path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.file_path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.file_path, f"{self.file_path}.1")
+        else:
+            os.remove(self.file_path)
+
+    def _run(self) -> None:
+        f = open(self.file_path, "a", encoding="utf-8")
+        try:
+            while True:
+                item = self._queue.get()
+                try:
+                    if item is _STOP:
+                        return
+
+                    f.write(json.dumps(self._to_record(item), ensure_ascii=False, default=str) + "\n")
+                    self.written += 1
+
+                    # Chỉ flush khi queue rỗng để gộp nhiều record vào một lần ghi
+                    if self._queue.empty():
+                        f.flush()
+
+                    if self._should_rotate(f):
+                        f.close()
+                        self._rotate()
+                        f = open(self.file_path, "a", encoding="utf-8")
+                except Exception as e:
+                    print(f"❌ TraceSink write error: {e}")
+                finally:
+                    self._queue.task_done()
+        finally:
+            f.close()
+
+    # ======================================================
+    # CONTROL
+    # ======================================================
+    def flush(self) -> None:
+        """Block until every queued record has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "emitted": self.emitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+        }
@@ -5,6 +5,9 @@ import py_vncorenlp
 # Biến toàn cục để lưu instance duy nhất
 _vncorenlp_instance = None
 
+# Token phân cách các câu trong preprocess_batch (ASCII, không bị ghép từ)
+_BATCH_SEP = "QQBATCHSEPQQ"
+
 class VnTextProcessor:
     """
     Wrapper cho VnCoreNLP, dùng mô hình Singleton.
@@ -52,10 +55,49 @@ class VnTextProcessor:
         
         return " ".join([t for t in tokens])
 
+    def preprocess_batch(self, texts: list) -> list:
+        """
+        Tách từ nhiều câu trong một lần gọi JVM.
+        Các câu được nối bằng token phân cách _BATCH_SEP (không phụ thuộc
+        cách VnCoreNLP tách câu); mỗi đoạn kết quả được kiểm tra lại với câu
+        gốc (cùng chuỗi ký tự, bỏ khoảng trắng và "_"), đoạn nào không khớp
+        thì tách từ riêng câu đó.
+        """
+        if len(texts) <= 1 or any(_BATCH_SEP in t for t in texts):
+            return [self.preprocess(t) for t in texts]
+
+        joined = f" {_BATCH_SEP} ".join(texts)
+        tokens = " ".join(self.processor.word_segment(joined)).split()
+
+        parts = [[]]
+        for token in tokens:
+            if token == _BATCH_SEP:
+                parts.append([])
+            else:
+                parts[-1].append(token)
+
+        if len(parts) != len(texts):
+            return [self.preprocess(t) for t in texts]
+
+        results = []
+        for text, part in zip(texts, parts):
+            segmented = " ".join(part)
+            if _chars(segmented) != _chars(text):
+                segmented = self.preprocess(text)
+            results.append(segmented)
+        return results
+
+
+def _chars(text: str) -> str:
+    """Chuỗi ký tự của câu, bỏ khoảng trắng và "_" do tách từ thêm vào."""
+    return "".join(text.split()).replace("_", "")
+
 
 class DummyProcessor:
     """
     Processor giả phòng trường hợp JVM đã chạy trước đó.
+    Cùng kiểu trả về với VnCoreNLP.word_segment: danh sách câu (mỗi dòng
+    một câu), không ghép từ.
     """
     def word_segment(self, text: str) -> list:
-        return text.split()
\ No newline at end of file
+        return [" ".join(line.split()) for line in text.splitlines() if line.strip()]
\ No newline at end of file